@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+"""
+Admission control for the Amplify AI project.
+
+Without a limit, a burst of /generate calls piles onto the same models and
+every request gets slower until they all time out. This module admits a
+request only if it can finish within its deadline, using a capacity model of
+the two pipeline stages (the split also used by the job queue):
+
+- "text" (intent, captions, retrieval, copy) and "image" (image prompt,
+  diffusion, encoding) each have a number of slots, a bounded queue per
+  priority class and a running estimate of their service time (an
+  exponential moving average of the observed durations).
+- A request's priority class comes from its API key (see
+  `security.get_priority_class`). Higher classes are served first at both
+  stages and have their own queue bound.
+- The estimated wait of a new request is the work queued ahead of it
+  (running plus waiting requests of its class or higher) divided by the
+  stage's slots, times the stage's service time.
+- Admitted requests that have not reached a stage yet (still reading their
+  uploads, or jobs waiting to be scheduled) are reserved on it and count as
+  waiting, so a burst of admissions cannot all see the same empty queue.
+  A reservation ends when the request reaches the stage, when its ticket is
+  closed, or at its deadline.
+
+Requests are refused before any work starts: 429 when the queue of their
+priority class is full, 503 when the estimated time to finish exceeds their
+deadline (the client's X-Request-Timeout header, or
+ADMISSION_DEFAULT_DEADLINE_S). Both carry a Retry-After header. In degraded
+mode, a request that can still get its copy in time is admitted without
+the image instead, and an admitted request that would miss its deadline
+waiting for the image stage returns its copy without the image.
+
+A campaign is admitted as one ticket weighted by its number of posts (the
+estimate is that of its last post); each post then takes the stage slots
+on its own, like a single request. Jobs are admitted when submitted and
+take the slots when they run.
+"""
+# =======================================================================
+#  22. ADMISSION CONTROL - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+
+# -----------------------------------------------------------------------
+#  STAGES, PRIORITY CLASSES & OUTCOMES
+# -----------------------------------------------------------------------
+
+# The pipeline is split into two stages with separate concurrency limits:
+# "text" covers intent, captions, retrieval and copy; "image" covers the
+# image prompt and diffusion, which is by far the scarcer resource.
+TEXT_STAGE = "text"
+IMAGE_STAGE = "image"
+
+# Highest priority first.
+PRIORITY_HIGH = "high"
+PRIORITY_STANDARD = "standard"
+PRIORITY_LOW = "low"
+PRIORITY_CLASSES = (PRIORITY_HIGH, PRIORITY_STANDARD, PRIORITY_LOW)
+
+# `outcome` label values of the admission counter.
+ADMITTED = "admitted"
+DEGRADED = "degraded"
+REJECTED_QUEUE_FULL = "rejected_queue_full"
+REJECTED_DEADLINE = "rejected_deadline"
+# Admitted, but no text slot freed up before the deadline.
+EXPIRED_IN_QUEUE = "expired_in_queue"
+
+ADMISSION_DECISIONS = Counter(
+    "amplify_admission_decisions_total",
+    "Admission decisions for generation requests.",
+    ["priority", "outcome"],
+)
+
+# Weight of the newest observation in the service time estimates.
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    """A request refused by admission control: 429 (queue full) or 503 (deadline), with a Retry-After."""
+    def __init__(self, status_code: int, detail: str, retry_after_s: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        # Whole seconds, at least 1 (the unit of the Retry-After header).
+        self.retry_after_s = max(1, math.ceil(retry_after_s))
+
+
+# =======================================================================
+#  STAGE CAPACITY
+# =======================================================================
+
+class StageCapacity:
+    """
+    Slots of one pipeline stage, with a FIFO queue per priority class and an
+    estimate of how long the stage takes per request.
+
+    A freed slot is handed directly to the first waiter of the highest
+    non-empty class, so a waiting request can never be overtaken by a new one.
+    """
+    def __init__(self, name: str, slots: int, service_time_s: float):
+        self.name = name
+        self.slots = slots
+        self.service_time_s = service_time_s
+        self.running = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITY_CLASSES}
+        # Admitted requests not at the stage yet: holder -> [priority, count, expires_at].
+        self._reserved: Dict[Any, List[Any]] = {}
+
+    def reserve(self, holder: Any, priority: str, count: int, expires_at: float) -> None:
+        """Counts `count` admitted requests of `holder` as waiting until they arrive, or until `expires_at` (time.monotonic())."""
+        if count > 0:
+            self._reserved[holder] = [priority, count, expires_at]
+
+    def unreserve(self, holder: Any, count: Optional[int] = None) -> None:
+        """Stops counting `count` (default: all) of `holder`'s reserved requests."""
+        entry = self._reserved.get(holder)
+        if entry is None:
+            return
+        entry[1] -= entry[1] if count is None else count
+        if entry[1] <= 0:
+            del self._reserved[holder]
+
+    def reserved(self, priority: str) -> int:
+        """Admitted requests of `priority` that have not reached the stage yet."""
+        now = time.monotonic()
+        for holder in [holder for holder, (_, _, expires_at) in self._reserved.items() if expires_at <= now]:
+            del self._reserved[holder]
+        return sum(count for p, count, _ in self._reserved.values() if p == priority)
+
+    def queued(self, priority: str) -> int:
+        """Requests of `priority` waiting for a slot."""
+        return len(self._waiters[priority])
+
+    def backlog(self, priority: str, count: int = 1) -> int:
+        """Requests that would be waiting for a slot, up to the last of `count` new requests of `priority`."""
+        rank = PRIORITY_CLASSES.index(priority)
+        ahead = sum(len(self._waiters[p]) + self.reserved(p) for p in PRIORITY_CLASSES[:rank + 1])
+        return max(0, self.running + ahead + count - self.slots)
+
+    def estimated_wait(self, priority: str, count: int = 1) -> float:
+        """Seconds the last of `count` new requests of `priority` would wait for a slot."""
+        return self.backlog(priority, count) / self.slots * self.service_time_s
+
+    async def acquire(self, priority: str, timeout_s: Optional[float] = None) -> bool:
+        """Waits for a slot. Returns False if none was free within `timeout_s`."""
+        if self.running < self.slots and not any(self._waiters.values()):
+            self.running += 1
+            return True
+        if timeout_s is not None and timeout_s <= 0:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout_s)
+            return True
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over as the wait ended: give it back.
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters[priority].remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return False
+
+    def release(self) -> None:
+        """Frees a slot, handing it to the next waiter if there is one."""
+        for priority in PRIORITY_CLASSES:
+            waiters = self._waiters[priority]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    # `running` is unchanged: the slot changes hands.
+                    waiter.set_result(True)
+                    return
+        self.running -= 1
+
+    def observe(self, seconds: float) -> None:
+        """Folds the duration of a finished request into the service time estimate."""
+        self.service_time_s += SERVICE_TIME_SMOOTHING * (seconds - self.service_time_s)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "slots": self.slots,
+            "running": self.running,
+            "queued": {priority: len(waiters) for priority, waiters in self._waiters.items()},
+            "reserved": {priority: self.reserved(priority) for priority in PRIORITY_CLASSES},
+            "service_time_s": round(self.service_time_s, 3),
+        }
+
+
+# =======================================================================
+#  ADMISSION CONTROLLER
+# =======================================================================
+
+class AdmissionTicket:
+    """
+    An admitted request. `relay` runs its pipeline events through the stage
+    slots: a text slot until the copy is written, then an image slot. A
+    campaign's ticket is shared by its posts, each taking `text_slot` and
+    `image_slot` in turn. Whoever holds the ticket closes it when done, so
+    the posts that never reach a stage stop counting as waiting.
+    """
+    def __init__(self, controller: "AdmissionController", priority: str, deadline: float, skip_image: bool):
+        self.controller = controller
+        self.priority = priority
+        # time.monotonic() by which the request must be answered.
+        self.deadline = deadline
+        self.skip_image = skip_image
+
+    def remaining_s(self) -> float:
+        return self.deadline - time.monotonic()
+
+    def close(self) -> None:
+        """Drops the reservations of the posts that have not reached a stage."""
+        for stage in self.controller.stages.values():
+            stage.unreserve(self)
+
+    @asynccontextmanager
+    async def text_slot(self) -> AsyncIterator[None]:
+        """
+        Holds a slot of the text stage. Raises AdmissionRejected (503) if
+        none frees up while the copy could still be written in time.
+        """
+        text = self.controller.stages[TEXT_STAGE]
+        # Arrived: from here on the request is running or waiting.
+        text.unreserve(self, 1)
+        if not await text.acquire(self.priority, self.remaining_s() - text.service_time_s):
+            ADMISSION_DECISIONS.labels(self.priority, EXPIRED_IN_QUEUE).inc()
+            raise AdmissionRejected(503, "The server is overloaded and could not start this request before its deadline.", text.estimated_wait(self.priority))
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            text.release()
+        text.observe(time.monotonic() - start)
+
+    @asynccontextmanager
+    async def image_slot(self) -> AsyncIterator[bool]:
+        """
+        Holds a slot of the image stage and yields True, or yields False
+        (holding nothing) when the image is to be skipped: the ticket was
+        admitted without it, or in degraded mode it could no longer be ready
+        before the deadline. Without degraded mode it waits regardless.
+        """
+        image = self.controller.stages[IMAGE_STAGE]
+        image.unreserve(self, 1)
+        budget_s = self.remaining_s() - image.service_time_s if self.controller.degraded_mode else None
+        if self.skip_image or (budget_s is not None and budget_s < 0) or not await image.acquire(self.priority, budget_s):
+            if not self.skip_image:
+                ADMISSION_DECISIONS.labels(self.priority, DEGRADED).inc()
+            print(f"   -> [ADMISSION] Skipping the image of a '{self.priority}' request to meet its deadline.")
+            yield False
+            return
+        start = time.monotonic()
+        try:
+            yield True
+        finally:
+            image.release()
+        image.observe(time.monotonic() - start)
+
+    async def relay(self, events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yields the pipeline's `(event, data)` pairs, holding a slot of the
+        current stage. If the image cannot be ready before the deadline, the
+        pipeline is stopped after the copy and an `image_skipped` event is
+        yielded instead of the image events. Raises AdmissionRejected (503)
+        if no text slot frees up in time.
+        """
+        try:
+            async with self.text_slot():
+                async for event, data in events:
+                    yield event, data
+                    if event == "generated_copy_text":
+                        break
+
+            # The pipeline generator is paused right after the copy text, so
+            # the image stage does not start until we hold an image slot.
+            async with self.image_slot() as granted:
+                if not granted:
+                    yield "image_skipped", True
+                    return
+                async for event, data in events:
+                    yield event, data
+        finally:
+            self.close()
+            await events.aclose()
+
+
+class AdmissionController:
+    """
+    Decides, per request, whether the text and image stages can serve it
+    before its deadline. One controller per worker process: the capacity it
+    models is the models held by that worker.
+    """
+    def __init__(
+        self,
+        text_slots: int,
+        image_slots: int,
+        text_service_time_s: float,
+        image_service_time_s: float,
+        queue_limits: Dict[str, int],
+        degraded_mode: bool = True,
+    ):
+        unknown = set(queue_limits) - set(PRIORITY_CLASSES)
+        if unknown:
+            raise ValueError(f"Unknown priority classes {sorted(unknown)}. Available: {list(PRIORITY_CLASSES)}.")
+        self.stages = {
+            TEXT_STAGE: StageCapacity(TEXT_STAGE, text_slots, text_service_time_s),
+            IMAGE_STAGE: StageCapacity(IMAGE_STAGE, image_slots, image_service_time_s),
+        }
+        self.queue_limits = queue_limits
+        self.degraded_mode = degraded_mode
+
+    def estimate(self, priority: str, posts: int = 1) -> Tuple[float, float]:
+        """
+        Estimated seconds until the last of `posts` new requests of `priority`
+        has its copy, and until it has its image. The image stage starts on
+        the first copy, so for several posts the slower stage sets the pace.
+        """
+        text, image = self.stages[TEXT_STAGE], self.stages[IMAGE_STAGE]
+        first_copy_ready = text.estimated_wait(priority) + text.service_time_s
+        copy_ready = text.estimated_wait(priority, posts) + text.service_time_s
+        image_ready = max(first_copy_ready + image.estimated_wait(priority, posts), copy_ready) + image.service_time_s
+        return copy_ready, image_ready
+
+    def admit(self, priority: str, deadline_s: float, posts: int = 1) -> AdmissionTicket:
+        """
+        Admits a request of `posts` posts (1, or the size of a campaign) that
+        must finish within `deadline_s`, or raises AdmissionRejected right
+        away: 429 if its posts would overflow the queue of its priority
+        class, 503 if even its copy (or, without degraded mode, its image)
+        could not be ready in time.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class '{priority}'. Available: {list(PRIORITY_CLASSES)}.")
+        text = self.stages[TEXT_STAGE]
+        copy_ready, image_ready = self.estimate(priority, posts)
+
+        # Only the posts that would have to wait take a place in the queue,
+        # whether they are new or admitted and on their way.
+        if text.queued(priority) + min(text.reserved(priority) + posts, text.backlog(priority, posts)) > self.queue_limits.get(priority, 0):
+            ADMISSION_DECISIONS.labels(priority, REJECTED_QUEUE_FULL).inc()
+            raise AdmissionRejected(429, f"Too many queued requests for priority class '{priority}'.", text.estimated_wait(priority, posts))
+
+        # A campaign whose last posts would miss the image deadline is still
+        # admitted with images: each post's image slot decides for itself.
+        skip_image = posts == 1 and image_ready > deadline_s
+        if image_ready > deadline_s and (not self.degraded_mode or copy_ready > deadline_s):
+            ADMISSION_DECISIONS.labels(priority, REJECTED_DEADLINE).inc()
+            needed = copy_ready if self.degraded_mode else image_ready
+            raise AdmissionRejected(
+                503,
+                f"The estimated time to complete ({needed:.1f}s) exceeds the deadline ({deadline_s:.1f}s).",
+                # Roughly the time until the backlog ahead has shrunk enough to fit.
+                needed - deadline_s
+            )
+        ADMISSION_DECISIONS.labels(priority, DEGRADED if skip_image else ADMITTED).inc()
+        ticket = AdmissionTicket(self, priority, time.monotonic() + deadline_s, skip_image)
+        text.reserve(ticket, priority, posts, ticket.deadline)
+        if not skip_image:
+            self.stages[IMAGE_STAGE].reserve(ticket, priority, posts, ticket.deadline)
+        return ticket
+
+    def stats(self) -> Dict[str, Any]:
+        """Slots, queue depths and service time estimates of both stages."""
+        return {name: stage.stats() for name, stage in self.stages.items()}
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Cross-request micro-batching for the Amplify AI project.
+
+Model calls are much cheaper per item when they run as one batched forward
+pass. This module provides a small asyncio helper that collects work items
+from concurrent requests for a short time window and runs them together.
+"""
+# =======================================================================
+#  6. MICRO-BATCHING - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Callable, List, Optional, Set, Tuple
+
+
+# -----------------------------------------------------------------------
+#  MICRO-BATCHER
+# -----------------------------------------------------------------------
+
+class MicroBatcher:
+    """
+    Merges work items submitted by concurrent coroutines into batched calls.
+
+    - `batch_fn` is a blocking function that takes a list of items and returns
+      a list of results in the same order. It runs in `executor` so the event
+      loop is never blocked.
+    - A batch is dispatched as soon as `max_batch_size` items are pending, or
+      `max_wait_ms` after the first item of a partial batch arrived. The wait
+      is therefore the maximum latency added to any single item.
+    - With `max_in_flight`, at most that many batches run at once. Items that
+      arrive while the backend is busy keep accumulating and are dispatched
+      together as soon as a running batch finishes (continuous batching).
+    """
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        executor: Optional[Executor] = None,
+        max_in_flight: Optional[int] = None,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max_wait_ms
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Queues a single item and waits for its result."""
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items: List[Any]) -> List[Any]:
+        """Queues several items and waits for all of their results."""
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in items]
+        self._pending.extend(zip(items, futures))
+
+        self._schedule(loop)
+        return list(await asyncio.gather(*futures))
+
+    def _can_dispatch(self) -> bool:
+        """Returns True if another batch may start now."""
+        return self.max_in_flight is None or self._in_flight < self.max_in_flight
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Dispatches full batches and arms the partial-batch timer if needed."""
+        # Dispatch every full batch right away; keep the remainder waiting
+        # for more items until the time window closes.
+        while len(self._pending) >= self.max_batch_size and self._can_dispatch():
+            self._dispatch(self.max_batch_size)
+        if not self._pending:
+            self._cancel_timer()
+        elif self._timer is None and self._can_dispatch():
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+        # Otherwise the backend is busy: pending items are flushed when a
+        # running batch completes.
+
+    def _flush(self) -> None:
+        """Dispatches whatever is pending, as far as the in-flight limit allows."""
+        self._cancel_timer()
+        while self._pending and self._can_dispatch():
+            self._dispatch(self.max_batch_size)
+
+    def _dispatch(self, size: int) -> None:
+        """Takes up to `size` pending items and runs them as one batch."""
+        batch, self._pending = self._pending[:size], self._pending[size:]
+        self._in_flight += 1
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a strong reference so the task is not garbage-collected mid-run.
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]) -> None:
+        """Executes `batch_fn` off the loop and resolves each caller's future."""
+        items = [item for item, _ in batch]
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} items.")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            # Never leave a caller waiting forever (e.g. if this task was cancelled).
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            self._in_flight -= 1
+            # Items that piled up while this batch ran have already waited at
+            # least one full batch; send them off without a further window.
+            self._flush()
+
+    def _cancel_timer(self) -> None:
+        """Cancels the partial-batch timer, if one is armed."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
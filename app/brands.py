@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Brand store for the Amplify AI project.
+
+A brand (its guide plus its style images) rarely changes between requests, yet
+every ad-hoc `/generate` call re-uploads, re-captions and re-embeds it. This
+module keeps registered brands on disk instead: the guide, the image captions,
+the guide chunks and the persisted vector index, so a request only needs to
+send a `brand_id` and its prompt.
+"""
+# =======================================================================
+#  14. BRAND STORE - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import hashlib
+import json
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+# Layout of a brand directory inside the store (the index directory is
+# named after the vector store backend that built it).
+RECORD_FILE = "brand.json"
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def chunk_id(document: Document) -> str:
+    """Content address of a chunk: its text plus its header metadata, so a moved section counts as changed."""
+    digest = hashlib.sha256(json.dumps(document.metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(document.page_content.encode("utf-8"))
+    return digest.hexdigest()
+
+def _unique_chunks(documents: List[Document]) -> Dict[str, Document]:
+    """Maps chunk ids to documents, dropping exact duplicates (they would add nothing to retrieval)."""
+    chunks: Dict[str, Document] = {}
+    for document in documents:
+        chunks.setdefault(chunk_id(document), document)
+    return chunks
+
+
+@dataclass
+class Brand:
+    """A registered brand: its raw assets and the chunks its vector index was built from."""
+    id: str
+    name: Optional[str]
+    content_hash: str
+    brand_guide_content: str
+    image_captions: List[str]
+    chunks: List[Dict[str, Any]]
+    created_at: float = field(default_factory=time.time)
+    updated_at: Optional[float] = None
+    # How many chunks the last (re-)indexing embedded, deleted and kept.
+    last_indexing: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public view of the brand (the guide text itself is not echoed back)."""
+        return {
+            "brand_id": self.id,
+            "name": self.name,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "num_chunks": len(self.chunks),
+            "num_images": len(self.image_captions),
+            "image_captions": self.image_captions,
+            "last_indexing": self.last_indexing or None,
+        }
+
+
+# -----------------------------------------------------------------------
+#  BRAND STORE
+# -----------------------------------------------------------------------
+
+class BrandStore:
+    """
+    Disk-persisted registry of ingested brands.
+
+    Each brand lives in `root_dir/<brand_id>/`: a JSON record with its assets
+    and chunks, plus the persisted vector index in `<index_name>/`. An index
+    missing for the current `index_name` (e.g. after switching the vector
+    store backend) is rebuilt from the stored chunks on first use. Unlike the brand index cache,
+    nothing is ever evicted: a brand stays until it is deleted. Opened indexes
+    are kept in memory so requests do not re-open them from disk.
+
+    Chunks are stored in the index under their content address (`chunk_id`),
+    so an update only embeds new or edited chunks and deletes removed ones;
+    the vectors of unchanged chunks are kept as they are.
+    """
+    def __init__(self, root_dir: str, index_name: str):
+        self.root_dir = Path(root_dir)
+        self.index_name = index_name
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._brands: Dict[str, Brand] = {}
+        self._indexes: Dict[str, Any] = {}
+        # Serialize the slow work on one brand (index loads, rebuilds and
+        # updates) without blocking requests for other brands.
+        self._brand_locks: Dict[str, threading.RLock] = {}
+        # Modification time of each record when it was read, to notice
+        # changes made by other worker processes sharing `root_dir`.
+        self._mtimes: Dict[str, float] = {}
+
+        # Reload the brands registered by previous runs.
+        for record_path in self.root_dir.glob(f"*/{RECORD_FILE}"):
+            self._read_record(record_path.parent.name)
+
+    def create(
+        self,
+        name: Optional[str],
+        content_hash: str,
+        brand_guide_content: str,
+        image_captions: List[str],
+        documents: List[Document],
+        build_fn: Callable[[List[Document], List[str], Path], Any],
+    ) -> Brand:
+        """
+        Registers a new brand and builds its index.
+
+        `build_fn(documents, ids, path)` must create and persist the vector
+        index of `documents` (stored under `ids`) inside `path`.
+        """
+        chunks = _unique_chunks(documents)
+        brand = Brand(
+            id=uuid.uuid4().hex,
+            name=name,
+            content_hash=content_hash,
+            brand_guide_content=brand_guide_content,
+            image_captions=image_captions,
+            chunks=[{"page_content": doc.page_content, "metadata": doc.metadata} for doc in chunks.values()],
+            last_indexing={"embedded": len(chunks), "deleted": 0, "unchanged": 0},
+        )
+        brand_dir = self.root_dir / brand.id
+        brand_dir.mkdir(parents=True)
+        try:
+            index = build_fn(list(chunks.values()), list(chunks), brand_dir / self.index_name)
+            self._write_record(brand)
+        except Exception:
+            shutil.rmtree(brand_dir, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self._brands[brand.id] = brand
+            self._indexes[brand.id] = index
+        return brand
+
+    def update(
+        self,
+        brand_id: str,
+        content_hash: str,
+        brand_guide_content: str,
+        image_captions: List[str],
+        documents: List[Document],
+        build_fn: Callable[[List[Document], List[str], Path], Any],
+        load_fn: Callable[[Path], Any],
+        name: Optional[str] = None,
+    ) -> Tuple[Brand, Dict[str, int]]:
+        """
+        Re-indexes a brand incrementally: only chunks whose content address is
+        new are embedded, chunks that disappeared are deleted from the index,
+        and every other vector is kept. Returns `(brand, report)` where the
+        report counts the embedded, deleted and unchanged chunks. Raises
+        KeyError if the brand is unknown.
+        """
+        # Updates of the same brand are serialized; other brands are unaffected.
+        with self._brand_lock(brand_id):
+            brand = self.get(brand_id)
+            if brand is None:
+                raise KeyError(brand_id)
+            index = self.get_index(brand_id, build_fn, load_fn)
+
+            old_ids = set(_unique_chunks([Document(**chunk) for chunk in brand.chunks]))
+            new_chunks = _unique_chunks(documents)
+            added_ids = [id_ for id_ in new_chunks if id_ not in old_ids]
+            removed_ids = [id_ for id_ in old_ids if id_ not in new_chunks]
+
+            if added_ids:
+                index.add_documents([new_chunks[id_] for id_ in added_ids], ids=added_ids)
+            if removed_ids:
+                index.delete(ids=removed_ids)
+
+            report = {"embedded": len(added_ids), "deleted": len(removed_ids), "unchanged": len(new_chunks) - len(added_ids)}
+            updated = Brand(
+                id=brand.id,
+                name=name if name is not None else brand.name,
+                content_hash=content_hash,
+                brand_guide_content=brand_guide_content,
+                image_captions=image_captions,
+                chunks=[{"page_content": doc.page_content, "metadata": doc.metadata} for doc in new_chunks.values()],
+                created_at=brand.created_at,
+                updated_at=time.time(),
+                last_indexing=report,
+            )
+            self._write_record(updated)
+            with self._lock:
+                self._brands[brand_id] = updated
+            return updated, report
+
+    def get(self, brand_id: str) -> Optional[Brand]:
+        """
+        Returns a brand by id, or None if it is unknown. The record on disk is
+        authoritative: brands created, updated or deleted by another worker
+        process are picked up here (one `stat` per call).
+        """
+        # Ids are uuid4 hex strings; anything else never reaches the filesystem.
+        if not brand_id.isalnum():
+            return None
+        try:
+            mtime = (self.root_dir / brand_id / RECORD_FILE).stat().st_mtime
+        except FileNotFoundError:
+            with self._lock:
+                if brand_id in self._brands:
+                    self._forget(brand_id)
+            return None
+        if self._mtimes.get(brand_id) != mtime:
+            self._read_record(brand_id)
+        return self._brands.get(brand_id)
+
+    def get_index(self, brand_id: str, build_fn: Callable[[List[Document], List[str], Path], Any], load_fn: Callable[[Path], Any]) -> Any:
+        """
+        Returns the vector index of a brand. On first use it is re-opened with
+        `load_fn(path)`, or rebuilt from the stored chunks with
+        `build_fn(documents, ids, path)` if this backend has no index yet.
+        """
+        if self.get(brand_id) is None:
+            raise KeyError(brand_id)
+        with self._lock:
+            if brand_id in self._indexes:
+                return self._indexes[brand_id]
+
+        # Opening or rebuilding an index is slow: only requests for this
+        # brand wait for it, and it is done once.
+        with self._brand_lock(brand_id):
+            with self._lock:
+                brand = self._brands.get(brand_id)
+                if brand is None:
+                    raise KeyError(brand_id)
+                if brand_id in self._indexes:
+                    return self._indexes[brand_id]
+            index_dir = self.root_dir / brand_id / self.index_name
+            if index_dir.exists():
+                index = load_fn(index_dir)
+            else:
+                chunks = _unique_chunks([Document(**chunk) for chunk in brand.chunks])
+                index = build_fn(list(chunks.values()), list(chunks), index_dir)
+            with self._lock:
+                # Keep it only if the record did not change (or vanish) meanwhile.
+                if self._brands.get(brand_id) is brand:
+                    self._indexes[brand_id] = index
+            return index
+
+    def delete(self, brand_id: str) -> bool:
+        """Removes a brand and its index. Returns False if it was unknown."""
+        if self.get(brand_id) is None:
+            return False
+        with self._lock:
+            brand = self._brands.get(brand_id)
+            self._forget(brand_id)
+        if brand is None:
+            return False
+        shutil.rmtree(self.root_dir / brand_id, ignore_errors=True)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of registered brands and of indexes open in memory."""
+        return {"brands": len(self._brands), "open_indexes": len(self._indexes)}
+
+    def _brand_lock(self, brand_id: str) -> threading.RLock:
+        """Returns the lock serializing index work on one brand (re-entrant: `update` calls `get_index`)."""
+        with self._lock:
+            return self._brand_locks.setdefault(brand_id, threading.RLock())
+
+    def _write_record(self, brand: Brand) -> None:
+        """Persists a brand record with write-then-rename, so a crash never leaves a truncated record behind."""
+        brand_dir = self.root_dir / brand.id
+        tmp_path = brand_dir / f"{RECORD_FILE}.tmp"
+        tmp_path.write_text(json.dumps(asdict(brand), ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(brand_dir / RECORD_FILE)
+        self._mtimes[brand.id] = (brand_dir / RECORD_FILE).stat().st_mtime
+
+    def _read_record(self, brand_id: str) -> None:
+        """(Re-)loads a brand record from disk. A changed record invalidates the open index."""
+        record_path = self.root_dir / brand_id / RECORD_FILE
+        try:
+            mtime = record_path.stat().st_mtime
+            brand = Brand(**json.loads(record_path.read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if brand_id in self._mtimes:
+                self._indexes.pop(brand_id, None)
+            self._brands[brand_id] = brand
+            self._mtimes[brand_id] = mtime
+
+    def _forget(self, brand_id: str) -> None:
+        """Drops everything held in memory for a brand (call with the lock held)."""
+        self._brands.pop(brand_id, None)
+        self._indexes.pop(brand_id, None)
+        self._brand_locks.pop(brand_id, None)
+        self._mtimes.pop(brand_id, None)
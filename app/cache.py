@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+Caching layer for the Amplify AI project.
+
+This module holds the caches that let the pipeline skip expensive, repeated
+work (captioning, chunking, embedding, indexing, LLM calls) when a brand sends
+the same assets or a near-identical prompt again.
+"""
+# =======================================================================
+#  5. CACHING LAYER - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import hashlib
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def hash_brand_assets(brand_guide_text: str, image_captions: List[str]) -> str:
+    """Builds a stable content hash for a brand guide plus its image captions."""
+    digest = hashlib.sha256()
+    digest.update(brand_guide_text.encode("utf-8"))
+    for caption in image_captions:
+        # A separator byte keeps ["ab", "c"] and ["a", "bc"] from colliding.
+        digest.update(b"\x00")
+        digest.update(caption.encode("utf-8"))
+    return digest.hexdigest()
+
+def hash_image_bytes(image_bytes: bytes) -> str:
+    """Builds a content address for an uploaded image from its raw bytes."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+# -----------------------------------------------------------------------
+#  BRAND INDEX CACHE
+# -----------------------------------------------------------------------
+
+class BrandIndexCache:
+    """
+    Disk-persisted, LRU-bounded cache of per-brand vector indexes.
+
+    Each entry lives in its own sub-directory of `cache_dir`, named after the
+    content hash of the brand assets. Loaded indexes are also kept in memory so
+    that a hit does not even pay the cost of re-opening the store from disk.
+    The least recently used entry is evicted (from memory and disk) once more
+    than `max_entries` indexes are held, unless a request is loading, building
+    or waiting for it: that one is skipped until it is free again.
+    """
+    def __init__(self, cache_dir: str, max_entries: int):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Any] = {}
+        # Per-key locks, and how many requests hold or wait for each (a key in
+        # use is never evicted; its lock is dropped when the last one leaves).
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._key_users: Dict[str, int] = {}
+
+        # Rebuild the LRU order from the previous run using directory mtimes.
+        existing = sorted(
+            (path for path in self.cache_dir.iterdir() if path.is_dir()),
+            key=lambda path: path.stat().st_mtime,
+        )
+        self._entries: "OrderedDict[str, Path]" = OrderedDict((path.name, path) for path in existing)
+        self._evict()
+
+    def get_or_build(self, key: str, build_fn: Callable[[Path], Any], load_fn: Callable[[Path], Any]) -> Any:
+        """
+        Returns the index stored under `key`, building it on a miss.
+
+        - `build_fn(path)` must create and persist a new index inside `path`.
+        - `load_fn(path)` must re-open an index previously persisted in `path`.
+        """
+        # A per-key lock lets different brands build in parallel while two
+        # requests for the same new brand wait for a single build.
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+            self._key_users[key] = self._key_users.get(key, 0) + 1
+
+        try:
+            with key_lock:
+                with self._lock:
+                    path = self._entries.get(key)
+                    if path is not None:
+                        self.hits += 1
+                        self._entries.move_to_end(key)
+                        path.touch(exist_ok=True)
+                        index = self._loaded.get(key)
+                        if index is not None:
+                            return index
+                    else:
+                        self.misses += 1
+
+                if path is not None:
+                    index = load_fn(path)
+                else:
+                    path = self.cache_dir / key
+                    try:
+                        index = build_fn(path)
+                    except Exception:
+                        # Never leave a half-written index behind to be "hit" later.
+                        shutil.rmtree(path, ignore_errors=True)
+                        raise
+
+                with self._lock:
+                    self._entries[key] = path
+                    self._entries.move_to_end(key)
+                    self._loaded[key] = index
+                    self._evict()
+                return index
+        finally:
+            with self._lock:
+                self._key_users[key] -= 1
+                if not self._key_users[key]:
+                    del self._key_users[key]
+                    del self._key_locks[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _evict(self) -> None:
+        """Drops least recently used idle entries until the size bound is respected."""
+        for key in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            # Deleting the directory of an index being loaded would pull it
+            # from under the loader; new users must take the lock we hold.
+            if key in self._key_users:
+                continue
+            path = self._entries.pop(key)
+            self._loaded.pop(key, None)
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# -----------------------------------------------------------------------
+#  CAPTION CACHE
+# -----------------------------------------------------------------------
+
+class CaptionCache:
+    """
+    Content-addressed cache of image captions.
+
+    Captions are held in a size-bounded in-memory LRU. When `cache_dir` is set,
+    every caption is also written to disk so it survives restarts and can be
+    shared by several workers on the same host.
+    """
+    def __init__(self, max_entries: int, cache_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached caption for `key`, or None on a miss."""
+        with self._lock:
+            caption = self._entries.get(key)
+            if caption is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return caption
+
+        caption = self._read_from_disk(key)
+        with self._lock:
+            if caption is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, caption)
+            return caption
+
+    def put(self, key: str, caption: str) -> None:
+        """Stores a freshly generated caption in memory and, if enabled, on disk."""
+        with self._lock:
+            self._remember(key, caption)
+        if self.cache_dir is not None:
+            # Write-then-rename so a concurrent reader never sees a partial file.
+            tmp_path = self.cache_dir / f"{key}.tmp"
+            tmp_path.write_text(caption, encoding="utf-8")
+            tmp_path.replace(self.cache_dir / f"{key}.txt")
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters and the current number of in-memory entries."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _remember(self, key: str, caption: str) -> None:
+        """Inserts into the in-memory LRU and evicts the oldest entries if needed."""
+        self._entries[key] = caption
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_from_disk(self, key: str) -> Optional[str]:
+        """Looks the caption up in the disk store, if one is configured."""
+        if self.cache_dir is None:
+            return None
+        path = self.cache_dir / f"{key}.txt"
+        try:
+            return path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+
+
+# -----------------------------------------------------------------------
+#  CHUNK EMBEDDING CACHE
+# -----------------------------------------------------------------------
+
+class ChunkEmbeddingCache:
+    """
+    In-memory LRU of chunk vectors, keyed by the content hash of the chunk text.
+
+    Brand assets uploaded with each request get a new index whenever any byte
+    of them changes. Building that index through `CachedEmbeddings` embeds
+    only the chunks not seen before, so an edited guide costs its edited
+    sections, as it does for a registered brand. Only the `max_entries` most
+    recently used vectors are kept.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def embed_documents(self, embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+        """Returns the vectors of `texts`, embedding the unseen ones with `embeddings` in one batch."""
+        keys = [hashlib.sha256(text.encode("utf-8")).hexdigest() for text in texts]
+        with self._lock:
+            vectors = [self._vectors.get(key) for key in keys]
+            for key, vector in zip(keys, vectors):
+                if vector is not None:
+                    self._vectors.move_to_end(key)
+        missing = {key: text for key, text, vector in zip(keys, texts, vectors) if vector is None}
+        fresh = dict(zip(missing, embeddings.embed_documents(list(missing.values())))) if missing else {}
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            for key, vector in fresh.items():
+                self._vectors[key] = vector
+                self._vectors.move_to_end(key)
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+        return [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._vectors)}
+
+
+class CachedEmbeddings(Embeddings):
+    """`embeddings` with its document vectors served from a ChunkEmbeddingCache. Queries are not cached."""
+    def __init__(self, embeddings: Embeddings, cache: ChunkEmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.embed_documents(self.embeddings, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+# -----------------------------------------------------------------------
+#  INTENT CACHE
+# -----------------------------------------------------------------------
+
+class IntentCache:
+    """
+    In-memory LRU of recent prompt -> intent predictions.
+
+    Classification is deterministic, so an exact repeat of a prompt (a retry,
+    a campaign re-run, a /classify batch with duplicates) can reuse the
+    previous prediction. Only the `max_entries` most recent prompts are kept.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+
+    def get(self, prompt: str) -> Optional[Any]:
+        """Returns the cached prediction for `prompt`, or None on a miss."""
+        with self._lock:
+            prediction = self._entries.get(prompt)
+            if prediction is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(prompt)
+            return prediction
+
+    def put(self, prompt: str, prediction: Any) -> None:
+        """Stores a fresh prediction, evicting the least recently used ones if needed."""
+        with self._lock:
+            self._entries[prompt] = prediction
+            self._entries.move_to_end(prompt)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+# -----------------------------------------------------------------------
+#  SEMANTIC CACHE
+# -----------------------------------------------------------------------
+
+class SemanticCache:
+    """
+    Cache of LLM outputs keyed by the meaning of the prompt.
+
+    Entries are grouped by a `scope` (e.g. brand + intent + kind of call), so
+    a hit can never leak an answer across brands. A lookup first tries an
+    exact text match; only if that fails is the prompt embedded and compared
+    (cosine similarity) with the other prompts of the same scope. Entries
+    expire after `ttl_s` seconds, and the least recently used ones are evicted
+    once more than `max_entries` are held.
+    """
+    def __init__(self, embed_fn: Callable[[str], List[float]], threshold: float, ttl_s: float, max_entries: int):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (scope, text) -> (value, unit vector, created_at)
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[Any, np.ndarray, float]]" = OrderedDict()
+        # Small memo so that a put() right after a missed get() does not re-embed.
+        self._vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def get(self, scope: Hashable, text: str) -> Optional[Any]:
+        """Returns the cached value for `text` (or a semantically close one) in `scope`."""
+        key = (scope, text)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.exact_hits += 1
+                self._entries.move_to_end(key)
+                return entry[0]
+            candidates = [(k, v) for k, v in self._entries.items() if k[0] == scope]
+            if not candidates:
+                self.misses += 1
+                return None
+
+        vector = self._embed(text)
+        similarities = np.stack([v[1] for _, v in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        with self._lock:
+            if similarities[best] >= self.threshold:
+                best_key = candidates[best][0]
+                if best_key in self._entries:
+                    self.semantic_hits += 1
+                    self._entries.move_to_end(best_key)
+                    return candidates[best][1][0]
+            self.misses += 1
+            return None
+
+    def put(self, scope: Hashable, text: str, value: Any) -> None:
+        """Stores `value` as the answer to `text` within `scope`."""
+        vector = self._embed(text)
+        with self._lock:
+            self._entries[(scope, text)] = (value, vector, time.time())
+            self._entries.move_to_end((scope, text))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the hit/miss counters and the current number of entries."""
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+    def _embed(self, text: str) -> np.ndarray:
+        """Embeds `text` as a unit vector, memoizing the most recent results."""
+        with self._lock:
+            vector = self._vectors.get(text)
+            if vector is not None:
+                return vector
+        vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        vector /= (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            self._vectors[text] = vector
+            while len(self._vectors) > 256:
+                self._vectors.popitem(last=False)
+        return vector
+
+    def _expire(self, now: float) -> None:
+        """Drops entries older than the TTL. Must be called with the lock held."""
+        expired = [key for key, (_, _, created_at) in self._entries.items() if now - created_at > self.ttl_s]
+        for key in expired:
+            del self._entries[key]
@@ -14,8 +14,32 @@ should be stored in the .env file.
 #  1. CONFIGURATION & SETUP - Amplify AI
 # =======================================================================
 
+from pydantic import BaseModel
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
+
+
+class DiffusionProfile(BaseModel):
+    """
+    A named speed/quality trade-off for Stable Diffusion.
+
+    - Steps, resolution, guidance, scheduler and attention/VAE slicing are
+      applied on every call, so they can be picked per request.
+    - Channels-last and sequential CPU offload change how the weights are
+      laid out in memory; they are applied once, at load time, from the
+      default profile (DIFFUSION_PROFILE).
+    """
+    num_inference_steps: int = 50
+    height: int = 512
+    width: int = 512
+    guidance_scale: float = 7.5
+    # One of: "default" (the model's own scheduler), "dpm-solver", "euler-a", "ddim".
+    scheduler: str = "default"
+    attention_slicing: bool = False
+    vae_slicing: bool = False
+    channels_last: bool = False
+    sequential_cpu_offload: bool = False
+
 
 class Settings(BaseSettings):
     """
@@ -35,20 +59,83 @@ class Settings(BaseSettings):
     # A secret key used to protect endpoints. This should be a long, random
     # string and MUST be set in the .env file for any real deployment.
     API_SECRET_KEY: str = "your_default_secret_key_that_should_be_overridden"
+
+    # Priority class ("high", "standard" or "low") of each API key sent in the
+    # X-API-KEY header. Keys listed here are accepted alongside API_SECRET_KEY.
+    API_KEY_PRIORITIES: Dict[str, str] = {}
+
+    # Priority class of valid keys that are not listed in API_KEY_PRIORITIES.
+    API_KEY_DEFAULT_PRIORITY: str = "standard"
+
+    # Priority class of requests that send no API key at all.
+    ANONYMOUS_PRIORITY: str = "low"
     
     # -- Model Identifiers & Paths --
     
     # 1. Classical ML Model
     CLASSIFIER_MODEL_PATH: str = "models/intent_classifier.pkl"
+
+    # Classifier backend: "sklearn" (the .pkl model above), "onnx" (ONNX Runtime,
+    # CLASSIFIER_ONNX_PATH below) or "fake" (offline stand-in).
+    CLASSIFIER_BACKEND: str = "sklearn"
+
+    # The classifier exported to ONNX (`python -m app.inference export-classifier`).
+    CLASSIFIER_ONNX_PATH: str = "models/intent_classifier.onnx"
+
+    # Load the classifier with joblib's mmap_mode="r", so its numpy arrays are
+    # shared by forked workers instead of copied. Needs an uncompressed dump.
+    CLASSIFIER_MMAP: bool = False
+
+    # Maximum number of prompts accepted by a single POST /classify call.
+    CLASSIFY_MAX_PROMPTS: int = 256
     
     # 2. Diffusion Model (for image generation)
     DIFFUSION_MODEL_ID: str = "runwayml/stable-diffusion-v1-5"
     
+    # Diffusion backend: "diffusers" (real model) or "fake" (offline stand-in for tests/benchmarks).
+    DIFFUSION_BACKEND: str = "diffusers"
+
+    # Artificial per-call delay of the fake diffusion backend, in seconds.
+    FAKE_DIFFUSION_DELAY_S: float = 0.0
+
+    # Named diffusion performance profiles, selectable per request.
+    DIFFUSION_PROFILES: Dict[str, DiffusionProfile] = {
+        "draft": DiffusionProfile(
+            num_inference_steps=12, height=384, width=384, scheduler="dpm-solver",
+            attention_slicing=True, vae_slicing=True
+        ),
+        "standard": DiffusionProfile(num_inference_steps=25, scheduler="dpm-solver"),
+        # SD v1.5 is trained at 512x512 and tends to duplicate subjects above
+        # it, so "hq" spends its budget on steps rather than resolution. Raise
+        # height/width only with a model trained at that size (e.g. SD 2.x 768).
+        "hq": DiffusionProfile(num_inference_steps=75, scheduler="default"),
+    }
+
+    # Profile used when a request does not ask for one (also sets the load-time options).
+    DIFFUSION_PROFILE: str = "standard"
+    
     # 3. Image Captioning Model (for multimodal understanding)
     IMAGE_CAPTION_MODEL_ID: str = "Salesforce/blip-image-captioning-large"
+
+    # Captioner backend: "blip" (the model above), "blip-int8" (dynamic int8
+    # quantization, always on CPU) or "fake" (offline stand-in).
+    CAPTIONER_BACKEND: str = "blip"
+
+    # Artificial per-batch delay of the fake captioner, in seconds.
+    FAKE_CAPTION_DELAY_S: float = 0.0
+
+    # Size (MB) of the dummy weight buffer held by the fake captioner and the
+    # fake diffusion backend, so memory benchmarks see realistic resident sizes.
+    FAKE_MODEL_WEIGHTS_MB: int = 0
     
     # 4. Embedding Model (for RAG vectorization)
     EMBEDDING_MODEL_NAME: str = "paraphrase-multilingual-mpnet-base-v2"
+
+    # Embeddings backend: "huggingface" (the model above, fp32), "huggingface-int8"
+    # (dynamic int8 quantization, CPU), "onnx" (ONNX Runtime export of the same
+    # model) or "fake" (deterministic hash-based vectors of the same size,
+    # offline and nearly free).
+    EMBEDDINGS_BACKEND: str = "huggingface"
     
     # -- LangChain & Ollama Configuration --
     
@@ -58,6 +145,242 @@ class Settings(BaseSettings):
     # Faster LLM for retrieval and utility tasks
     LLM_RETRIEVER_MODEL: str = "qwen3:4b"
 
+    # Base URL of the Ollama server.
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+
+    # How long Ollama keeps a model loaded after its last request (Ollama duration format).
+    OLLAMA_KEEP_ALIVE: str = "30m"
+
+    # Size of the pool of keep-alive HTTP connections to Ollama.
+    OLLAMA_MAX_CONNECTIONS: int = 32
+
+    # Maximum number of in-flight requests per model.
+    OLLAMA_MAX_CONCURRENCY_PER_MODEL: int = 4
+
+    # Timeout (s) for a single Ollama request.
+    OLLAMA_TIMEOUT_S: float = 300.0
+
+    # Load both LLMs into Ollama's memory at startup (requires WARM_UP_MODELS).
+    OLLAMA_PREWARM: bool = True
+
+    # -- Model Loading --
+
+    # Load every model during startup instead of on first use.
+    WARM_UP_MODELS: bool = True
+
+    # -- CPU Inference --
+
+    # Intra-op threads of torch and ONNX Runtime. Leave empty for the library
+    # default (every core); with N server workers, cores / N avoids oversubscription.
+    INFERENCE_THREADS: Optional[int] = None
+
+    # Inter-op threads of torch and ONNX Runtime. Leave empty for the library default.
+    INFERENCE_INTEROP_THREADS: Optional[int] = None
+
+    # -- Server (python -m app.server) --
+
+    # Number of worker processes forked by the pre-fork server.
+    SERVER_WORKERS: int = 1
+
+    # Load the local models in the master process before forking, so every
+    # worker shares one copy of the weights (copy-on-write) instead of its own.
+    SERVER_PRELOAD_MODELS: bool = True
+
+    # -- Retrieval --
+
+    # Number of chunks returned by each sub-query's MMR search.
+    RETRIEVAL_K: int = 4
+
+    # Number of candidates fetched before MMR re-ranking.
+    RETRIEVAL_FETCH_K: int = 20
+
+    # Vector store backend for brand indexes: "numpy" (compact in-process matrix
+    # index, best for the tens-to-hundreds of chunks a brand produces) or "chroma".
+    VECTOR_STORE_BACKEND: str = "numpy"
+
+    # -- Pipeline --
+
+    # Run independent pipeline stages (intent, captioning + indexing, retrieval
+    # sub-queries) concurrently. Disable to run every stage strictly in sequence.
+    PIPELINE_CONCURRENT_STAGES: bool = True
+
+    # -- Campaigns --
+
+    # Maximum number of posts a single POST /campaigns call may ask for.
+    CAMPAIGN_MAX_POSTS: int = 30
+
+    # Maximum number of LLM calls (sub-queries, copy, image prompts) one campaign runs at once.
+    CAMPAIGN_LLM_CONCURRENCY: int = 4
+
+    # Maximum number of retrievals (MMR searches on the CPU pool) one campaign runs at once.
+    CAMPAIGN_RETRIEVAL_CONCURRENCY: int = 2
+
+    # -- Admission Control (/generate, /generate/stream, /campaigns, /jobs) --
+
+    # Requests running the text stages (intent, captions, RAG, copy) at once.
+    ADMISSION_TEXT_SLOTS: int = 4
+
+    # Requests running the image stage (image prompt + diffusion) at once.
+    # Keep it at least DIFFUSION_MAX_BATCH_SIZE so admitted requests can share diffusion batches.
+    ADMISSION_IMAGE_SLOTS: int = 4
+
+    # Initial estimates (s) of each stage's duration per request, refined from
+    # the observed durations as requests complete.
+    ADMISSION_TEXT_SECONDS: float = 10.0
+    ADMISSION_IMAGE_SECONDS: float = 30.0
+
+    # Maximum number of requests (or campaign posts) of each priority class
+    # waiting for a text slot. Further requests of that class get a 429.
+    ADMISSION_QUEUE_LIMITS: Dict[str, int] = {"high": 64, "standard": 32, "low": 8}
+
+    # Deadline (s) of requests without an X-Request-Timeout header, and the
+    # largest deadline a client may ask for. Campaigns and jobs, which are
+    # batch work, default to the largest.
+    ADMISSION_DEFAULT_DEADLINE_S: float = 120.0
+    ADMISSION_MAX_DEADLINE_S: float = 600.0
+
+    # When the image cannot be ready before the deadline but the copy can,
+    # return the copy without the image instead of refusing (or timing out).
+    ADMISSION_DEGRADED_MODE: bool = True
+
+    # -- Execution Layer --
+
+    # Size of the thread pool for accelerator-bound work (diffusion, captioning).
+    GPU_EXECUTOR_WORKERS: int = 1
+
+    # Size of the thread pool for local CPU-bound work (classifier, image decoding/encoding).
+    CPU_EXECUTOR_WORKERS: int = 4
+
+    # Size of the thread pool running the MMR searches of the retrieval sub-queries.
+    RETRIEVAL_EXECUTOR_WORKERS: int = 4
+
+    # -- Job Queue --
+
+    # Maximum number of jobs running the text stages (intent, captions, RAG, copy) at once.
+    JOB_TEXT_CONCURRENCY: int = 4
+
+    # Maximum number of jobs running the image stage (image prompt + diffusion) at once.
+    # Keep it at least DIFFUSION_MAX_BATCH_SIZE so queued jobs can share diffusion batches.
+    JOB_IMAGE_CONCURRENCY: int = 4
+
+    # Number of jobs kept in memory for polling before the oldest finished ones are dropped.
+    JOB_MAX_RETAINED: int = 1000
+
+    # Timeout (s) for webhook deliveries.
+    JOB_WEBHOOK_TIMEOUT_S: float = 10.0
+
+    # Hosts that job webhooks may be sent to. When empty, any host that
+    # resolves to public addresses only is accepted (never loopback, private
+    # or link-local ones). List internal hosts here to allow them explicitly.
+    JOB_WEBHOOK_ALLOWED_HOSTS: List[str] = []
+
+    # -- Batching --
+
+    # When enabled, intent classifications from concurrent requests are merged into shared batches.
+    CLASSIFIER_MICRO_BATCHING: bool = True
+
+    # Maximum number of prompts classified in a single call.
+    CLASSIFIER_MAX_BATCH_SIZE: int = 64
+
+    # Maximum time (ms) a prompt waits for others to fill a shared classification batch.
+    CLASSIFIER_MICRO_BATCH_WAIT_MS: float = 2.0
+
+    # Maximum number of images captioned in a single forward pass.
+    CAPTION_BATCH_SIZE: int = 8
+
+    # When enabled, captioning work from concurrent requests is merged into shared batches.
+    CAPTION_MICRO_BATCHING: bool = False
+
+    # Maximum time (ms) a caption request waits for others to fill a shared batch.
+    CAPTION_MICRO_BATCH_WAIT_MS: float = 10.0
+
+    # When enabled, image prompts from concurrent requests are rendered in shared diffusion batches.
+    DIFFUSION_MICRO_BATCHING: bool = True
+
+    # Maximum number of prompts rendered in a single diffusion call.
+    DIFFUSION_MAX_BATCH_SIZE: int = 4
+
+    # Maximum time (ms) a prompt waits for others before a partial batch is rendered.
+    # This is the maximum latency the scheduler adds to an idle device.
+    DIFFUSION_BATCH_WINDOW_MS: float = 50.0
+
+    # -- Caching --
+
+    # Directory where per-brand vector indexes are persisted between requests.
+    BRAND_INDEX_CACHE_DIR: str = "cache/brand_indexes"
+
+    # Maximum number of brand indexes kept before the least recently used is evicted.
+    BRAND_INDEX_CACHE_MAX_ENTRIES: int = 64
+
+    # Maximum number of chunk vectors kept in memory (keyed by chunk text), so a
+    # re-uploaded guide with a few edited sections only embeds those sections.
+    CHUNK_EMBEDDING_CACHE_MAX_ENTRIES: int = 4096
+
+    # Maximum number of recent prompt -> intent classifications kept in memory.
+    INTENT_CACHE_MAX_ENTRIES: int = 4096
+
+    # Maximum number of image captions kept in memory (keyed by image content hash).
+    CAPTION_CACHE_MAX_ENTRIES: int = 1024
+
+    # Optional directory backing the caption cache on disk. Leave empty to disable.
+    CAPTION_CACHE_DIR: Optional[str] = "cache/captions"
+
+    # Reuse LLM outputs (sub-queries, post copy, image prompts) for near-identical prompts.
+    SEMANTIC_CACHE_ENABLED: bool = True
+
+    # Minimum cosine similarity between two prompts for them to share a cached answer.
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+
+    # Time-to-live of a semantic cache entry, in seconds.
+    SEMANTIC_CACHE_TTL_S: float = 3600.0
+
+    # Maximum number of semantic cache entries before the least recently used is evicted.
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 2048
+
+    # -- Uploads --
+
+    # Largest accepted request body, in bytes. Larger requests get a 413 before they are parsed.
+    MAX_REQUEST_BYTES: int = 50 * 1024 * 1024
+
+    # Largest accepted single file (brand guide or style image), in bytes.
+    MAX_UPLOAD_FILE_BYTES: int = 15 * 1024 * 1024
+
+    # Maximum number of style images per request.
+    MAX_STYLE_IMAGES: int = 10
+
+    # Largest accepted style image, in pixels (checked from the header, before decoding).
+    MAX_IMAGE_PIXELS: int = 40_000_000
+
+    # Style images are decoded at reduced size, with their shorter side at most
+    # this many pixels. Match it to the captioner's input resolution (384 for BLIP).
+    CAPTION_IMAGE_SIZE: int = 384
+
+    # -- Image Output --
+
+    # Encoding of generated images: "png" (lossless, largest), "webp" or "jpeg".
+    IMAGE_FORMAT: str = "png"
+
+    # Quality (1-100) of WebP and JPEG images. Ignored for PNG.
+    IMAGE_QUALITY: int = 90
+
+    # Directory of the local image store behind GET /images/{id}.
+    IMAGE_STORE_DIR: str = "cache/images"
+
+    # Maximum number of stored images before the oldest are deleted.
+    IMAGE_STORE_MAX_ENTRIES: int = 1000
+
+    # -- Observability --
+
+    # Add a Server-Timing header (per-stage durations and cache outcomes) to
+    # non-streaming responses. Stage histograms are always served on /metrics.
+    SERVER_TIMING_HEADER: bool = False
+
+    # -- Brands --
+
+    # Directory where registered brands (assets, chunks and vector index) are stored.
+    # Unlike the caches above, entries are never evicted: they live until deleted.
+    BRAND_STORE_DIR: str = "data/brands"
+
     class Config:
         """
         Pydantic model configuration.
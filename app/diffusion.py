@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Diffusion performance profiles for the Amplify AI project.
+
+This module applies the named `DiffusionProfile`s from `Settings` to a Stable
+Diffusion pipeline: load-time options (memory layout, CPU offload) when the
+model is loaded, and per-call options (steps, resolution, scheduler, slicing)
+every time an image batch is rendered.
+"""
+# =======================================================================
+#  11. DIFFUSION PROFILES - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+# Internal imports
+from .config import DiffusionProfile, settings
+
+
+# Scheduler names accepted in profiles, mapped to their diffusers classes.
+SCHEDULERS = {
+    "dpm-solver": "DPMSolverMultistepScheduler",
+    "euler-a": "EulerAncestralDiscreteScheduler",
+    "ddim": "DDIMScheduler",
+}
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def resolve_profile(name: Optional[str] = None) -> Tuple[str, DiffusionProfile]:
+    """Returns `(name, profile)`, falling back to DIFFUSION_PROFILE. Raises ValueError if unknown."""
+    name = name or settings.DIFFUSION_PROFILE
+    try:
+        return name, settings.DIFFUSION_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown performance profile '{name}'. Available: {sorted(settings.DIFFUSION_PROFILES)}.")
+
+def apply_load_options(pipeline: Any, profile: DiffusionProfile, device: str) -> Any:
+    """Applies the load-time options of `profile` and moves the pipeline to `device`."""
+    if profile.channels_last:
+        import torch
+        pipeline.unet.to(memory_format=torch.channels_last)
+
+    if profile.sequential_cpu_offload:
+        if device == "cuda":
+            # Offloading manages device placement itself; don't call .to(device).
+            pipeline.enable_sequential_cpu_offload()
+            return pipeline
+        print("   -> sequential_cpu_offload ignored: no CUDA device available.")
+
+    return pipeline.to(device)
+
+
+# -----------------------------------------------------------------------
+#  RENDERER
+# -----------------------------------------------------------------------
+
+class DiffusionRenderer:
+    """
+    Renders image batches with a given performance profile.
+
+    Scheduler variants share every weight with the base pipeline (only the
+    scheduler object differs), so switching profiles costs no extra memory.
+    Calls are serialized: schedulers are stateful and slicing toggles mutate
+    the shared UNet/VAE, so two calls must never interleave.
+    """
+    def __init__(self, pipeline: Any):
+        self.pipeline = pipeline
+        self._variants: Dict[str, Any] = {"default": pipeline}
+        self._lock = threading.Lock()
+
+    def render(self, prompts: List[str], profile: DiffusionProfile, num_images_per_prompt: int = 1) -> List[Image.Image]:
+        """
+        Renders `num_images_per_prompt` images per prompt (grouped by prompt)
+        using the settings of `profile`. Several images of one prompt share
+        its text encoding and are denoised as one batch.
+        """
+        with self._lock:
+            pipeline = self._variant(profile.scheduler)
+            self._apply_slicing(pipeline, profile)
+            return pipeline(
+                prompts,
+                num_inference_steps=profile.num_inference_steps,
+                height=profile.height,
+                width=profile.width,
+                guidance_scale=profile.guidance_scale,
+                num_images_per_prompt=num_images_per_prompt,
+            ).images
+
+    def _variant(self, scheduler_name: str) -> Any:
+        """Returns the pipeline variant that uses `scheduler_name`, creating it on first use."""
+        if scheduler_name in self._variants:
+            return self._variants[scheduler_name]
+        if scheduler_name not in SCHEDULERS:
+            raise ValueError(f"Unknown scheduler '{scheduler_name}'. Available: {['default', *SCHEDULERS]}.")
+        if not hasattr(self.pipeline, "components"):
+            # Backends without swappable components (e.g. the fake one) ignore the scheduler.
+            return self.pipeline
+
+        import diffusers
+        scheduler_cls = getattr(diffusers, SCHEDULERS[scheduler_name])
+        scheduler = scheduler_cls.from_config(self.pipeline.scheduler.config)
+        self._variants[scheduler_name] = type(self.pipeline)(**{**self.pipeline.components, "scheduler": scheduler})
+        return self._variants[scheduler_name]
+
+    @staticmethod
+    def _apply_slicing(pipeline: Any, profile: DiffusionProfile) -> None:
+        """Turns attention and VAE slicing on or off for this call."""
+        if hasattr(pipeline, "enable_attention_slicing"):
+            if profile.attention_slicing:
+                pipeline.enable_attention_slicing()
+            else:
+                pipeline.disable_attention_slicing()
+        if hasattr(pipeline, "enable_vae_slicing"):
+            if profile.vae_slicing:
+                pipeline.enable_vae_slicing()
+            else:
+                pipeline.disable_vae_slicing()
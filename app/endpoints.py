@@ -14,27 +14,184 @@ service functions to perform the core logic.
 #  IMPORTS
 # -----------------------------------------------------------------------
 
-from typing import List
+import asyncio
+import json
+import os
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import (APIRouter, Depends, File, Form, HTTPException,
-                     UploadFile, status)
+from fastapi import (APIRouter, Depends, File, Form, Header, HTTPException,
+                     Request, Response, UploadFile, status)
+from fastapi.responses import FileResponse, StreamingResponse
 
 # Internal imports
-from .schemas import ContentGenerationOutput, Msg
+from .admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from .config import settings
+from .diffusion import resolve_profile
+from .images import DELIVER_B64, DELIVER_RAW, DELIVER_URL
+from .jobs import JobQueue, WebhookRejected, check_webhook_url
+from .registry import ModelRegistry
+from .schemas import (BrandOutput, ClassifyInput, ClassifyOutput,
+                      ContentGenerationOutput, JobCreated, JobQueueStats,
+                      JobStatus, Msg, ReadinessOutput)
+from .security import get_priority_class
 from .services import ContentGenerationService
+from .uploads import UploadRejected, check_image, decode_text, read_upload
 
 # -----------------------------------------------------------------------
 #  DEPENDENCY INJECTION SETUP
 # -----------------------------------------------------------------------
 
-# By creating the service instance here, we ensure it's a singleton.
-# The __init__ method (which loads all heavy models) is run only once
-# when the application starts, not on every request.
-content_generation_service = ContentGenerationService()
+# The service and the model registry are created once, in the application
+# lifespan (see main.py), and stored on `app.state`. These dependencies hand
+# out those shared instances, so no route ever loads its own copy of a model.
 
-def get_content_generation_service() -> ContentGenerationService:
+def get_content_generation_service(request: Request) -> ContentGenerationService:
     """Dependency function to get the shared service instance."""
-    return content_generation_service
+    return request.app.state.content_generation_service
+
+def get_model_registry(request: Request) -> ModelRegistry:
+    """Dependency function to get the shared model registry."""
+    return request.app.state.model_registry
+
+def get_job_queue(request: Request) -> JobQueue:
+    """Dependency function to get the shared job queue."""
+    return request.app.state.job_queue
+
+def get_admission_controller(request: Request) -> AdmissionController:
+    """Dependency function to get the shared admission controller."""
+    return request.app.state.admission_controller
+
+def _admit(admission: AdmissionController, priority: str, request_timeout: Optional[float], posts: int = 1, batch: bool = False) -> AdmissionTicket:
+    """
+    Admits a generation request of `posts` posts, or refuses it right away
+    with a 429/503 and a Retry-After header. Batch work (campaigns, jobs)
+    defaults to the largest deadline.
+    """
+    default_s = settings.ADMISSION_MAX_DEADLINE_S if batch else settings.ADMISSION_DEFAULT_DEADLINE_S
+    deadline_s = min(request_timeout or default_s, settings.ADMISSION_MAX_DEADLINE_S)
+    try:
+        return admission.admit(priority, deadline_s, posts)
+    except AdmissionRejected as e:
+        raise _rejection(e)
+
+def _rejection(e: AdmissionRejected) -> HTTPException:
+    """The HTTP error for a refused request."""
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after_s)})
+
+def _check_performance_profile(performance_profile: Optional[str]) -> None:
+    """Rejects unknown performance profiles before any work starts."""
+    try:
+        resolve_profile(performance_profile)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+def _check_brand_inputs(service: ContentGenerationService, brand_id: Optional[str], brand_guide_file: Optional[UploadFile], style_images: Optional[List[UploadFile]]) -> None:
+    """Requires either a registered `brand_id` or both brand uploads."""
+    if brand_id is not None:
+        if service.brand_store.get(brand_id) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Brand '{brand_id}' not found.")
+    elif brand_guide_file is None or not style_images:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide either a brand_id or both brand_guide_file and style_images."
+        )
+
+def _check_campaign_prompts(prompts: Optional[List[str]], user_prompt: Optional[str], variants: int) -> List[str]:
+    """Requires either a list of prompts or one prompt with variants, within CAMPAIGN_MAX_POSTS posts."""
+    if (prompts is None) == (user_prompt is None):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Provide either prompts (one per post) or a single user_prompt with variants."
+        )
+    if prompts is not None and variants != 1:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="variants can only be used with a single user_prompt.")
+    posts = len(prompts) if prompts is not None else variants
+    if not 1 <= posts <= settings.CAMPAIGN_MAX_POSTS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A campaign must have between 1 and {settings.CAMPAIGN_MAX_POSTS} posts (got {posts})."
+        )
+    return prompts if prompts is not None else [user_prompt]
+
+async def _read_brand_guide(brand_guide_file: UploadFile) -> str:
+    """Reads the brand guide text, within the per-file size limit."""
+    try:
+        data = await read_upload(brand_guide_file, settings.MAX_UPLOAD_FILE_BYTES)
+        return decode_text(data, brand_guide_file.filename)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+async def _read_style_images(style_images: List[UploadFile]) -> List[bytes]:
+    """Reads the raw style image bytes, rejecting too many, too large or non-image files before any decoding."""
+    if len(style_images) > settings.MAX_STYLE_IMAGES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.MAX_STYLE_IMAGES} style images are accepted per request."
+        )
+    try:
+        style_image_bytes = list(await asyncio.gather(*(read_upload(image_file, settings.MAX_UPLOAD_FILE_BYTES) for image_file in style_images)))
+        for image_file, image_bytes in zip(style_images, style_image_bytes):
+            check_image(image_bytes, image_file.filename, settings.MAX_IMAGE_PIXELS)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    return style_image_bytes
+
+async def _read_brand_uploads(brand_guide_file: UploadFile, style_images: List[UploadFile]) -> Tuple[str, List[bytes]]:
+    """Reads the brand guide text and the raw style image bytes."""
+    return await _read_brand_guide(brand_guide_file), await _read_style_images(style_images)
+
+async def _read_admitted_inputs(ticket: AdmissionTicket, brand_id: Optional[str], brand_guide_file: Optional[UploadFile], style_images: Optional[List[UploadFile]]) -> Tuple[str, List[bytes]]:
+    """Reads the brand uploads of an admitted request (none with a `brand_id`), closing its ticket if they are refused."""
+    if brand_id:
+        return "", []
+    try:
+        return await _read_brand_uploads(brand_guide_file, style_images)
+    except BaseException:
+        ticket.close()
+        raise
+
+# `response_mode` form values, and how each one has the pipeline deliver the image.
+RESPONSE_MODES = {"json": DELIVER_B64, "url": DELIVER_URL, "multipart": DELIVER_RAW}
+
+def _check_response_mode(response_mode: str, allowed: Tuple[str, ...]) -> str:
+    """Rejects unsupported response modes; returns the matching image delivery."""
+    if response_mode not in allowed:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown response_mode '{response_mode}'. Available: {list(allowed)}."
+        )
+    return RESPONSE_MODES[response_mode]
+
+def _to_output(result: Dict[str, Any]) -> ContentGenerationOutput:
+    """Keeps the pipeline events that are fields of the response model."""
+    return ContentGenerationOutput(**{k: v for k, v in result.items() if k in ContentGenerationOutput.model_fields})
+
+def _multipart_response(result: Dict[str, Any]) -> StreamingResponse:
+    """
+    Builds a multipart/mixed response: a JSON part with the post metadata,
+    then a part with the raw image bytes (no base64, no copy into the JSON).
+    """
+    boundary = uuid.uuid4().hex
+    image_data = result["generated_image"]
+    image_media_type = result["generated_image_media_type"]
+    metadata = _to_output(result)
+    parts = [
+        f"--{boundary}\r\nContent-Type: application/json; charset=utf-8\r\n\r\n".encode("utf-8"),
+        metadata.model_dump_json(exclude_none=True).encode("utf-8"),
+        (
+            f"\r\n--{boundary}\r\nContent-Type: {image_media_type}\r\n"
+            f"Content-Disposition: inline; filename=\"post.{image_media_type.split('/')[1]}\"\r\n"
+            f"Content-Length: {len(image_data)}\r\n\r\n"
+        ).encode("utf-8"),
+        image_data,
+        f"\r\n--{boundary}--\r\n".encode("utf-8"),
+    ]
+    return StreamingResponse(iter(parts), status_code=status.HTTP_201_CREATED, media_type=f"multipart/mixed; boundary={boundary}")
+
+def _format_sse(event: str, data: Any) -> str:
+    """Formats a single Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 # -----------------------------------------------------------------------
 #  ROUTER DEFINITION
@@ -58,47 +215,135 @@ async def health_check():
     return {"message": "Amplify AI service is running smoothly!"}
 
 
+@router.get(
+    "/health/ready",
+    response_model=ReadinessOutput,
+    tags=["Monitoring"],
+    summary="Check API Readiness",
+    description="Reports which models are resident in this worker. Returns 503 while models are still warming up."
+)
+async def readiness_check(response: Response, registry: ModelRegistry = Depends(get_model_registry)):
+    """Returns the load state of every registered model."""
+    models = registry.status()
+    # With lazy loading, a worker is ready as soon as it is up; with warm-up
+    # enabled, it is only ready once every model is resident.
+    ready = all(model["resident"] for model in models.values()) if settings.WARM_UP_MODELS else True
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {"ready": ready, "worker_pid": os.getpid(), "models": models}
+
+
+@router.post(
+    "/classify",
+    response_model=ClassifyOutput,
+    tags=["Content Generation"],
+    summary="Classify Prompt Intents",
+    description="Predicts the intent of a batch of prompts in one call, with the probability of every intent, so callers can route low-confidence prompts differently."
+)
+async def classify_prompts(payload: ClassifyInput, service: ContentGenerationService = Depends(get_content_generation_service)):
+    """Classifies every prompt of the batch (repeated prompts are served from the intent cache)."""
+    if len(payload.prompts) > settings.CLASSIFY_MAX_PROMPTS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.CLASSIFY_MAX_PROMPTS} prompts are accepted per request."
+        )
+    return {"predictions": await service.aclassify_intents(payload.prompts)}
+
+
 @router.post(
     "/generate",
     response_model=ContentGenerationOutput,
     status_code=status.HTTP_201_CREATED,
     tags=["Content Generation"],
     summary="Generate Multimodal Social Media Content",
-    description="This is the main endpoint. It accepts a user prompt, a brand guide, and style images to generate a complete social media post (text + image)."
+    description=(
+        "This is the main endpoint. It accepts a user prompt, a brand guide, and style images to generate a complete social media post (text + image). "
+        "Under load, requests are admitted by priority class (from the X-API-KEY header) only if they can finish before their deadline "
+        "(the X-Request-Timeout header, in seconds); otherwise they get a 429 or 503 with a Retry-After header. When only the copy "
+        "can be ready in time, it is returned without the image and with `image_skipped` set."
+    ),
+    responses={
+        201: {"content": {"multipart/mixed": {}}},
+        429: {"model": Msg, "description": "Too many queued requests of the caller's priority class. Retry after Retry-After seconds."},
+        503: {"model": Msg, "description": "The server cannot finish the request before its deadline. Retry after Retry-After seconds."},
+    }
 )
 async def generate_content(
     # The service instance is injected by FastAPI's dependency system
     service: ContentGenerationService = Depends(get_content_generation_service),
+    admission: AdmissionController = Depends(get_admission_controller),
+    priority: str = Depends(get_priority_class),
+    x_request_timeout: Optional[float] = Header(
+        None,
+        gt=0,
+        description="Seconds the client is willing to wait for the response (default: the server's ADMISSION_DEFAULT_DEADLINE_S)."
+    ),
     
     # Inputs are defined here using Form() and File() for multipart/form-data
     user_prompt: str = Form(
         ...,
         description="The user's core request, e.g., 'Announce our new fall coffee'."
     ),
-    brand_guide_file: UploadFile = File(
-        ...,
-        description="The user's brand guide in .md format."
+    brand_guide_file: Optional[UploadFile] = File(
+        None,
+        description="The user's brand guide in .md format. Omit when passing a brand_id."
     ),
-    style_images: List[UploadFile] = File(
-        ...,
-        description="A list of images that represent the brand's visual style."
+    style_images: Optional[List[UploadFile]] = File(
+        None,
+        description="A list of images that represent the brand's visual style. Omit when passing a brand_id."
+    ),
+    brand_id: Optional[str] = Form(
+        None,
+        description="A brand registered via POST /brands. Replaces brand_guide_file and style_images."
+    ),
+    performance_profile: Optional[str] = Form(
+        None,
+        description="Diffusion performance profile (e.g. 'draft', 'standard', 'hq'). Defaults to the server's DIFFUSION_PROFILE."
+    ),
+    bypass_cache: bool = Form(
+        False,
+        description="Skip the semantic cache and force fresh LLM calls for this request."
+    ),
+    response_mode: str = Form(
+        "json",
+        description="How the image is returned: 'json' (base64 in the JSON body), 'url' (a link to GET /images/{id}) or 'multipart' (a multipart/mixed body with the JSON and the raw image bytes)."
     )
 ):
     """
     Orchestrates the full content generation pipeline.
 
     - **Receives** user inputs as multipart form data.
+    - **Admits** the request (or refuses it right away) based on its priority and deadline.
     - **Delegates** the complex generation logic to the ContentGenerationService.
     - **Handles** potential errors and returns a structured response.
     """
+    _check_performance_profile(performance_profile)
+    _check_brand_inputs(service, brand_id, brand_guide_file, style_images)
+    image_delivery = _check_response_mode(response_mode, tuple(RESPONSE_MODES))
+    ticket = _admit(admission, priority, x_request_timeout)
+    brand_guide_content, style_image_bytes = await _read_admitted_inputs(ticket, brand_id, brand_guide_file, style_images)
     try:
-        # Call the main orchestrator method from the service
-        result = await service.create_post_pipeline(
+        # Run the main orchestrator of the service through the admission
+        # ticket, which holds a slot of each stage in turn
+        result = {}
+        events = service.stream_post_pipeline(
             user_prompt=user_prompt,
-            brand_guide_file=brand_guide_file,
-            style_images=style_images
+            brand_guide_content=brand_guide_content,
+            style_image_bytes=style_image_bytes,
+            performance_profile=performance_profile,
+            bypass_cache=bypass_cache,
+            brand_id=brand_id,
+            image_delivery=image_delivery
         )
-        return result
+        async for event, data in ticket.relay(events):
+            if event != "token":
+                result[event] = data
+        if image_delivery == DELIVER_RAW and "generated_image" in result:
+            return _multipart_response(result)
+        return _to_output(result)
+    except AdmissionRejected as e:
+        # Admitted, but no slot freed up in time
+        raise _rejection(e)
     except Exception as e:
         # A robust error handling block.
         # In a real production scenario, you would log the full exception trace.
@@ -106,4 +351,416 @@ async def generate_content(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An internal error occurred while generating content. Please check the server logs for more details."
-        )
\ No newline at end of file
+        )
+
+
+@router.post(
+    "/generate/stream",
+    tags=["Content Generation"],
+    summary="Generate Multimodal Social Media Content (Streaming)",
+    description=(
+        "Same inputs as /generate, but the response is a stream of Server-Sent Events. "
+        "Events are emitted as each pipeline stage finishes: `classified_intent`, `intent_confidence`, `generated_queries`, "
+        "`retrieved_context`, one `token` per chunk of post copy, `generated_copy_text`, "
+        "`generated_image_media_type`, `generated_image_b64` (or `generated_image_url`) and finally `done` (or `error`). "
+        "Admission control is the same as for /generate: a refused request gets a 429 or 503 before the stream starts, and "
+        "`image_skipped` replaces the image events when the image cannot be ready before the deadline."
+    ),
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}}
+)
+async def generate_content_stream(
+    service: ContentGenerationService = Depends(get_content_generation_service),
+    admission: AdmissionController = Depends(get_admission_controller),
+    priority: str = Depends(get_priority_class),
+    x_request_timeout: Optional[float] = Header(
+        None,
+        gt=0,
+        description="Seconds the client is willing to wait for the whole stream (default: the server's ADMISSION_DEFAULT_DEADLINE_S)."
+    ),
+    user_prompt: str = Form(
+        ...,
+        description="The user's core request, e.g., 'Announce our new fall coffee'."
+    ),
+    brand_guide_file: Optional[UploadFile] = File(
+        None,
+        description="The user's brand guide in .md format. Omit when passing a brand_id."
+    ),
+    style_images: Optional[List[UploadFile]] = File(
+        None,
+        description="A list of images that represent the brand's visual style. Omit when passing a brand_id."
+    ),
+    brand_id: Optional[str] = Form(
+        None,
+        description="A brand registered via POST /brands. Replaces brand_guide_file and style_images."
+    ),
+    performance_profile: Optional[str] = Form(
+        None,
+        description="Diffusion performance profile (e.g. 'draft', 'standard', 'hq'). Defaults to the server's DIFFUSION_PROFILE."
+    ),
+    bypass_cache: bool = Form(
+        False,
+        description="Skip the semantic cache and force fresh LLM calls for this request."
+    ),
+    response_mode: str = Form(
+        "json",
+        description="How the image is returned: 'json' (a base64 `generated_image_b64` event) or 'url' (a `generated_image_url` event linking to GET /images/{id})."
+    )
+):
+    """
+    Streams the content generation pipeline as Server-Sent Events.
+
+    - **Reads** the uploads up front (they are closed once this function returns).
+    - **Relays** each stage's output to the client as soon as it is ready.
+    """
+    _check_performance_profile(performance_profile)
+    _check_brand_inputs(service, brand_id, brand_guide_file, style_images)
+    image_delivery = _check_response_mode(response_mode, ("json", "url"))
+    ticket = _admit(admission, priority, x_request_timeout)
+    brand_guide_content, style_image_bytes = await _read_admitted_inputs(ticket, brand_id, brand_guide_file, style_images)
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            events = service.stream_post_pipeline(user_prompt, brand_guide_content, style_image_bytes, performance_profile, bypass_cache, brand_id, image_delivery)
+            async for event, data in ticket.relay(events):
+                yield _format_sse(event, data)
+            yield _format_sse("done", {})
+        except AdmissionRejected as e:
+            yield _format_sse("error", {"detail": e.detail, "retry_after_s": e.retry_after_s})
+        except Exception as e:
+            # The status line is already sent, so errors are reported in-band.
+            print(f"[ERROR] An unhandled exception occurred in the streaming pipeline: {e}")
+            yield _format_sse("error", {"detail": "An internal error occurred while generating content. Please check the server logs for more details."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post(
+    "/campaigns",
+    tags=["Content Generation"],
+    summary="Generate a Campaign of Posts (Streaming)",
+    description=(
+        "Generates many posts for one brand in a single request: one per entry of `prompts`, or `variants` variants of one "
+        "`user_prompt`. The brand is captioned and indexed once, every prompt is classified in one batch and retrieval runs "
+        "once per distinct prompt. The response is a stream of Server-Sent Events: one `post` event per finished post (in "
+        "completion order, with its `index`), a `post_error` event for each post that failed, a `summary` and finally `done` "
+        "(or `error` if the whole campaign failed). The campaign goes through admission control as one request weighted by "
+        "its number of posts (429 or 503 with a Retry-After header before the stream starts); each post then takes the "
+        "stage slots like a /generate request. Without an X-Request-Timeout header the deadline is the server's largest."
+    ),
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}},
+        429: {"model": Msg, "description": "The campaign's posts would overflow the queue of the caller's priority class. Retry after Retry-After seconds."},
+        503: {"model": Msg, "description": "The server cannot write the campaign's posts before its deadline. Retry after Retry-After seconds."},
+    }
+)
+async def generate_campaign(
+    service: ContentGenerationService = Depends(get_content_generation_service),
+    admission: AdmissionController = Depends(get_admission_controller),
+    priority: str = Depends(get_priority_class),
+    x_request_timeout: Optional[float] = Header(
+        None,
+        gt=0,
+        description="Seconds the client is willing to wait for the whole campaign (default: the server's ADMISSION_MAX_DEADLINE_S)."
+    ),
+    prompts: Optional[List[str]] = Form(
+        None,
+        description="One request per post (repeat the field). Omit when passing user_prompt."
+    ),
+    user_prompt: Optional[str] = Form(
+        None,
+        description="A single request to write `variants` variants of. Omit when passing prompts."
+    ),
+    variants: int = Form(
+        1,
+        description="Number of variants of user_prompt. Variants share one image prompt and are rendered together."
+    ),
+    brand_guide_file: Optional[UploadFile] = File(
+        None,
+        description="The user's brand guide in .md format. Omit when passing a brand_id."
+    ),
+    style_images: Optional[List[UploadFile]] = File(
+        None,
+        description="A list of images that represent the brand's visual style. Omit when passing a brand_id."
+    ),
+    brand_id: Optional[str] = Form(
+        None,
+        description="A brand registered via POST /brands. Replaces brand_guide_file and style_images."
+    ),
+    performance_profile: Optional[str] = Form(
+        None,
+        description="Diffusion performance profile (e.g. 'draft', 'standard', 'hq'). Defaults to the server's DIFFUSION_PROFILE."
+    ),
+    bypass_cache: bool = Form(
+        False,
+        description="Skip the semantic cache and force fresh LLM calls for this campaign."
+    ),
+    response_mode: str = Form(
+        "json",
+        description="How each image is returned: 'json' (base64 in the post) or 'url' (a link to GET /images/{id}, recommended for large campaigns)."
+    )
+):
+    """
+    Streams a campaign of posts as Server-Sent Events.
+
+    - **Validates** the prompts and reads the brand uploads up front.
+    - **Relays** each post as soon as it is finished; one failed post does not stop the others.
+    """
+    user_prompts = _check_campaign_prompts(prompts, user_prompt, variants)
+    _check_performance_profile(performance_profile)
+    _check_brand_inputs(service, brand_id, brand_guide_file, style_images)
+    image_delivery = _check_response_mode(response_mode, ("json", "url"))
+    ticket = _admit(admission, priority, x_request_timeout, posts=variants if prompts is None else len(user_prompts), batch=True)
+    brand_guide_content, style_image_bytes = await _read_admitted_inputs(ticket, brand_id, brand_guide_file, style_images)
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            async for event, data in service.stream_campaign(user_prompts, brand_guide_content, style_image_bytes, variants, performance_profile, bypass_cache, brand_id, image_delivery, ticket):
+                yield _format_sse(event, data)
+            yield _format_sse("done", {})
+        except AdmissionRejected as e:
+            yield _format_sse("error", {"detail": e.detail, "retry_after_s": e.retry_after_s})
+        except Exception as e:
+            # The status line is already sent, so errors are reported in-band.
+            print(f"[ERROR] An unhandled exception occurred in the campaign: {e}")
+            yield _format_sse("error", {"detail": "An internal error occurred while generating the campaign. Please check the server logs for more details."})
+        finally:
+            ticket.close()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get(
+    "/images/{image_id}",
+    response_class=FileResponse,
+    tags=["Content Generation"],
+    summary="Download a Generated Image",
+    description="Streams a generated image from the local image store (see response_mode 'url'). Old images are evicted, after which this returns 404.",
+    responses={200: {"content": {"image/png": {}, "image/webp": {}, "image/jpeg": {}}}}
+)
+async def get_image(image_id: str, service: ContentGenerationService = Depends(get_content_generation_service)):
+    """Serves a stored image straight from disk."""
+    stored = service.image_store.get(image_id)
+    if stored is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Image '{image_id}' not found.")
+    path, image_media_type = stored
+    # Ids are content hashes, so an id always maps to the same bytes.
+    return FileResponse(path, media_type=image_media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+@router.post(
+    "/brands",
+    response_model=BrandOutput,
+    status_code=status.HTTP_201_CREATED,
+    tags=["Brands"],
+    summary="Register a Brand",
+    description="Ingests a brand guide and its style images once (captions, chunks and vectors are stored). Pass the returned brand_id to /generate instead of re-uploading the assets."
+)
+async def create_brand(
+    service: ContentGenerationService = Depends(get_content_generation_service),
+    brand_guide_file: UploadFile = File(
+        ...,
+        description="The brand guide in .md format."
+    ),
+    style_images: List[UploadFile] = File(
+        ...,
+        description="A list of images that represent the brand's visual style."
+    ),
+    name: Optional[str] = Form(
+        None,
+        description="Optional human-readable brand name."
+    )
+):
+    """Captions, chunks and embeds the brand's assets, then registers them."""
+    brand_guide_content, style_image_bytes = await _read_brand_uploads(brand_guide_file, style_images)
+    try:
+        brand = await service.ingest_brand(brand_guide_content, style_image_bytes, name=name)
+    except Exception as e:
+        print(f"[ERROR] An unhandled exception occurred while ingesting a brand: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An internal error occurred while ingesting the brand. Please check the server logs for more details."
+        )
+    return brand.to_dict()
+
+
+@router.get(
+    "/brands/{brand_id}",
+    response_model=BrandOutput,
+    tags=["Brands"],
+    summary="Get a Registered Brand",
+    description="Returns a registered brand's metadata and image captions."
+)
+async def get_brand(brand_id: str, service: ContentGenerationService = Depends(get_content_generation_service)):
+    """Looks up a brand by id."""
+    brand = service.brand_store.get(brand_id)
+    if brand is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Brand '{brand_id}' not found.")
+    return brand.to_dict()
+
+
+@router.put(
+    "/brands/{brand_id}",
+    response_model=BrandOutput,
+    tags=["Brands"],
+    summary="Update a Registered Brand",
+    description="Replaces the brand guide and/or the style images of a registered brand. The brand is re-indexed incrementally: only new or edited sections are embedded, and `last_indexing` reports how many."
+)
+async def update_brand(
+    brand_id: str,
+    service: ContentGenerationService = Depends(get_content_generation_service),
+    brand_guide_file: Optional[UploadFile] = File(
+        None,
+        description="The new brand guide in .md format. Omit to keep the current one."
+    ),
+    style_images: Optional[List[UploadFile]] = File(
+        None,
+        description="The new list of style images. Omit to keep the current ones."
+    ),
+    name: Optional[str] = Form(
+        None,
+        description="Optional new brand name."
+    )
+):
+    """Re-indexes the brand with the new assets."""
+    if service.brand_store.get(brand_id) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Brand '{brand_id}' not found.")
+    brand_guide_content = await _read_brand_guide(brand_guide_file) if brand_guide_file is not None else None
+    style_image_bytes = await _read_style_images(style_images) if style_images else None
+    try:
+        brand, _ = await service.update_brand(brand_id, brand_guide_content, style_image_bytes, name=name)
+    except KeyError:
+        # Deleted while the new assets were being read.
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Brand '{brand_id}' not found.")
+    except Exception as e:
+        print(f"[ERROR] An unhandled exception occurred while updating a brand: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An internal error occurred while updating the brand. Please check the server logs for more details."
+        )
+    return brand.to_dict()
+
+
+@router.delete(
+    "/brands/{brand_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    tags=["Brands"],
+    summary="Delete a Registered Brand",
+    description="Removes a registered brand together with its stored chunks and vectors."
+)
+async def delete_brand(brand_id: str, service: ContentGenerationService = Depends(get_content_generation_service)):
+    """Deletes a brand by id."""
+    if not await asyncio.to_thread(service.brand_store.delete, brand_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Brand '{brand_id}' not found.")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.post(
+    "/jobs",
+    response_model=JobCreated,
+    status_code=status.HTTP_202_ACCEPTED,
+    tags=["Jobs"],
+    summary="Submit a Content Generation Job",
+    description=(
+        "Same inputs as /generate, but returns a job id immediately. Poll /jobs/{job_id} for the result, or pass a webhook_url to be notified. "
+        "Jobs go through the same admission control as /generate when submitted (429 or 503 with a Retry-After header), and then "
+        "share its stage slots. Without an X-Request-Timeout header the deadline is the server's largest."
+    ),
+    responses={
+        429: {"model": Msg, "description": "Too many queued requests of the caller's priority class. Retry after Retry-After seconds."},
+        503: {"model": Msg, "description": "The server cannot finish the job before its deadline. Retry after Retry-After seconds."},
+    }
+)
+async def submit_job(
+    queue: JobQueue = Depends(get_job_queue),
+    admission: AdmissionController = Depends(get_admission_controller),
+    priority: str = Depends(get_priority_class),
+    x_request_timeout: Optional[float] = Header(
+        None,
+        gt=0,
+        description="Seconds within which the job should finish (default: the server's ADMISSION_MAX_DEADLINE_S)."
+    ),
+    user_prompt: str = Form(
+        ...,
+        description="The user's core request, e.g., 'Announce our new fall coffee'."
+    ),
+    brand_guide_file: Optional[UploadFile] = File(
+        None,
+        description="The user's brand guide in .md format. Omit when passing a brand_id."
+    ),
+    style_images: Optional[List[UploadFile]] = File(
+        None,
+        description="A list of images that represent the brand's visual style. Omit when passing a brand_id."
+    ),
+    brand_id: Optional[str] = Form(
+        None,
+        description="A brand registered via POST /brands. Replaces brand_guide_file and style_images."
+    ),
+    performance_profile: Optional[str] = Form(
+        None,
+        description="Diffusion performance profile (e.g. 'draft', 'standard', 'hq'). Defaults to the server's DIFFUSION_PROFILE."
+    ),
+    bypass_cache: bool = Form(
+        False,
+        description="Skip the semantic cache and force fresh LLM calls for this request."
+    ),
+    webhook_url: Optional[str] = Form(
+        None,
+        description="Optional http(s) URL that receives a POST with the job status once it finishes. Must be a public host (or allowed in JOB_WEBHOOK_ALLOWED_HOSTS)."
+    ),
+    response_mode: str = Form(
+        "json",
+        description="How the image is returned in the job result: 'json' (base64) or 'url' (a link to GET /images/{id})."
+    )
+):
+    """Queues the full pipeline as a background job."""
+    _check_performance_profile(performance_profile)
+    _check_brand_inputs(queue.service, brand_id, brand_guide_file, style_images)
+    image_delivery = _check_response_mode(response_mode, ("json", "url"))
+    if webhook_url is not None:
+        try:
+            await check_webhook_url(webhook_url, settings.JOB_WEBHOOK_ALLOWED_HOSTS)
+        except WebhookRejected as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    ticket = _admit(admission, priority, x_request_timeout, batch=True)
+    brand_guide_content, style_image_bytes = await _read_admitted_inputs(ticket, brand_id, brand_guide_file, style_images)
+    job = queue.submit(
+        user_prompt, brand_guide_content, style_image_bytes,
+        webhook_url=webhook_url, performance_profile=performance_profile, bypass_cache=bypass_cache,
+        brand_id=brand_id, image_delivery=image_delivery, ticket=ticket
+    )
+    return {"job_id": job.id, "status": job.status, "status_url": f"/api/v1/jobs/{job.id}"}
+
+
+@router.get(
+    "/jobs/stats",
+    response_model=JobQueueStats,
+    tags=["Jobs"],
+    summary="Job Queue Statistics",
+    description="Reports the queue depth, running jobs and recent queue wait times."
+)
+async def job_queue_stats(queue: JobQueue = Depends(get_job_queue)):
+    """Returns the job queue statistics."""
+    return queue.stats()
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatus,
+    tags=["Jobs"],
+    summary="Get a Job's Status",
+    description="Returns the job status, and its full result once it has succeeded."
+)
+async def get_job(job_id: str, queue: JobQueue = Depends(get_job_queue)):
+    """Looks up a job by id."""
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job '{job_id}' not found.")
+    return job.to_dict()
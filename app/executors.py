@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Execution layer for the Amplify AI project.
+
+The local model calls in the pipeline are blocking (sklearn, transformers,
+diffusers). Running them directly inside `async def` code stalls the
+whole Uvicorn worker, including `/health`. This module gives each resource
+class its own size-limited thread pool, so blocking work is awaited from the
+event loop and one kind of work cannot starve the others.
+"""
+# =======================================================================
+#  7. EXECUTION LAYER - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+
+# -----------------------------------------------------------------------
+#  RESOURCE CLASSES
+# -----------------------------------------------------------------------
+
+# Accelerator-bound work (diffusion, captioning). Usually a single worker,
+# since concurrent kernels on one device only fight for memory.
+GPU = "gpu"
+
+# Local CPU-bound models and utilities (classifier, decoding, encoding).
+CPU = "cpu"
+
+# Vector store searches, fanned out by a retrieval that itself runs on the
+# CPU pool. They get a pool of their own: a CPU worker waiting on the CPU
+# pool deadlocks once every worker is waiting.
+RETRIEVAL = "retrieval"
+
+# Calls to the Ollama server need no pool: they go through the async
+# client of `llm.OllamaClient` on the event loop.
+
+
+# -----------------------------------------------------------------------
+#  EXECUTION LAYER
+# -----------------------------------------------------------------------
+
+class ExecutionLayer:
+    """Owns one bounded thread pool per resource class and runs work on them."""
+    def __init__(self, gpu_workers: int, cpu_workers: int, retrieval_workers: int):
+        self._executors: Dict[str, ThreadPoolExecutor] = {
+            GPU: ThreadPoolExecutor(max_workers=gpu_workers, thread_name_prefix="amplify-gpu"),
+            CPU: ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="amplify-cpu"),
+            RETRIEVAL: ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="amplify-retrieval"),
+        }
+
+    def executor(self, resource: str) -> ThreadPoolExecutor:
+        """Returns the thread pool backing a resource class."""
+        try:
+            return self._executors[resource]
+        except KeyError:
+            raise ValueError(f"Unknown resource class: '{resource}'. Expected one of {list(self._executors)}.")
+
+    async def run(self, resource: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Runs a blocking callable on the pool of `resource` and awaits its result."""
+        loop = asyncio.get_running_loop()
+        # Like asyncio.to_thread, carry the caller's context variables (e.g.
+        # the request's timing spans) into the worker thread.
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor(resource), functools.partial(context.run, fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        """Stops all pools, waiting for in-flight work to finish."""
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Fake model backends for the Amplify AI project.
+
+Lightweight stand-ins for the heavy models, selectable through `Settings`.
+They keep the same call signatures as the real backends, so the API, the job
+queue and the benchmarks can run offline, on CPU, without downloading weights.
+"""
+# =======================================================================
+#  10. FAKE BACKENDS - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import hashlib
+import time
+from typing import List, Union
+
+import numpy as np
+from PIL import Image
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.md5(text.encode("utf-8")).digest()
+
+def _fake_weights(weights_mb: int) -> np.ndarray:
+    """A buffer standing in for model weights. Every page is written, so it is really resident."""
+    return np.full(weights_mb * 1024 * 1024 // 4, 0.5, dtype=np.float32)
+
+
+# -----------------------------------------------------------------------
+#  INTENT CLASSIFIER
+# -----------------------------------------------------------------------
+
+class FakeClassifier:
+    """Stand-in for the scikit-learn intent classifier: a deterministic label (and probabilities) per text."""
+    INTENTS = ["Lanzamiento de Producto", "Promoción", "Evento", "Contenido Educativo"]
+
+    def __init__(self):
+        self.classes_ = np.array(self.INTENTS)
+
+    def predict(self, texts: List[str]) -> List[str]:
+        return [self.INTENTS[_digest(text)[0] % len(self.INTENTS)] for text in texts]
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        rows = []
+        for text in texts:
+            digest = _digest(text)
+            weights = np.array([1 + digest[1 + i] for i in range(len(self.INTENTS))], dtype=float)
+            # The predicted label always gets the largest share, as with a real model.
+            weights[digest[0] % len(self.INTENTS)] += weights.max()
+            rows.append(weights / weights.sum())
+        return np.array(rows)
+
+
+# -----------------------------------------------------------------------
+#  IMAGE CAPTIONER
+# -----------------------------------------------------------------------
+
+class FakeCaptioner:
+    """
+    Stand-in for the BLIP `image-to-text` pipeline.
+
+    Describes each image by its size and average color, after an optional
+    artificial delay per batch that simulates a forward pass. `weights_mb`
+    allocates a dummy weight buffer, for memory benchmarks.
+    """
+    def __init__(self, delay_s: float = 0.0, weights_mb: int = 0):
+        self.delay_s = delay_s
+        self.weights = _fake_weights(weights_mb)
+
+    def __call__(self, images: List[Image.Image], batch_size: int = 1, **kwargs) -> List[List[dict]]:
+        if self.delay_s:
+            for _ in range(0, len(images), max(batch_size, 1)):
+                time.sleep(self.delay_s)
+        return [[{"generated_text": self._describe(image)}] for image in images]
+
+    @staticmethod
+    def _describe(image: Image.Image) -> str:
+        r, g, b = image.convert("RGB").resize((1, 1)).getpixel((0, 0))
+        return f"a {image.width}x{image.height} photograph dominated by the color rgb({r}, {g}, {b})"
+
+
+# -----------------------------------------------------------------------
+#  DIFFUSION
+# -----------------------------------------------------------------------
+
+class FakeDiffusionOutput:
+    """Mimics the `.images` attribute of a diffusers pipeline output."""
+    def __init__(self, images: List[Image.Image]):
+        self.images = images
+
+
+class FakeDiffusionPipeline:
+    """
+    Stand-in for `StableDiffusionPipeline`.
+
+    Returns one solid-color image per prompt (the color is derived from the
+    prompt, so results are deterministic) after an optional artificial delay
+    that simulates the cost of a real denoising loop. `weights_mb` allocates
+    a dummy weight buffer, for memory benchmarks.
+    """
+    def __init__(self, delay_s: float = 0.0, size: int = 512, weights_mb: int = 0):
+        self.delay_s = delay_s
+        self.size = size
+        self.weights = _fake_weights(weights_mb)
+
+    def __call__(self, prompt: Union[str, List[str]], **kwargs) -> FakeDiffusionOutput:
+        prompts = [prompt] if isinstance(prompt, str) else list(prompt)
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        width = kwargs.get("width") or self.size
+        height = kwargs.get("height") or self.size
+        # Several images of the same prompt differ, as they would with fresh noise.
+        count = kwargs.get("num_images_per_prompt") or 1
+        return FakeDiffusionOutput([
+            Image.new("RGB", (width, height), self._color(p if i == 0 else f"{p}#{i}")) for p in prompts for i in range(count)
+        ])
+
+    @staticmethod
+    def _color(prompt: str):
+        digest = _digest(prompt)
+        return digest[0], digest[1], digest[2]
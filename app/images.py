@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Generated image output for the Amplify AI project.
+
+A generated image used to be returned only as a lossless PNG, base64-encoded
+inside the JSON response: a third larger than the image itself, with several
+full copies along the way. This module encodes images in a configurable
+format (PNG, WebP or JPEG, with a quality setting) and keeps them in a local
+store, so a response can carry a URL to `GET /images/{id}` or the raw bytes
+in a multipart/mixed body instead.
+"""
+# =======================================================================
+#  17. IMAGE OUTPUT - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+# -----------------------------------------------------------------------
+#  FORMATS & DELIVERY MODES
+# -----------------------------------------------------------------------
+
+PNG = "png"
+WEBP = "webp"
+JPEG = "jpeg"
+
+# Format name -> (PIL format, media type).
+FORMATS: Dict[str, Tuple[str, str]] = {
+    PNG: ("PNG", "image/png"),
+    WEBP: ("WEBP", "image/webp"),
+    JPEG: ("JPEG", "image/jpeg"),
+}
+
+# How the pipeline hands the encoded image over: base64 text (the original
+# JSON contract), a URL into the image store, or the raw bytes.
+DELIVER_B64 = "b64"
+DELIVER_URL = "url"
+DELIVER_RAW = "raw"
+DELIVERY_MODES = (DELIVER_B64, DELIVER_URL, DELIVER_RAW)
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def media_type(image_format: str) -> str:
+    """Returns the media type of one of the supported formats."""
+    return FORMATS[image_format][1]
+
+def encode_image(image: Image.Image, image_format: str, quality: int) -> bytes:
+    """
+    Encodes a PIL image. `quality` (1-100) applies to WebP and JPEG; PNG is
+    always lossless and is written with fast compression instead.
+    """
+    if image_format not in FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}'. Available: {list(FORMATS)}.")
+    buffered = io.BytesIO()
+    if image_format == PNG:
+        image.save(buffered, format="PNG", compress_level=1)
+    else:
+        image.convert("RGB").save(buffered, format=FORMATS[image_format][0], quality=quality)
+    return buffered.getvalue()
+
+
+# -----------------------------------------------------------------------
+#  IMAGE STORE
+# -----------------------------------------------------------------------
+
+class ImageStore:
+    """
+    Size-bounded, content-addressed store of encoded images on local disk.
+
+    Images are written once (write-then-rename) under the SHA-256 of their
+    bytes and served straight from their file. Once more than `max_entries`
+    images are stored, the oldest ones are deleted. Images written by
+    previous runs are picked up again at startup, and images written by
+    other worker processes sharing `root_dir` are found on disk (each
+    process only evicts the images it knows about).
+    """
+    def __init__(self, root_dir: str, max_entries: int):
+        self.root_dir = Path(root_dir)
+        self.max_entries = max_entries
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # id -> file path, oldest first.
+        self._entries: "OrderedDict[str, Path]" = OrderedDict()
+
+        existing = [path for path in self.root_dir.iterdir() if path.suffix[1:] in FORMATS]
+        for path in sorted(existing, key=lambda p: p.stat().st_mtime):
+            self._entries[path.stem] = path
+        self._evict()
+
+    def put(self, data: bytes, image_format: str) -> str:
+        """Stores an encoded image and returns its id."""
+        image_id = hashlib.sha256(data).hexdigest()
+        path = self.root_dir / f"{image_id}.{image_format}"
+        if not path.exists():
+            # Per-process temporary name: two workers may store the same image at once.
+            tmp_path = self.root_dir / f"{image_id}.{os.getpid()}.tmp"
+            tmp_path.write_bytes(data)
+            tmp_path.replace(path)
+        with self._lock:
+            self._entries[image_id] = path
+            self._entries.move_to_end(image_id)
+            self._evict()
+        return image_id
+
+    def get(self, image_id: str) -> Optional[Tuple[Path, str]]:
+        """Returns `(path, media_type)` of a stored image, or None if it is unknown or evicted."""
+        path = self._entries.get(image_id)
+        if path is None and len(image_id) == 64 and all(c in "0123456789abcdef" for c in image_id):
+            # Stored by another worker. Only well-formed ids reach the filesystem.
+            path = next((p for p in (self.root_dir / f"{image_id}.{fmt}" for fmt in FORMATS) if p.exists()), None)
+        if path is None or not path.exists():
+            return None
+        return path, media_type(path.suffix[1:])
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of stored images."""
+        return {"entries": len(self._entries)}
+
+    def _evict(self) -> None:
+        """Deletes the oldest images beyond `max_entries` (call with the lock held)."""
+        while len(self._entries) > self.max_entries:
+            _, path = self._entries.popitem(last=False)
+            path.unlink(missing_ok=True)
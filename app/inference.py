@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+CPU inference backends for the Amplify AI project.
+
+By default the local models run as shipped: the embeddings and the BLIP
+captioner in fp32 eager PyTorch, the intent classifier in scikit-learn. On
+CPU-only nodes this module provides cheaper variants, selected per model in
+`Settings` (EMBEDDINGS_BACKEND, CAPTIONER_BACKEND, CLASSIFIER_BACKEND):
+
+- int8: dynamic quantization of every `nn.Linear` (weights stored as int8,
+  activations quantized on the fly). Linear layers hold most of the weights
+  and time of both transformers, and no calibration data is needed.
+- onnx: ONNX Runtime instead of eager PyTorch / scikit-learn, with graph
+  optimizations and its own thread pool.
+- threads: INFERENCE_THREADS / INFERENCE_INTEROP_THREADS pin the thread
+  pools of torch and ONNX Runtime (e.g. cores / workers under app/server.py,
+  instead of every worker using every core).
+
+Every variant changes the outputs slightly. `benchmarks/inference_backends.py`
+checks each one against the fp32 output with a tolerance, and reports its
+latency and memory.
+
+Usage (one-off export of the intent classifier to ONNX):
+    python -m app.inference export-classifier models/intent_classifier.pkl models/intent_classifier.onnx
+"""
+# =======================================================================
+#  21. INFERENCE BACKENDS - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import json
+import threading
+from typing import Any, List, Optional
+
+import numpy as np
+
+# Internal imports
+from .config import settings
+
+
+# Metadata key under which the exported classifier keeps its class labels.
+CLASSES_METADATA_KEY = "classes"
+
+_threads_lock = threading.Lock()
+_threads_configured = False
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+# Heavy libraries are imported inside the functions, like the model loaders,
+# so that only the backends actually selected pay their import cost.
+
+def configure_torch_threads() -> None:
+    """Applies INFERENCE_THREADS / INFERENCE_INTEROP_THREADS to torch, once per process."""
+    global _threads_configured
+    with _threads_lock:
+        if _threads_configured:
+            return
+        _threads_configured = True
+        if settings.INFERENCE_THREADS is None and settings.INFERENCE_INTEROP_THREADS is None:
+            return
+        import torch
+        if settings.INFERENCE_THREADS is not None:
+            torch.set_num_threads(settings.INFERENCE_THREADS)
+        if settings.INFERENCE_INTEROP_THREADS is not None:
+            try:
+                torch.set_num_interop_threads(settings.INFERENCE_INTEROP_THREADS)
+            except RuntimeError as e:
+                # Only possible before torch has run any parallel work.
+                print(f"[WARN] Could not set the torch inter-op thread count: {e}")
+        print(f"   -> torch threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+def quantize_int8(model: Any) -> Any:
+    """Dynamically quantizes the `nn.Linear` layers of a CPU torch model to int8, in place."""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+def onnx_session_options() -> Any:
+    """ONNX Runtime session options: full graph optimization and the configured thread counts."""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if settings.INFERENCE_THREADS is not None:
+        options.intra_op_num_threads = settings.INFERENCE_THREADS
+    if settings.INFERENCE_INTEROP_THREADS is not None:
+        options.inter_op_num_threads = settings.INFERENCE_INTEROP_THREADS
+    return options
+
+
+# -----------------------------------------------------------------------
+#  ONNX INTENT CLASSIFIER
+# -----------------------------------------------------------------------
+
+def export_classifier_onnx(model_path: str, onnx_path: str) -> List[str]:
+    """
+    Converts the scikit-learn intent classifier (a text pipeline taking raw
+    strings) to ONNX with skl2onnx. Probabilities are exported as a plain
+    tensor and the class labels are stored in the model metadata, so
+    `OnnxClassifier` can offer the same interface. Returns the labels.
+    """
+    import joblib
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import StringTensorType
+
+    model = joblib.load(model_path)
+    estimator = model.steps[-1][1] if hasattr(model, "steps") else model
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[("text", StringTensorType([None, 1]))],
+        options={id(estimator): {"zipmap": False}},
+    )
+    classes = [str(label) for label in model.classes_]
+    entry = onnx_model.metadata_props.add()
+    entry.key = CLASSES_METADATA_KEY
+    entry.value = json.dumps(classes, ensure_ascii=False)
+    with open(onnx_path, "wb") as f:
+        f.write(onnx_model.SerializeToString())
+    return classes
+
+
+class OnnxClassifier:
+    """
+    The intent classifier running in ONNX Runtime, with the scikit-learn
+    interface the service uses (`predict`, `predict_proba`, `classes_`).
+    Load models exported by `export_classifier_onnx`.
+    """
+    def __init__(self, onnx_path: str):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(onnx_path, sess_options=onnx_session_options(), providers=["CPUExecutionProvider"])
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if CLASSES_METADATA_KEY not in metadata:
+            raise ValueError(f"'{onnx_path}' has no class labels; export it with `python -m app.inference export-classifier`.")
+        self.classes_ = np.array(json.loads(metadata[CLASSES_METADATA_KEY]))
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict_proba(self, texts: List[str]) -> np.ndarray:
+        # Outputs are (labels, probabilities); columns follow `classes_`.
+        _, probabilities = self.session.run(None, {self._input_name: np.array(texts, dtype=object).reshape(-1, 1)})
+        return np.asarray(probabilities)
+
+    def predict(self, texts: List[str]) -> List[str]:
+        return [str(label) for label in self.classes_[self.predict_proba(texts).argmax(axis=1)]]
+
+
+# =======================================================================
+#  ENTRY POINT
+# =======================================================================
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export models for the optimized inference backends.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export-classifier", help="Convert the scikit-learn intent classifier to ONNX.")
+    export.add_argument("input", nargs="?", default=settings.CLASSIFIER_MODEL_PATH)
+    export.add_argument("output", nargs="?", default=settings.CLASSIFIER_ONNX_PATH)
+    args = parser.parse_args(argv)
+
+    classes = export_classifier_onnx(args.input, args.output)
+    print(f"Exported '{args.input}' to '{args.output}' ({len(classes)} classes: {', '.join(classes)}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Asynchronous job queue for the Amplify AI project.
+
+Long generations (especially diffusion) should not hold an HTTP connection
+open. This module runs the content pipeline as in-process background jobs: the
+client gets a job id right away and later polls for the result or receives it
+through a webhook. Each pipeline stage has its own concurrency limit, and the
+queue reports its depth and wait times.
+"""
+# =======================================================================
+#  9. JOB QUEUE - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import asyncio
+import ipaddress
+import socket
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+# Internal imports
+from .admission import IMAGE_STAGE, TEXT_STAGE, AdmissionRejected, AdmissionTicket
+from .images import DELIVER_B64
+from .metrics import current_timings
+from .schemas import ContentGenerationOutput
+from .services import ContentGenerationService
+
+
+# -----------------------------------------------------------------------
+#  JOB STATES & STAGES
+# -----------------------------------------------------------------------
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class WebhookRejected(ValueError):
+    """A webhook URL the server refuses to call."""
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+async def check_webhook_url(url: str, allowed_hosts: Optional[List[str]] = None) -> None:
+    """
+    Refuses webhook URLs that would make the server call into its own network
+    (SSRF): only absolute http(s) URLs are accepted, and the host must be in
+    `allowed_hosts` or, when no allowlist is configured, resolve to public
+    addresses only. Raises WebhookRejected.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise WebhookRejected("webhook_url must be an absolute http:// or https:// URL.")
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise WebhookRejected(f"Webhook host '{host}' is not allowed.")
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (ValueError, OSError):
+        raise WebhookRejected(f"Webhook host '{host}' could not be resolved.")
+    for *_, sockaddr in infos:
+        # Drop the scope of link-local IPv6 addresses ("fe80::1%eth0").
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if not address.is_global or address.is_multicast:
+            raise WebhookRejected(f"Webhook host '{host}' resolves to a non-public address.")
+
+
+@dataclass
+class Job:
+    """State of a single content generation job."""
+    id: str
+    user_prompt: str
+    brand_guide_content: str
+    style_image_bytes: List[bytes]
+    webhook_url: Optional[str] = None
+    performance_profile: Optional[str] = None
+    bypass_cache: bool = False
+    brand_id: Optional[str] = None
+    image_delivery: str = DELIVER_B64
+    # Admission of the job when it was submitted; its slots are taken when it runs.
+    ticket: Optional[AdmissionTicket] = None
+    status: str = QUEUED
+    stage: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[ContentGenerationOutput] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public view of the job (never includes the uploaded inputs)."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+# -----------------------------------------------------------------------
+#  JOB QUEUE
+# -----------------------------------------------------------------------
+
+class JobQueue:
+    """
+    In-process queue that runs content generation jobs in the background.
+
+    Jobs wait for a slot of the text stage, then for a slot of the image
+    stage, so a burst of submissions never runs more than the configured
+    number of diffusion calls at once. Finished jobs are kept (for polling)
+    up to `max_retained_jobs`, oldest first out.
+    """
+    def __init__(
+        self,
+        service: ContentGenerationService,
+        text_concurrency: int,
+        image_concurrency: int,
+        max_retained_jobs: int,
+        webhook_timeout_s: float = 10.0,
+        webhook_allowed_hosts: Optional[List[str]] = None,
+    ):
+        self.service = service
+        self.max_retained_jobs = max_retained_jobs
+        self.webhook_timeout_s = webhook_timeout_s
+        self.webhook_allowed_hosts = webhook_allowed_hosts
+        self._stage_limits = {
+            TEXT_STAGE: asyncio.Semaphore(text_concurrency),
+            IMAGE_STAGE: asyncio.Semaphore(image_concurrency),
+        }
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        # Recent queue wait times (seconds), for the stats endpoint.
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+
+    def submit(
+        self,
+        user_prompt: str,
+        brand_guide_content: str,
+        style_image_bytes: List[bytes],
+        webhook_url: Optional[str] = None,
+        performance_profile: Optional[str] = None,
+        bypass_cache: bool = False,
+        brand_id: Optional[str] = None,
+        image_delivery: str = DELIVER_B64,
+        ticket: Optional[AdmissionTicket] = None,
+    ) -> Job:
+        """
+        Registers a new job and schedules it. Returns immediately. With an
+        admission `ticket`, the job shares the stage slots (and the deadline)
+        of the interactive requests.
+        """
+        job = Job(
+            id=uuid.uuid4().hex,
+            user_prompt=user_prompt,
+            brand_guide_content=brand_guide_content,
+            style_image_bytes=style_image_bytes,
+            webhook_url=webhook_url,
+            performance_profile=performance_profile,
+            bypass_cache=bypass_cache,
+            brand_id=brand_id,
+            image_delivery=image_delivery,
+            ticket=ticket,
+        )
+        self._jobs[job.id] = job
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Returns a job by id, or None if it is unknown (or was pruned)."""
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Reports queue depth, running jobs and recent wait times."""
+        now = time.time()
+        queued = [job for job in self._jobs.values() if job.status == QUEUED]
+        waits = sorted(self._wait_times)
+        return {
+            "depth": len(queued),
+            "running": sum(1 for job in self._jobs.values() if job.status == RUNNING),
+            "oldest_queued_wait_s": max((now - job.created_at for job in queued), default=0.0),
+            "avg_wait_s": sum(waits) / len(waits) if waits else 0.0,
+            "p95_wait_s": waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0,
+        }
+
+    async def shutdown(self) -> None:
+        """Cancels jobs that are still pending or running."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # -----------------------------------------------------------------------
+    #  INTERNALS
+    # -----------------------------------------------------------------------
+
+    async def _run(self, job: Job) -> None:
+        """Runs one job through both stages, then fires its webhook."""
+        # The task inherited the submitting request's context; its spans
+        # belong to the job, not to that (already answered) request.
+        current_timings.set(None)
+        try:
+            await self._execute(job)
+            job.status = SUCCEEDED
+        except asyncio.CancelledError:
+            job.status, job.error = FAILED, "Job cancelled during shutdown."
+            raise
+        except AdmissionRejected as e:
+            # Admitted at submission, but no slot freed up before the deadline.
+            print(f"[WARN] Job {job.id} expired in the admission queue.")
+            job.status, job.error = FAILED, e.detail
+        except Exception as e:
+            print(f"[ERROR] Job {job.id} failed: {e}")
+            job.status, job.error = FAILED, "An internal error occurred while generating content."
+        finally:
+            job.stage = None
+            job.finished_at = time.time()
+            # Inputs are no longer needed; don't keep megabytes of images around.
+            job.style_image_bytes = []
+            job.brand_guide_content = ""
+            if job.ticket is not None:
+                job.ticket.close()
+                job.ticket = None
+
+        if job.webhook_url:
+            await self._notify(job)
+
+    async def _execute(self, job: Job) -> None:
+        """Pulls pipeline events, holding a slot of the current stage's semaphore."""
+        result: Dict[str, Any] = {}
+        events = self.service.stream_post_pipeline(
+            job.user_prompt, job.brand_guide_content, job.style_image_bytes,
+            job.performance_profile, job.bypass_cache, job.brand_id, job.image_delivery
+        )
+        if job.ticket is not None:
+            events = job.ticket.relay(events)
+        try:
+            async with self._stage_limits[TEXT_STAGE]:
+                job.status, job.stage, job.started_at = RUNNING, TEXT_STAGE, time.time()
+                self._wait_times.append(job.started_at - job.created_at)
+                async for event, data in events:
+                    if event in ContentGenerationOutput.model_fields:
+                        result[event] = data
+                    if event == "generated_copy_text":
+                        break
+
+            # The pipeline generator is paused right after the copy text, so
+            # the image stage does not start until we hold an image slot.
+            async with self._stage_limits[IMAGE_STAGE]:
+                job.stage = IMAGE_STAGE
+                async for event, data in events:
+                    if event in ContentGenerationOutput.model_fields:
+                        result[event] = data
+        finally:
+            await events.aclose()
+
+        job.result = ContentGenerationOutput(**result)
+
+    async def _notify(self, job: Job) -> None:
+        """POSTs the finished job to its webhook. Failures are logged, never raised."""
+        payload = {**job.to_dict(), "result": job.result.model_dump() if job.result else None}
+        try:
+            # Checked again at delivery: the host may resolve differently by now.
+            await check_webhook_url(job.webhook_url, self.webhook_allowed_hosts)
+            # Redirects are not followed (httpx's default), so a public host
+            # cannot bounce the delivery to an internal one.
+            async with httpx.AsyncClient(timeout=self.webhook_timeout_s) as client:
+                response = await client.post(job.webhook_url, json=payload)
+                response.raise_for_status()
+        except Exception as e:
+            print(f"[WARN] Webhook delivery failed for job {job.id}: {e}")
+
+    def _prune(self) -> None:
+        """Drops the oldest finished jobs once more than `max_retained_jobs` are held."""
+        excess = len(self._jobs) - self.max_retained_jobs
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.status in (SUCCEEDED, FAILED)][:excess]:
+            del self._jobs[job_id]
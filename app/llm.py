@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+LLM client layer for the Amplify AI project.
+
+`ChatOllama` opens a fresh HTTP connection for every call and sets no model
+keep-alive, so Ollama may unload a model between bursts. This module provides
+a shared Ollama client with pooled (sync and async) keep-alive connections,
+a per-model concurrency limit and a configurable model keep-alive, plus a
+LangChain chat model built on top of it so the existing LCEL chains keep
+working unchanged.
+"""
+# =======================================================================
+#  13. LLM CLIENT LAYER - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+import httpx
+from langchain_core.callbacks import (AsyncCallbackManagerForLLMRun,
+                                      CallbackManagerForLLMRun)
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (AIMessage, AIMessageChunk, BaseMessage,
+                                     SystemMessage)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def _to_ollama_messages(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    """Converts LangChain messages into Ollama's chat message format."""
+    converted = []
+    for message in messages:
+        if isinstance(message, SystemMessage):
+            role = "system"
+        elif isinstance(message, AIMessage):
+            role = "assistant"
+        else:
+            role = "user"
+        converted.append({"role": role, "content": message.content})
+    return converted
+
+
+# -----------------------------------------------------------------------
+#  CONCURRENCY LIMIT
+# -----------------------------------------------------------------------
+
+class _Waiter:
+    """A thread or an event-loop task waiting for a ConcurrencyLimit slot."""
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+        self.granted = False
+        self.abandoned = False
+
+    def wake(self) -> bool:
+        """Hands the slot over (called under the limit's lock). False if the waiter gave up."""
+        if self.abandoned:
+            return False
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+        return True
+
+
+class ConcurrencyLimit:
+    """
+    At most `limit` holders at once, shared by worker threads (`with`) and
+    event-loop tasks (`async with`), served first come, first served.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+        self._waiters: Deque[_Waiter] = deque()
+
+    def _try_acquire(self, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[_Waiter]:
+        """Takes a free slot (returns None) or queues a waiter for one."""
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                return None
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            return waiter
+
+    def release(self) -> None:
+        """Frees a slot, handing it to the next waiter if there is one."""
+        with self._lock:
+            while self._waiters:
+                # `active` is unchanged: the slot changes hands.
+                if self._waiters.popleft().wake():
+                    return
+            self.active -= 1
+
+    def __enter__(self) -> "ConcurrencyLimit":
+        waiter = self._try_acquire(None)
+        if waiter is not None:
+            waiter.event.wait()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+    async def __aenter__(self) -> "ConcurrencyLimit":
+        waiter = self._try_acquire(asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self._lock:
+                    granted = waiter.granted
+                    waiter.abandoned = True
+                if granted:
+                    # The slot was handed over as the wait was cancelled: pass it on.
+                    self.release()
+                raise
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+
+# -----------------------------------------------------------------------
+#  OLLAMA CLIENT
+# -----------------------------------------------------------------------
+
+class OllamaClient:
+    """
+    Shared client for the Ollama HTTP API.
+
+    - One sync and one async `httpx` client, each with a bounded pool of
+      keep-alive connections, are reused by every call.
+    - At most `max_concurrency_per_model` requests per model are in flight,
+      sync and async calls together, so a burst cannot pile up inside Ollama.
+    - Every request carries `keep_alive`, so Ollama keeps the model loaded
+      between bursts instead of paying a cold reload.
+    """
+    def __init__(self, base_url: str, keep_alive: str, max_connections: int, max_concurrency_per_model: int, timeout_s: float):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.max_concurrency_per_model = max_concurrency_per_model
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        timeout = httpx.Timeout(timeout_s, connect=10.0)
+        self._client = httpx.Client(base_url=self.base_url, limits=limits, timeout=timeout)
+        self._aclient = httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=timeout)
+        self._lock = threading.Lock()
+        self._limits: Dict[str, ConcurrencyLimit] = {}
+
+    # --- Sync API (used from worker threads) ---
+
+    def chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
+        """Returns the full assistant reply for `messages`."""
+        with self._limit(model):
+            response = self._client.post("/api/chat", json=self._payload(model, messages, options, stream=False))
+            response.raise_for_status()
+            return response.json()["message"]["content"]
+
+    def stream_chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Yields the assistant reply chunk by chunk."""
+        with self._limit(model):
+            with self._client.stream("POST", "/api/chat", json=self._payload(model, messages, options, stream=True)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    chunk = self._parse_stream_line(line)
+                    if chunk:
+                        yield chunk
+
+    # --- Async API (used from the event loop) ---
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> str:
+        """Async version of `chat`."""
+        async with self._limit(model):
+            response = await self._aclient.post("/api/chat", json=self._payload(model, messages, options, stream=False))
+            response.raise_for_status()
+            return response.json()["message"]["content"]
+
+    async def astream_chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Async version of `stream_chat`."""
+        async with self._limit(model):
+            async with self._aclient.stream("POST", "/api/chat", json=self._payload(model, messages, options, stream=True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    chunk = self._parse_stream_line(line)
+                    if chunk:
+                        yield chunk
+
+    async def aprewarm(self, model: str) -> None:
+        """Loads `model` into Ollama's memory (an empty generate request) and pins it for `keep_alive`."""
+        response = await self._aclient.post("/api/generate", json={"model": model, "keep_alive": self.keep_alive})
+        response.raise_for_status()
+
+    async def aclose(self) -> None:
+        """Closes both connection pools."""
+        self._client.close()
+        await self._aclient.aclose()
+
+    # --- Internals ---
+
+    def _payload(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]], stream: bool) -> Dict[str, Any]:
+        payload = {"model": model, "messages": messages, "stream": stream, "keep_alive": self.keep_alive}
+        if options:
+            payload["options"] = options
+        return payload
+
+    @staticmethod
+    def _parse_stream_line(line: str) -> str:
+        """Extracts the text of one NDJSON line of a streamed chat reply."""
+        if not line.strip():
+            return ""
+        data = json.loads(line)
+        if "error" in data:
+            raise RuntimeError(f"Ollama error: {data['error']}")
+        return data.get("message", {}).get("content", "")
+
+    def _limit(self, model: str) -> ConcurrencyLimit:
+        """The concurrency limit of `model`, shared by the sync and async calls."""
+        with self._lock:
+            if model not in self._limits:
+                self._limits[model] = ConcurrencyLimit(self.max_concurrency_per_model)
+            return self._limits[model]
+
+
+# -----------------------------------------------------------------------
+#  LANGCHAIN CHAT MODEL
+# -----------------------------------------------------------------------
+
+class PooledChatOllama(BaseChatModel):
+    """
+    LangChain chat model backed by the shared `OllamaClient`.
+
+    Supports `invoke`/`stream` (pooled sync connections, for worker threads)
+    and `ainvoke`/`astream` (pooled async connections, for the event loop).
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    client: OllamaClient
+    model: str
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-ollama"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "temperature": self.temperature}
+
+    def _options(self, stop: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        options: Dict[str, Any] = {}
+        if self.temperature is not None:
+            options["temperature"] = self.temperature
+        if stop:
+            # Ollama ends the reply at the first of these sequences.
+            options["stop"] = list(stop)
+        return options or None
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = self.client.chat(self.model, _to_ollama_messages(messages), self._options(stop))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        text = await self.client.achat(self.model, _to_ollama_messages(messages), self._options(stop))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for text in self.client.stream_chat(self.model, _to_ollama_messages(messages), self._options(stop)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async for text in self.client.astream_chat(self.model, _to_ollama_messages(messages), self._options(stop)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
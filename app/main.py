@@ -4,7 +4,7 @@ Main application file for the Amplify AI FastAPI service.
 
 This file initializes the FastAPI application, configures middleware (like CORS),
 includes the API routers from other modules, and defines global application-level
-logic like startup and shutdown events. It serves as the primary entry point for
+logic like the startup/shutdown lifespan that owns the shared model registry. It serves as the primary entry point for
 the web server (Uvicorn).
 """
 
@@ -16,23 +16,98 @@ the web server (Uvicorn).
 #  IMPORTS
 # -----------------------------------------------------------------------
 
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
 
 # Internal imports
+from app.admission import PRIORITY_CLASSES, AdmissionController
 from app.config import settings
 from app.endpoints import router as api_router
-from app.services import ContentGenerationService # Import the service to pre-load it
+from app.jobs import JobQueue
+from app.metrics import track_request
+from app.registry import OLLAMA_CLIENT, build_model_registry
+from app.services import ContentGenerationService
+from app.uploads import RequestSizeLimitMiddleware
 
 # -----------------------------------------------------------------------
 #  APPLICATION LIFECYCLE MANAGEMENT
 # -----------------------------------------------------------------------
 
-# By creating the service instance here at the module level,
-# we ensure its __init__ method (which loads all heavy models) is run
-# only once when the application starts up. This is a clean and effective
-# way to manage the application's state.
-content_generation_service = ContentGenerationService()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Creates the single model registry and service shared by every route.
+
+    The registry loads each model lazily, exactly once per worker. When
+    WARM_UP_MODELS is enabled, all models are loaded here so the first
+    request does not pay for it, and a per-model timing report is printed.
+    Under the pre-fork server (app/server.py) the registry already exists:
+    the master loaded the local models before forking, and this worker
+    shares their weights instead of loading its own copy.
+    """
+    print("--- Amplify AI Application Startup ---")
+    print(f"Project: {settings.PROJECT_NAME}")
+    registry = getattr(app.state, "model_registry", None) or build_model_registry()
+    service = ContentGenerationService(registry)
+    app.state.model_registry = registry
+    app.state.content_generation_service = service
+    app.state.job_queue = JobQueue(
+        service,
+        text_concurrency=settings.JOB_TEXT_CONCURRENCY,
+        image_concurrency=settings.JOB_IMAGE_CONCURRENCY,
+        max_retained_jobs=settings.JOB_MAX_RETAINED,
+        webhook_timeout_s=settings.JOB_WEBHOOK_TIMEOUT_S,
+        webhook_allowed_hosts=settings.JOB_WEBHOOK_ALLOWED_HOSTS
+    )
+    assigned = {*settings.API_KEY_PRIORITIES.values(), settings.API_KEY_DEFAULT_PRIORITY, settings.ANONYMOUS_PRIORITY}
+    if not assigned <= set(PRIORITY_CLASSES):
+        raise ValueError(f"Unknown priority classes {sorted(assigned - set(PRIORITY_CLASSES))}. Available: {list(PRIORITY_CLASSES)}.")
+    app.state.admission_controller = AdmissionController(
+        text_slots=settings.ADMISSION_TEXT_SLOTS,
+        image_slots=settings.ADMISSION_IMAGE_SLOTS,
+        text_service_time_s=settings.ADMISSION_TEXT_SECONDS,
+        image_service_time_s=settings.ADMISSION_IMAGE_SECONDS,
+        queue_limits=settings.ADMISSION_QUEUE_LIMITS,
+        degraded_mode=settings.ADMISSION_DEGRADED_MODE
+    )
+
+    if settings.WARM_UP_MODELS:
+        load_times = await asyncio.to_thread(registry.warm_up)
+        print("Model startup timing report:")
+        for name, seconds in load_times.items():
+            print(f"  - {name:<15} {seconds:8.2f}s")
+        print(f"  = total           {sum(load_times.values()):8.2f}s")
+
+        # Load both LLMs inside Ollama now, so the first request does not
+        # pay for a cold model load. An unreachable server is not fatal.
+        if settings.OLLAMA_PREWARM:
+            ollama_client = registry.get(OLLAMA_CLIENT)
+            for model in (settings.LLM_GENERATOR_MODEL, settings.LLM_RETRIEVER_MODEL):
+                try:
+                    await ollama_client.aprewarm(model)
+                    print(f"  - Ollama model '{model}' prewarmed (keep_alive={settings.OLLAMA_KEEP_ALIVE})")
+                except Exception as e:
+                    print(f"[WARN] Could not prewarm Ollama model '{model}': {e}")
+
+    print("API is now ready to accept requests.")
+    print("Navigate to http://localhost:8000/docs for API documentation.")
+    print("---")
+    yield
+
+    print("--- Amplify AI Application Shutting Down ---")
+    await app.state.job_queue.shutdown()
+    service.shutdown()
+    if registry.is_resident(OLLAMA_CLIENT):
+        await registry.get(OLLAMA_CLIENT).aclose()
+    # Its Ollama client is closed: a later startup in this process (e.g. a
+    # test client) must build a new registry instead of picking this one up.
+    app.state.model_registry = None
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -47,6 +122,7 @@ app = FastAPI(
         "name": "MIT License",
         "url": "https://opensource.org/licenses/MIT",
     },
+    lifespan=lifespan,
 )
 
 # -----------------------------------------------------------------------
@@ -64,6 +140,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized request bodies before they are parsed (and spooled to
+# memory or disk). Per-file and per-image limits are checked in the routes.
+app.add_middleware(RequestSizeLimitMiddleware, max_body_bytes=settings.MAX_REQUEST_BYTES)
+
+# Collect the stage spans of each request and, if enabled, report them in a
+# Server-Timing header. Streaming responses send their headers before any
+# stage has run, so they only feed the /metrics histograms.
+@app.middleware("http")
+async def server_timing_middleware(request: Request, call_next):
+    with track_request() as timings:
+        response = await call_next(request)
+    if settings.SERVER_TIMING_HEADER and timings.spans:
+        response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
 # -----------------------------------------------------------------------
 #  API ROUTER INCLUSION
 # -----------------------------------------------------------------------
@@ -72,33 +163,21 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api/v1")
 
 # -----------------------------------------------------------------------
-#  ROOT ENDPOINT & LIFESPAN EVENTS
+#  ROOT ENDPOINT
 # -----------------------------------------------------------------------
 
-@app.on_event("startup")
-def on_startup():
-    """
-    This function runs when the application starts.
-    We use it to confirm that the model loading (triggered by the service
-    instantiation above) is complete.
-    """
-    print("--- Amplify AI Application Startup ---")
-    print(f"Project: {settings.PROJECT_NAME}")
-    print("API is now ready to accept requests.")
-    print("Navigate to http://localhost:8000/docs for API documentation.")
-    print("---")
-
-
-@app.on_event("shutdown")
-def on_shutdown():
-    """
-    This function runs when the application is shutting down.
-    It's a good place to clean up resources if needed.
-    """
-    print("--- Amplify AI Application Shutting Down ---")
-
-
 @app.get("/", tags=["Root"])
 async def read_root():
     """A simple root endpoint to confirm that the API is running."""
-    return {"message": f"Welcome to the {settings.PROJECT_NAME} API. Visit /docs for details."}
\ No newline at end of file
+    return {"message": f"Welcome to the {settings.PROJECT_NAME} API. Visit /docs for details."}
+
+
+@app.get("/metrics", tags=["Monitoring"], include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint: per-stage latency histograms, labelled by cache outcome."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Several workers (app/server.py): aggregate the samples every process wrote.
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Latency instrumentation for the Amplify AI project.
+
+Every pipeline stage runs inside a `stage_span`, which records its duration
+(and, where a cache is involved, whether it was a hit) in a Prometheus
+histogram served on `/metrics`. The spans of the current request are also
+collected, so they can be returned in a `Server-Timing` response header.
+"""
+# =======================================================================
+#  16. METRICS - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, List, Optional
+
+from prometheus_client import Histogram
+
+
+# -----------------------------------------------------------------------
+#  STAGES & CACHE LABELS
+# -----------------------------------------------------------------------
+
+INTENT = "intent"
+CAPTION = "caption"
+BRAND_INDEX = "brand_index"
+SPLIT = "split"
+EMBED = "embed"
+QUERY_LLM = "query_llm"
+RETRIEVE = "retrieve"
+LLM_GENERATE = "llm_generate"
+IMAGE_PROMPT_LLM = "image_prompt_llm"
+DIFFUSION = "diffusion"
+ENCODE = "encode"
+
+# Server-Timing entry that lists the stages on the request's critical path.
+CRITICAL_PATH = "critical-path"
+
+# `cache` label values. NONE is used by stages that have no cache in front.
+HIT = "hit"
+MISS = "miss"
+NONE = "none"
+
+STAGE_SECONDS = Histogram(
+    "amplify_stage_duration_seconds",
+    "Duration of each content pipeline stage.",
+    ["stage", "cache"],
+    # Stages range from sub-millisecond cache hits to minute-long diffusion runs.
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+# =======================================================================
+#  PER-REQUEST SPANS
+# =======================================================================
+
+@dataclass
+class Span:
+    """One timed stage. Set `cache` inside the `with` block once the outcome is known."""
+    stage: str
+    cache: str = NONE
+    seconds: float = 0.0
+
+
+@dataclass
+class RequestTimings:
+    """The spans recorded while serving one request, plus its critical path (if the pipeline ran)."""
+    spans: List[Span] = field(default_factory=list)
+    critical_path: List[str] = field(default_factory=list)
+    critical_path_seconds: float = 0.0
+
+    def server_timing(self) -> str:
+        """Formats the spans as a `Server-Timing` header value (durations in ms)."""
+        entries = []
+        for i, span in enumerate(self.spans):
+            # Metric names must be unique per header, and a stage can run twice.
+            name = span.stage if all(s.stage != span.stage for s in self.spans[:i]) else f"{span.stage}-{i}"
+            desc = f';desc="{span.cache}"' if span.cache != NONE else ""
+            entries.append(f"{name};dur={span.seconds * 1000:.1f}{desc}")
+        if self.critical_path:
+            entries.append(f'{CRITICAL_PATH};dur={self.critical_path_seconds * 1000:.1f};desc="{">".join(self.critical_path)}"')
+        return ", ".join(entries)
+
+
+# The timings of the request being served, if any. Context variables follow
+# the request into tasks and (through the execution layer) worker threads.
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("current_timings", default=None)
+
+
+@contextmanager
+def track_request() -> Iterator[RequestTimings]:
+    """Collects the spans of everything run inside the block."""
+    timings = RequestTimings()
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+
+
+def record_critical_path(stages: List[str], seconds: float) -> None:
+    """Attaches the critical path of the pipeline run to the current request's timings."""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.critical_path = stages
+        timings.critical_path_seconds = seconds
+
+
+@contextmanager
+def stage_span(stage: str, cache: str = NONE) -> Iterator[Span]:
+    """Times a pipeline stage into the histogram and the current request's timings."""
+    span = Span(stage=stage, cache=cache)
+    start = time.perf_counter()
+    try:
+        yield span
+    finally:
+        span.seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=span.stage, cache=span.cache).observe(span.seconds)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.spans.append(span)
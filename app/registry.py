@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Model Registry for the Amplify AI project.
+
+This module owns every heavy model used by the pipeline. Models are registered
+as loader functions and only materialized on first use (or on an explicit
+warm-up), exactly once per process, so that every route and service shares the
+same instances. Load times are recorded for the startup report and the
+readiness endpoint.
+"""
+# =======================================================================
+#  8. MODEL REGISTRY - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Internal imports
+from .config import settings
+
+
+# -----------------------------------------------------------------------
+#  MODEL NAMES
+# -----------------------------------------------------------------------
+
+CLASSIFIER = "classifier"
+CAPTIONER = "captioner"
+DIFFUSION = "diffusion"
+EMBEDDINGS = "embeddings"
+LLM_GENERATOR = "llm_generator"
+LLM_RETRIEVER = "llm_retriever"
+OLLAMA_CLIENT = "ollama_client"
+
+
+# -----------------------------------------------------------------------
+#  REGISTRY CLASS
+# -----------------------------------------------------------------------
+
+class ModelRegistry:
+    """
+    Thread-safe registry of lazily loaded, shared models.
+
+    Each model is described by a zero-argument loader. The first `get()` call
+    (or `warm_up()`) runs the loader and keeps the result resident; concurrent
+    callers for the same model wait for that single load instead of loading it
+    twice.
+    """
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Registers (or replaces) the loader for a model. Drops any resident instance."""
+        self._loaders[name] = loader
+        self._locks.setdefault(name, threading.Lock())
+        self._models.pop(name, None)
+        self._load_seconds.pop(name, None)
+
+    def get(self, name: str) -> Any:
+        """Returns the model `name`, loading it on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'.")
+
+        with self._locks[name]:
+            # Another thread may have finished the load while we waited.
+            if name not in self._models:
+                print(f"-> Loading model '{name}'...")
+                start = time.perf_counter()
+                self._models[name] = self._loaders[name]()
+                self._load_seconds[name] = time.perf_counter() - start
+                print(f"   -> '{name}' loaded in {self._load_seconds[name]:.2f}s")
+            return self._models[name]
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Loads the given models (all registered ones by default) and returns their load times."""
+        for name in names if names is not None else list(self._loaders):
+            self.get(name)
+        return dict(self._load_seconds)
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Reports, for every registered model, whether it is resident and how long it took to load."""
+        return {
+            name: {"resident": name in self._models, "load_seconds": self._load_seconds.get(name)}
+            for name in self._loaders
+        }
+
+    def is_resident(self, name: str) -> bool:
+        """Returns True if the model is already loaded in this process."""
+        return name in self._models
+
+
+# =======================================================================
+#  DEFAULT MODEL LOADERS
+# =======================================================================
+# Heavy libraries are imported inside the loaders so that importing the
+# application stays fast and only the models that are actually used pay
+# their import cost.
+
+def _device() -> str:
+    """Returns the torch device to run the local models on (and applies the thread settings)."""
+    import torch
+    from .inference import configure_torch_threads
+    configure_torch_threads()
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def _load_classifier() -> Any:
+    if settings.CLASSIFIER_BACKEND == "fake":
+        from .fakes import FakeClassifier
+        return FakeClassifier()
+
+    if settings.CLASSIFIER_BACKEND == "onnx":
+        from .inference import OnnxClassifier
+        return OnnxClassifier(settings.CLASSIFIER_ONNX_PATH)
+
+    import joblib
+    # Memory-mapped arrays are backed by the page cache, so forked workers share them.
+    return joblib.load(settings.CLASSIFIER_MODEL_PATH, mmap_mode="r" if settings.CLASSIFIER_MMAP else None)
+
+def _load_captioner() -> Any:
+    if settings.CAPTIONER_BACKEND == "fake":
+        from .fakes import FakeCaptioner
+        return FakeCaptioner(delay_s=settings.FAKE_CAPTION_DELAY_S, weights_mb=settings.FAKE_MODEL_WEIGHTS_MB)
+
+    from transformers import pipeline
+    if settings.CAPTIONER_BACKEND == "blip-int8":
+        from .inference import configure_torch_threads, quantize_int8
+        # Quantized kernels are CPU-only.
+        configure_torch_threads()
+        captioner = pipeline("image-to-text", model=settings.IMAGE_CAPTION_MODEL_ID, device=-1)
+        quantize_int8(captioner.model)
+        return captioner
+    return pipeline("image-to-text", model=settings.IMAGE_CAPTION_MODEL_ID, device=0 if _device() == "cuda" else -1)
+
+def _load_diffusion() -> Any:
+    if settings.DIFFUSION_BACKEND == "fake":
+        from .fakes import FakeDiffusionPipeline
+        return FakeDiffusionPipeline(delay_s=settings.FAKE_DIFFUSION_DELAY_S, weights_mb=settings.FAKE_MODEL_WEIGHTS_MB)
+
+    import torch
+    from diffusers import StableDiffusionPipeline
+    from .diffusion import apply_load_options, resolve_profile
+    device = _device()
+    pipeline = StableDiffusionPipeline.from_pretrained(
+        settings.DIFFUSION_MODEL_ID, torch_dtype=torch.float16 if device == "cuda" else torch.float32
+    )
+    _, profile = resolve_profile()
+    return apply_load_options(pipeline, profile, device)
+
+def _load_embeddings() -> Any:
+    if settings.EMBEDDINGS_BACKEND == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=768)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+    if settings.EMBEDDINGS_BACKEND == "onnx":
+        from .inference import onnx_session_options
+        # sentence-transformers exports the model to ONNX on first use and
+        # passes the inner `model_kwargs` on to ONNX Runtime.
+        model_kwargs = {'device': 'cpu', 'backend': 'onnx', 'model_kwargs': {'session_options': onnx_session_options()}}
+    elif settings.EMBEDDINGS_BACKEND == "huggingface-int8":
+        from .inference import configure_torch_threads
+        configure_torch_threads()
+        model_kwargs = {'device': 'cpu'}
+    else:
+        model_kwargs = {'device': _device()}
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=settings.EMBEDDING_MODEL_NAME,
+        model_kwargs=model_kwargs,
+        encode_kwargs={'normalize_embeddings': True}
+    )
+    if settings.EMBEDDINGS_BACKEND == "huggingface-int8":
+        from .inference import quantize_int8
+        # `_client` is the underlying SentenceTransformer module.
+        quantize_int8(embeddings._client)
+    return embeddings
+
+def _load_ollama_client() -> Any:
+    from .llm import OllamaClient
+    return OllamaClient(
+        base_url=settings.OLLAMA_BASE_URL,
+        keep_alive=settings.OLLAMA_KEEP_ALIVE,
+        max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+        max_concurrency_per_model=settings.OLLAMA_MAX_CONCURRENCY_PER_MODEL,
+        timeout_s=settings.OLLAMA_TIMEOUT_S
+    )
+
+def _chat_model_loader(registry: ModelRegistry, model: str) -> Callable[[], Any]:
+    """Returns a loader for a chat model that shares the registry's Ollama client."""
+    def load() -> Any:
+        from .llm import PooledChatOllama
+        return PooledChatOllama(client=registry.get(OLLAMA_CLIENT), model=model)
+    return load
+
+def build_model_registry() -> ModelRegistry:
+    """Creates a registry with the default loaders for every model in the pipeline."""
+    registry = ModelRegistry()
+    registry.register(CLASSIFIER, _load_classifier)
+    registry.register(CAPTIONER, _load_captioner)
+    registry.register(DIFFUSION, _load_diffusion)
+    registry.register(EMBEDDINGS, _load_embeddings)
+    registry.register(OLLAMA_CLIENT, _load_ollama_client)
+    registry.register(LLM_GENERATOR, _chat_model_loader(registry, settings.LLM_GENERATOR_MODEL))
+    registry.register(LLM_RETRIEVER, _chat_model_loader(registry, settings.LLM_RETRIEVER_MODEL))
+    return registry
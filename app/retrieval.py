@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Multi-query retrieval for the Amplify AI project.
+
+A drop-in replacement for LangChain's MultiQueryRetriever that generates the
+alternative queries with a single LLM call, embeds them in one batch, runs the
+MMR searches concurrently and de-duplicates the retrieved chunks by content.
+"""
+# =======================================================================
+#  12. MULTI-QUERY RETRIEVAL - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import hashlib
+from concurrent.futures import Executor
+from typing import Any, List, Optional, Tuple
+
+from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def parse_query_lines(text: str) -> List[str]:
+    """Splits the LLM answer into one query per non-empty line."""
+    return [line.strip() for line in text.strip().split("\n") if line.strip()]
+
+def unique_documents(documents: List[Document]) -> List[Document]:
+    """Drops documents whose content was already seen, keeping the first occurrence."""
+    seen = set()
+    unique = []
+    for doc in documents:
+        digest = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(doc)
+    return unique
+
+
+# -----------------------------------------------------------------------
+#  RETRIEVER CLASS
+# -----------------------------------------------------------------------
+
+class ParallelMultiQueryRetriever:
+    """
+    Generates sub-queries once and searches for all of them in parallel.
+
+    - `llm` rewrites the user question into alternative queries (one call).
+    - `embeddings` encodes all queries in a single batched call.
+    - MMR searches run concurrently on `executor`, which must not be the pool
+      `retrieve` itself runs on (its workers would wait on each other).
+    """
+    def __init__(
+        self,
+        llm: Any,
+        embeddings: Any,
+        executor: Executor,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        include_original: bool = False,
+    ):
+        self.llm = llm
+        self.embeddings = embeddings
+        self.executor = executor
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.include_original = include_original
+
+    def generate_queries(self, question: str) -> List[str]:
+        """Asks the retriever LLM for alternative phrasings of `question`."""
+        chain = DEFAULT_QUERY_PROMPT | self.llm | StrOutputParser()
+        return parse_query_lines(chain.invoke({"question": question}))
+
+    async def agenerate_queries(self, question: str) -> List[str]:
+        """Async version of `generate_queries`, for use from the event loop."""
+        chain = DEFAULT_QUERY_PROMPT | self.llm | StrOutputParser()
+        return parse_query_lines(await chain.ainvoke({"question": question}))
+
+    def search(self, vectorstore: Any, queries: List[str]) -> List[Document]:
+        """Runs one MMR search per query concurrently and returns the unique union."""
+        if not queries:
+            return []
+        vectors = self.embeddings.embed_documents(queries)
+        futures = [
+            self.executor.submit(
+                vectorstore.max_marginal_relevance_search_by_vector,
+                vector, k=self.k, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult
+            )
+            for vector in vectors
+        ]
+        # Results are gathered in query order, so the union is deterministic.
+        documents = [doc for future in futures for doc in future.result()]
+        return unique_documents(documents)
+
+    def retrieve(self, vectorstore: Any, question: str, generated_queries: Optional[List[str]] = None) -> Tuple[List[str], List[Document]]:
+        """Returns `(generated_queries, documents)` for `question`. Pass `generated_queries` to skip the LLM call."""
+        if generated_queries is None:
+            generated_queries = self.generate_queries(question)
+        search_queries = generated_queries + [question] if self.include_original else generated_queries
+        # Never search with nothing: fall back to the question itself.
+        search_queries = search_queries or [question]
+        return generated_queries, self.search(vectorstore, search_queries)
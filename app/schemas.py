@@ -19,7 +19,7 @@ serialization, and automatic documentation via FastAPI.
 # =======================================================================
 
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List, Optional
 
 # =======================================================================
 #  API INPUT DEFINITION (CONCEPTUAL)
@@ -39,12 +39,14 @@ from typing import List
 # to clarify how the API receives its data.
 #
 # from fastapi import Form, File, UploadFile
-# from typing import List
+# from typing import Dict, List, Optional
 #
 # Conceptual Inputs for the /generate endpoint:
 #   1. user_prompt: str = Form(..., description="The user's core request, e.g., 'Announce our new fall coffee'.")
 #   2. brand_guide_file: UploadFile = File(..., description="The user's brand guide in .md format.")
 #   3. style_images: List[UploadFile] = File(..., description="A list of images that represent the brand's visual style.")
+#   4. brand_id: Optional[str] = Form(None, description="A brand registered via POST /brands; replaces inputs 2 and 3.")
+#   5. response_mode: str = Form("json", description="'json' (base64 image), 'url' (link to GET /images/{id}) or 'multipart' (raw image bytes).")
 
 # =======================================================================
 #  OUTPUT SCHEMAS
@@ -62,18 +64,42 @@ class ContentGenerationOutput(BaseModel):
         description="The final, ready-to-publish text for the social media post.",
         example="¡El otoño ya está aquí y nuestro Latte de Calabaza también! 🍂🎃 Ven a probar el sabor de la temporada, hecho con especias naturales y mucho amor."
     )
-    generated_image_b64: str = Field(
-        ...,
+    generated_image_b64: Optional[str] = Field(
+        None,
         title="Generated Image (Base64 Encoded)",
-        description="The generated image for the post, encoded as a Base64 string.",
+        description="The generated image for the post, encoded as a Base64 string. Set with response_mode 'json' (the default).",
         example="iVBORw0KGgoAAAANSUhEUgA..."
     )
+    generated_image_url: Optional[str] = Field(
+        None,
+        title="Generated Image URL",
+        description="Where to download the generated image (GET /images/{id}). Set with response_mode 'url'.",
+        example="/api/v1/images/3f5a9c..."
+    )
+    generated_image_media_type: Optional[str] = Field(
+        None,
+        title="Generated Image Media Type",
+        description="The encoding of the generated image, as configured on the server (IMAGE_FORMAT).",
+        example="image/png"
+    )
+    image_skipped: Optional[bool] = Field(
+        None,
+        title="Image Skipped",
+        description="True when the server was too busy to render the image before the request's deadline; only the copy is returned.",
+        example=True
+    )
     classified_intent: str = Field(
         ...,
         title="Classified User Intent",
         description="The user's intent as predicted by the classification model (e.g., Promotion, Product Launch).",
         example="Lanzamiento de Producto"
     )
+    intent_confidence: Optional[float] = Field(
+        None,
+        title="Intent Confidence",
+        description="Probability of the classified intent, if the classification model reports probabilities.",
+        example=0.87
+    )
     # --- NOVEDAD: Visibilidad del MultiQueryRetriever ---
     generated_queries: List[str] = Field(
         ...,
@@ -101,6 +127,7 @@ class ContentGenerationOutput(BaseModel):
             "example": {
                 "generated_copy_text": "¡El otoño ya está aquí y nuestro Latte de Calabaza también! 🍂🎃 Ven a probar el sabor de la temporada, hecho con especias naturales y mucho amor. #LatteDeCalabaza #Otoño",
                 "generated_image_b64": "iVBORw0KGgoAAAANSUhEUg...",
+                "generated_image_media_type": "image/png",
                 "classified_intent": "Lanzamiento de Producto",
                 "generated_queries": [
                     "¿Cuáles son las mejores estrategias de marketing para lanzar un nuevo café de otoño?",
@@ -114,6 +141,106 @@ class ContentGenerationOutput(BaseModel):
         }
 
 
+# =======================================================================
+#  BRAND SCHEMAS
+# =======================================================================
+
+class IndexingReport(BaseModel):
+    """What the last (re-)indexing of a brand did. Only new or edited chunks are embedded."""
+    embedded: int = Field(..., description="Chunks that were new or changed, and were embedded.")
+    deleted: int = Field(..., description="Chunks that no longer exist, and were removed from the index.")
+    unchanged: int = Field(..., description="Chunks whose stored vectors were kept as they were.")
+
+
+class BrandOutput(BaseModel):
+    """A registered brand. Pass its `brand_id` to /generate instead of re-uploading the assets."""
+    brand_id: str = Field(..., description="Identifier to reference the brand with.")
+    name: Optional[str] = Field(None, description="Optional human-readable brand name.", example="Café Otoño")
+    created_at: float = Field(..., description="Registration time (Unix timestamp).")
+    updated_at: Optional[float] = Field(None, description="Time of the last update (Unix timestamp), if any.")
+    num_chunks: int = Field(..., description="Number of indexed chunks (guide sections plus image captions).")
+    num_images: int = Field(..., description="Number of style images ingested.")
+    image_captions: List[str] = Field(..., description="Captions generated for the style images.")
+    last_indexing: Optional[IndexingReport] = Field(None, description="Chunk counts of the last (re-)indexing.")
+
+
+# =======================================================================
+#  CLASSIFICATION SCHEMAS
+# =======================================================================
+
+class IntentPrediction(BaseModel):
+    """The intent predicted for one prompt, with the model's confidence in it."""
+    intent: str = Field(..., description="The most likely intent.", example="Lanzamiento de Producto")
+    confidence: Optional[float] = Field(None, description="Probability of `intent`; null if the model reports no probabilities.", example=0.87)
+    probabilities: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Probability of every intent the model knows (empty if it reports none).",
+        example={"Lanzamiento de Producto": 0.87, "Promoción": 0.09, "Evento": 0.04}
+    )
+
+
+class ClassifyInput(BaseModel):
+    """A batch of prompts to classify."""
+    prompts: List[str] = Field(..., min_length=1, description="The prompts to classify.", example=["Anuncia nuestro nuevo café de otoño"])
+
+
+class ClassifyOutput(BaseModel):
+    """One prediction per input prompt, in the same order."""
+    predictions: List[IntentPrediction]
+
+
+# =======================================================================
+#  JOB SCHEMAS
+# =======================================================================
+
+class JobCreated(BaseModel):
+    """Returned when a generation job is accepted into the queue."""
+    job_id: str = Field(..., description="Identifier to poll the job with.")
+    status: str = Field(..., description="Initial job status (always 'queued').", example="queued")
+    status_url: str = Field(..., description="Relative URL to poll for the job status.", example="/api/v1/jobs/3f2a...")
+
+
+class JobStatus(BaseModel):
+    """Current state of a generation job, including its result once finished."""
+    job_id: str
+    status: str = Field(..., description="One of: queued, running, succeeded, failed.")
+    stage: Optional[str] = Field(None, description="Pipeline stage currently running ('text' or 'image').")
+    created_at: float = Field(..., description="Submission time (Unix timestamp).")
+    started_at: Optional[float] = Field(None, description="Time the job left the queue (Unix timestamp).")
+    finished_at: Optional[float] = Field(None, description="Completion time (Unix timestamp).")
+    result: Optional[ContentGenerationOutput] = None
+    error: Optional[str] = None
+
+
+class JobQueueStats(BaseModel):
+    """Depth and wait-time statistics of the job queue."""
+    depth: int = Field(..., description="Jobs waiting for their first stage.")
+    running: int = Field(..., description="Jobs currently executing a stage.")
+    oldest_queued_wait_s: float
+    avg_wait_s: float
+    p95_wait_s: float
+
+
+# =======================================================================
+#  CAMPAIGN SCHEMAS
+# =======================================================================
+
+class CampaignPost(BaseModel):
+    """One finished post of a campaign (the data of a `post` event of POST /campaigns)."""
+    index: int = Field(..., description="Position of the post in the campaign, from 0. Posts arrive in completion order.")
+    user_prompt: str = Field(..., description="The request this post was written for.")
+    variant: Optional[int] = Field(None, description="Variant number (from 1) when the campaign asked for variants of one prompt.")
+    post: ContentGenerationOutput
+
+
+class CampaignSummary(BaseModel):
+    """Outcome of a whole campaign (the data of its `summary` event)."""
+    posts: int = Field(..., description="Posts requested.")
+    completed: int = Field(..., description="Posts delivered in a `post` event.")
+    failed: int = Field(..., description="Posts reported in a `post_error` event.")
+    seconds: float = Field(..., description="Wall-clock time of the whole campaign.")
+
+
 # =======================================================================
 #  UTILITY SCHEMAS
 # =======================================================================
@@ -123,4 +250,21 @@ class Msg(BaseModel):
     A schema for a generic message response, typically used for
     health check endpoints or simple error feedback.
     """
-    message: str
\ No newline at end of file
+    message: str
+
+
+class ModelStatus(BaseModel):
+    """Load state of a single model held by the model registry."""
+    resident: bool = Field(..., description="Whether the model is loaded in this worker.")
+    load_seconds: Optional[float] = Field(None, description="How long the model took to load, if it is resident.")
+
+
+class ReadinessOutput(BaseModel):
+    """
+    A schema for the readiness endpoint. It reports whether the service can
+    take traffic and which models are resident in the current worker.
+    """
+    ready: bool
+    # Process id of the worker that answered (several share the port under app/server.py).
+    worker_pid: Optional[int] = None
+    models: Dict[str, ModelStatus]
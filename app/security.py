@@ -7,8 +7,11 @@
 #   - Define the security scheme for the API (API Key in 'X-API-KEY' header).
 #   - Create a reusable FastAPI dependency to protect endpoints.
 #   - This function acts as a "guard" for routes that require authentication.
+#   - Map each API key to a priority class for admission control (admission.py).
 #
 # =======================================================================
+from typing import Optional
+
 from fastapi import Security, HTTPException, status
 from fastapi.security import APIKeyHeader
 from app.config import settings
@@ -29,8 +32,9 @@ def get_api_key(api_key_header: str = Security(api_key_header_scheme)):
        (thanks to `Security(api_key_header_scheme)`).
     3. It will pass that value to the 'api_key_header' parameter.
     """
-    # Check if the key was provided and if it matches our secret key.
-    if api_key_header == settings.API_SECRET_KEY:
+    # Check if the key was provided and if it matches our secret key
+    # (or one of the keys that have their own priority class).
+    if api_key_header == settings.API_SECRET_KEY or api_key_header in settings.API_KEY_PRIORITIES:
         # If they match, validation is successful.
         # Return the key, and FastAPI proceeds with the request.
         return api_key_header
@@ -40,4 +44,19 @@ def get_api_key(api_key_header: str = Security(api_key_header_scheme)):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, # "Unauthorized" status
             detail="Invalid or missing API Key", # Message for the client
-        )
\ No newline at end of file
+        )
+
+# --- Part C: Map the caller to a priority class ---
+# Admission control serves higher classes first when the server is busy.
+# Unlike `get_api_key`, a missing key is allowed: anonymous callers get the
+# lowest class. A key that IS sent must still be valid.
+def get_priority_class(api_key_header: Optional[str] = Security(api_key_header_scheme)) -> str:
+    """
+    This function is a FastAPI "Dependency" returning the priority class
+    ("high", "standard" or "low") of the caller, from its 'X-API-KEY' header.
+    """
+    if api_key_header is None:
+        return settings.ANONYMOUS_PRIORITY
+    # Reuse the guard: an unknown key is rejected with a 401.
+    api_key = get_api_key(api_key_header)
+    return settings.API_KEY_PRIORITIES.get(api_key, settings.API_KEY_DEFAULT_PRIORITY)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-fork server entry point for the Amplify AI project.
+
+`uvicorn app.main:app --workers N` starts N independent processes, and each
+one imports the application and loads its own copy of every model. This
+entry point loads the local models (classifier, embeddings, captioner,
+diffusion) ONCE in a master process and then forks the workers, so they all
+share the same weight pages copy-on-write. The master binds the listening
+socket, hands it to every worker, restarts workers that die and forwards
+SIGTERM/SIGINT for a graceful shutdown.
+
+Notes:
+- The Ollama client (an HTTP connection pool) is created in each worker,
+  never in the master: sockets and event-loop objects must not cross a fork.
+- CUDA cannot be initialized before a fork. With a GPU, only the classifier
+  is preloaded and every worker loads its GPU models itself. The same goes
+  for ONNX Runtime backends (their thread pools do not survive a fork).
+- Brands and stored images live on disk and are visible to every worker.
+  Jobs are held in the memory of the worker that accepted them, so polling
+  /jobs/{id} needs sticky routing (or a single worker).
+- With several workers, /metrics aggregates every process through
+  prometheus_client's multiprocess mode (PROMETHEUS_MULTIPROC_DIR).
+
+Usage:
+    python -m app.server --workers 4 --port 8000
+    python -m app.server --workers 4 --no-preload   # every worker loads its own models
+"""
+# =======================================================================
+#  20. PRE-FORK SERVER - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import gc
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import traceback
+from typing import Any, Dict, List
+
+# Internal imports
+# Only the settings are imported at module level: the application (and with
+# it prometheus_client) must be imported after PROMETHEUS_MULTIPROC_DIR is set.
+from app.config import settings
+
+
+# Exit code of a worker whose application failed to start. The master stops
+# instead of restarting it over and over.
+STARTUP_FAILURE = 3
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def _preload_names() -> List[str]:
+    """The models that can be loaded before forking and shared by the workers."""
+    from app.registry import CAPTIONER, CLASSIFIER, DIFFUSION, EMBEDDINGS
+
+    # Ask NVML rather than the CUDA driver, so the check itself does not
+    # initialize CUDA in the master.
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    try:
+        import torch
+        on_gpu = torch.cuda.is_available()
+    except ImportError:
+        on_gpu = False
+    names = [CLASSIFIER]
+    if on_gpu:
+        print("[WARN] CUDA is available: GPU models are loaded by each worker (CUDA does not survive a fork).")
+    else:
+        names += [EMBEDDINGS, CAPTIONER, DIFFUSION]
+    # ONNX Runtime sessions start their thread pools when created, and threads
+    # do not survive a fork either: those models are loaded by each worker.
+    onnx_models = {CLASSIFIER: settings.CLASSIFIER_BACKEND == "onnx", EMBEDDINGS: settings.EMBEDDINGS_BACKEND == "onnx"}
+    return [name for name in names if not onnx_models.get(name)]
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    """Creates the listening socket shared by every worker."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def _spawn(app: Any, sock: socket.socket, log_level: str) -> int:
+    """Forks one worker serving `app` on `sock`. Returns its pid (in the master)."""
+    pid = os.fork()
+    if pid:
+        return pid
+
+    # Worker process: uvicorn installs its own signal handlers.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 1
+    try:
+        import uvicorn
+        server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+        server.run(sockets=[sock])
+        code = 0 if server.started else STARTUP_FAILURE
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+
+# -----------------------------------------------------------------------
+#  MASTER PROCESS
+# -----------------------------------------------------------------------
+
+def serve(host: str, port: int, workers: int, preload: bool, log_level: str = "info", backlog: int = 2048) -> int:
+    """Runs the pre-fork server until it is stopped. Returns the exit code."""
+    metrics_dir = None
+    if workers > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        metrics_dir = tempfile.mkdtemp(prefix="amplify-metrics-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+    # Forked workers must not inherit a busy tokenizer thread pool.
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+    from app.main import app
+
+    if preload:
+        from app.registry import build_model_registry
+        print(f"--- Preloading models in the master process (pid {os.getpid()}) ---")
+        registry = build_model_registry()
+        registry.warm_up(_preload_names())
+        # Picked up by the lifespan of every worker.
+        app.state.model_registry = registry
+    # Move everything allocated so far out of the collector's reach, so a
+    # collection in a worker does not write to (and un-share) those pages.
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind(host, port, backlog)
+    print(f"--- Listening on http://{host}:{port} with {workers} worker(s) (preload={preload}) ---")
+    pids: Dict[int, int] = {_spawn(app, sock, log_level): index for index in range(workers)}
+
+    stopping = False
+    exit_code = 0
+
+    def stop(signum: int, frame: Any) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while pids:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        if pid not in pids:
+            continue
+        index = pids.pop(pid)
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(pid)
+        code = os.waitstatus_to_exitcode(status)
+        if stopping:
+            continue
+        if code == STARTUP_FAILURE:
+            print(f"[ERROR] Worker {pid} failed to start; shutting down.")
+            exit_code = code
+            stop(signal.SIGTERM, None)
+            continue
+        print(f"[WARN] Worker {pid} exited with code {code}; starting a replacement.")
+        pids[_spawn(app, sock, log_level)] = index
+
+    sock.close()
+    if metrics_dir is not None:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+    print("--- Amplify AI server stopped ---")
+    return exit_code
+
+
+# =======================================================================
+#  ENTRY POINT
+# =======================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS, help="Number of worker processes.")
+    parser.add_argument("--no-preload", dest="preload", action="store_false", default=settings.SERVER_PRELOAD_MODELS,
+                        help="Let every worker load its own models instead of sharing the master's.")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    sys.exit(serve(args.host, args.port, args.workers, args.preload, args.log_level))
+
+
+if __name__ == "__main__":
+    main()
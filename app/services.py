@@ -17,30 +17,46 @@ import warnings
 warnings.filterwarnings('ignore')
 
 # Core libraries
+import asyncio
 import base64
+import functools
 import io
-from typing import List, Tuple
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-import joblib
-import torch
-from diffusers import StableDiffusionPipeline
+import numpy as np
 from fastapi import UploadFile
 from PIL import Image
-from transformers import pipeline
 
 # LangChain components
-from langchain_community.chat_models import ChatOllama
-from langchain_community.vectorstores import Chroma
 from langchain_core.documents import Document
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.retrievers.multi_query import MultiQueryRetriever
 from langchain.text_splitter import MarkdownHeaderTextSplitter
 
 # Internal imports
+from . import metrics
+from .admission import AdmissionRejected, AdmissionTicket
+from .batching import MicroBatcher
+from .brands import Brand, BrandStore
+from .cache import (BrandIndexCache, CachedEmbeddings, CaptionCache, ChunkEmbeddingCache, IntentCache,
+                    SemanticCache, hash_brand_assets, hash_image_bytes)
 from .config import settings
-from .schemas import ContentGenerationOutput
+from .diffusion import DiffusionRenderer, resolve_profile
+from .executors import CPU, GPU, RETRIEVAL, ExecutionLayer
+from .images import (DELIVER_B64, DELIVER_URL, DELIVERY_MODES, FORMATS,
+                     ImageStore, encode_image, media_type)
+from .registry import (CAPTIONER, CLASSIFIER, DIFFUSION, EMBEDDINGS,
+                       LLM_GENERATOR, LLM_RETRIEVER, ModelRegistry)
+from .retrieval import ParallelMultiQueryRetriever
+from .schemas import (CampaignPost, CampaignSummary, ContentGenerationOutput,
+                      IntentPrediction)
+from .stages import StageGraph
+from .uploads import decode_text, read_upload
+from .vectorstores import BACKENDS, build_vector_store, load_vector_store
 
 
 # =======================================================================
@@ -49,11 +65,49 @@ from .schemas import ContentGenerationOutput
 # These are "pure" functions: they don't depend on the service's state (self).
 # Placing them outside the class enhances clarity, testability, and reusability.
 
-def _encode_image_to_base64(image: Image.Image) -> str:
-    """Utility to convert a PIL Image to a Base64 string."""
-    buffered = io.BytesIO()
-    image.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+def _predict_intents(classifier: Any, texts: List[str]) -> List[IntentPrediction]:
+    """Utility to classify a batch of prompts, with class probabilities when the model provides them."""
+    if not hasattr(classifier, "predict_proba"):
+        return [IntentPrediction(intent=str(intent)) for intent in classifier.predict(texts)]
+    classes = [str(label) for label in classifier.classes_]
+    predictions = []
+    for row in np.asarray(classifier.predict_proba(texts)):
+        best = int(np.argmax(row))
+        predictions.append(IntentPrediction(
+            intent=classes[best],
+            confidence=float(row[best]),
+            probabilities={label: float(p) for label, p in zip(classes, row)}
+        ))
+    return predictions
+
+def _to_base64(data: bytes) -> str:
+    """Utility to convert encoded image bytes to a Base64 string."""
+    return base64.b64encode(data).decode("ascii")
+
+def _decode_image(image_bytes: bytes, max_short_side: int) -> Image.Image:
+    """
+    Utility to decode raw uploaded bytes into an RGB PIL Image, at reduced
+    size: its shorter side is brought down to `max_short_side`, since the
+    captioner resizes every image to its own input resolution anyway.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    # JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale (never below the
+    # requested size), so a 20 MP photo is never materialized in full.
+    image.draft("RGB", (max_short_side, max_short_side))
+    image = image.convert("RGB")
+    scale = max_short_side / min(image.size)
+    if scale < 1:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.BICUBIC, reducing_gap=2.0)
+    return image
+
+def _split_brand_documents(brand_guide_text: str, image_captions: List[str]) -> List[Document]:
+    """Splits the brand guide by header and appends one document per image caption."""
+    headers_to_split_on = [("#", "Header 1"), ("##", "Header 2")]
+    markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
+    md_chunks = markdown_splitter.split_text(brand_guide_text)
+    caption_docs = [Document(page_content=caption, metadata={"source": "style_image"}) for caption in image_captions]
+    return md_chunks + caption_docs
 
 def _build_text_generation_prompt() -> ChatPromptTemplate:
     """Builds the LangChain prompt template for the main text generation task."""
@@ -80,6 +134,10 @@ def _build_image_prompt_generation_prompt() -> ChatPromptTemplate:
         IMAGE PROMPT:"""
     )
 
+# Semantic cache scope of the retrieval sub-queries. The query prompt only
+# contains the user's request, so the same answer holds for every brand and intent.
+QUERIES_SCOPE = (None, None, "queries")
+
 # -----------------------------------------------------------------------
 #  STATEFUL SERVICE CLASS
 # -----------------------------------------------------------------------
@@ -87,155 +145,713 @@ def _build_image_prompt_generation_prompt() -> ChatPromptTemplate:
 class ContentGenerationService:
     """
     Manages the stateful components (AI models) and orchestrates the content generation pipeline.
-    Models are loaded once during initialization for maximum efficiency.
+    Models live in a shared ModelRegistry and are loaded lazily, once per process.
     """
-    def __init__(self):
-        """Initializes the service and loads all necessary AI models and LangChain components."""
+    def __init__(self, registry: ModelRegistry):
+        """Initializes the service on top of a shared model registry, plus its caches and executors."""
         print("Initializing ContentGenerationService with LangChain stack...")
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-
-        # 1. Load non-LangChain Models
-        self.classifier = joblib.load(settings.CLASSIFIER_MODEL_PATH)
-        self.image_captioner = pipeline("image-to-text", model=settings.IMAGE_CAPTION_MODEL_ID, device=0 if device == "cuda" else -1)
-        self.diffusion_pipeline = StableDiffusionPipeline.from_pretrained(
-            settings.DIFFUSION_MODEL_ID, torch_dtype=torch.float16 if device == "cuda" else torch.float32
-        ).to(device)
-        print("-> Classifier, Captioner, and Diffusion models loaded.")
-
-        # 2. Initialize LangChain LLMs (Two-Tier Strategy)
-        self.llm_generator = ChatOllama(model=settings.LLM_GENERATOR_MODEL)
-        self.llm_retriever = ChatOllama(model=settings.LLM_RETRIEVER_MODEL)
-        print(f"-> Main LLM: {settings.LLM_GENERATOR_MODEL} | Retriever LLM: {settings.LLM_RETRIEVER_MODEL}")
 
-        # 3. Initialize LangChain Embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=settings.EMBEDDING_MODEL_NAME,
-            model_kwargs={'device': device},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        # 1-3. Models (classifier, captioner, diffusion, LLMs, embeddings) are
+        #      owned by the registry and resolved through the properties below.
+        self.registry = registry
+        print(f"-> Main LLM: {settings.LLM_GENERATOR_MODEL} | Retriever LLM: {settings.LLM_RETRIEVER_MODEL}")
         print(f"-> Embedding Model: {settings.EMBEDDING_MODEL_NAME}")
 
-        print("✅ All models and components initialized successfully.")
+        # 4. Initialize the persistent brand index cache
+        if settings.VECTOR_STORE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown VECTOR_STORE_BACKEND '{settings.VECTOR_STORE_BACKEND}'. Available: {list(BACKENDS)}.")
+        self.brand_index_cache = BrandIndexCache(
+            cache_dir=settings.BRAND_INDEX_CACHE_DIR,
+            max_entries=settings.BRAND_INDEX_CACHE_MAX_ENTRIES
+        )
+        print(f"-> Brand Index Cache: {settings.BRAND_INDEX_CACHE_DIR} (backend: {settings.VECTOR_STORE_BACKEND})")
+        # Chunk vectors shared by every index build, so a new index only
+        # embeds the chunks that were never embedded before.
+        self.chunk_embedding_cache = ChunkEmbeddingCache(max_entries=settings.CHUNK_EMBEDDING_CACHE_MAX_ENTRIES)
+
+        # 5. Initialize the content-addressed caption cache
+        self.caption_cache = CaptionCache(
+            max_entries=settings.CAPTION_CACHE_MAX_ENTRIES,
+            cache_dir=settings.CAPTION_CACHE_DIR
+        )
+        print(f"-> Caption Cache: {settings.CAPTION_CACHE_MAX_ENTRIES} entries (disk: {settings.CAPTION_CACHE_DIR or 'disabled'})")
+
+        # 6. Initialize the semantic cache for LLM outputs (optional)
+        self.semantic_cache = SemanticCache(
+            embed_fn=lambda text: self.embeddings.embed_query(text),
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl_s=settings.SEMANTIC_CACHE_TTL_S,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES
+        ) if settings.SEMANTIC_CACHE_ENABLED else None
+
+        # 7. Initialize the execution layer (one bounded pool per resource class)
+        self.executors = ExecutionLayer(
+            gpu_workers=settings.GPU_EXECUTOR_WORKERS,
+            cpu_workers=settings.CPU_EXECUTOR_WORKERS,
+            retrieval_workers=settings.RETRIEVAL_EXECUTOR_WORKERS
+        )
+        print(f"-> Executors: gpu={settings.GPU_EXECUTOR_WORKERS} | cpu={settings.CPU_EXECUTOR_WORKERS} | retrieval={settings.RETRIEVAL_EXECUTOR_WORKERS}")
+
+        # 8. Initialize the cross-request caption micro-batcher (optional)
+        self.caption_batcher = MicroBatcher(
+            batch_fn=self._caption_batch,
+            max_batch_size=settings.CAPTION_BATCH_SIZE,
+            max_wait_ms=settings.CAPTION_MICRO_BATCH_WAIT_MS,
+            executor=self.executors.executor(GPU),
+            max_in_flight=settings.GPU_EXECUTOR_WORKERS
+        ) if settings.CAPTION_MICRO_BATCHING else None
+
+        # 9. Cross-request diffusion batching schedulers (optional), created
+        #    lazily: one per performance profile, since only prompts rendered
+        #    with the same settings can share a batch.
+        self._diffusion_batchers: Dict[str, MicroBatcher] = {}
+        self._diffusion_renderer: Optional[DiffusionRenderer] = None
+        self._diffusion_renderer_lock = threading.Lock()
+
+        # 10. Initialize the store of registered (pre-ingested) brands
+        self.brand_store = BrandStore(root_dir=settings.BRAND_STORE_DIR, index_name=settings.VECTOR_STORE_BACKEND)
+        print(f"-> Brand Store: {settings.BRAND_STORE_DIR} ({self.brand_store.stats()['brands']} brands)")
+
+        # 11. Initialize the local store of generated images (served by GET /images/{id})
+        if settings.IMAGE_FORMAT not in FORMATS:
+            raise ValueError(f"Unknown IMAGE_FORMAT '{settings.IMAGE_FORMAT}'. Available: {list(FORMATS)}.")
+        self.image_store = ImageStore(root_dir=settings.IMAGE_STORE_DIR, max_entries=settings.IMAGE_STORE_MAX_ENTRIES)
+        print(f"-> Image Output: {settings.IMAGE_FORMAT} (quality {settings.IMAGE_QUALITY}) | store: {settings.IMAGE_STORE_DIR}")
+
+        # 12. Initialize the intent cache and the cross-request classifier micro-batcher (optional)
+        self.intent_cache = IntentCache(max_entries=settings.INTENT_CACHE_MAX_ENTRIES)
+        self.intent_batcher = MicroBatcher(
+            batch_fn=self.classify_intents,
+            max_batch_size=settings.CLASSIFIER_MAX_BATCH_SIZE,
+            max_wait_ms=settings.CLASSIFIER_MICRO_BATCH_WAIT_MS,
+            executor=self.executors.executor(CPU)
+        ) if settings.CLASSIFIER_MICRO_BATCHING else None
+
+        print("✅ All components initialized successfully.")
+
+    # -----------------------------------------------------------------------
+    #  SHARED MODELS (resolved lazily through the registry)
+    # -----------------------------------------------------------------------
+
+    @property
+    def classifier(self):
+        return self.registry.get(CLASSIFIER)
+
+    @property
+    def image_captioner(self):
+        return self.registry.get(CAPTIONER)
+
+    @property
+    def diffusion_pipeline(self):
+        return self.registry.get(DIFFUSION)
+
+    @property
+    def diffusion_renderer(self) -> DiffusionRenderer:
+        """Profile-aware wrapper around the shared diffusion pipeline."""
+        with self._diffusion_renderer_lock:
+            pipeline = self.diffusion_pipeline
+            if self._diffusion_renderer is None or self._diffusion_renderer.pipeline is not pipeline:
+                self._diffusion_renderer = DiffusionRenderer(pipeline)
+            return self._diffusion_renderer
+
+    @property
+    def embeddings(self):
+        return self.registry.get(EMBEDDINGS)
+
+    @property
+    def llm_generator(self):
+        return self.registry.get(LLM_GENERATOR)
+
+    @property
+    def llm_retriever(self):
+        return self.registry.get(LLM_RETRIEVER)
+
+    def shutdown(self) -> None:
+        """Releases the service's worker pools."""
+        self.executors.shutdown()
 
     # =======================================================================
     #  ATOMIC PUBLIC FUNCTIONS (PIPELINE STEPS)
     # =======================================================================
 
-    def classify_intent(self, text: str) -> str:
-        """STEP 1: Predicts the intent of the user's prompt."""
-        print(f"1. Classifying intent for: '{text[:50]}...'")
-        return self.classifier.predict([text])[0]
-
-    async def generate_captions_from_images(self, images: List[UploadFile]) -> List[str]:
-        """STEP 2: Processes uploaded images and generates text descriptions."""
-        print(f"2. Generating captions for {len(images)} style images...")
-        captions = []
-        for image_file in images:
-            image_bytes = await image_file.read()
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            caption_result = self.image_captioner(image)
-            captions.append(caption_result[0]['generated_text'])
-        return captions
-
-    def setup_and_retrieve_context(self, brand_guide_text: str, image_captions: List[str], user_prompt: str) -> Tuple[List[str], List[Document]]:
-        """STEP 3: Sets up the full RAG pipeline and retrieves context."""
-        print("3. Setting up RAG pipeline and retrieving context...")
-
-        # A. Split brand guide and create Document objects
-        headers_to_split_on = [("#", "Header 1"), ("##", "Header 2")]
-        markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on=headers_to_split_on)
-        md_chunks = markdown_splitter.split_text(brand_guide_text)
-        caption_docs = [Document(page_content=caption, metadata={"source": "style_image"}) for caption in image_captions]
-        all_docs = md_chunks + caption_docs
-
-        # B. Setup Vector Store and Retriever
-        vectorstore = Chroma.from_documents(documents=all_docs, embedding=self.embeddings)
-        base_retriever = vectorstore.as_retriever(search_type="mmr")
-        
-        # C. Setup and invoke the MultiQueryRetriever
-        class LoggingMultiQueryRetriever(MultiQueryRetriever):
-            """A custom retriever to capture the generated queries."""
-            generated_queries: List[str] = []
-            def _get_relevant_documents(self, question: str, **kwargs):
-                # LangChain's MultiQueryRetriever generates queries and then runs them.
-                # We tap into this process to log the queries.
-                # Note: This is an adaptation of the internal logic for logging purposes.
-                from langchain.chains.llm import LLMChain
-                from langchain.output_parsers.list import LineListOutputParser
-                
-                output_parser = LineListOutputParser()
-                llm_chain = LLMChain(llm=self.llm, prompt=self.prompt, output_parser=output_parser)
-                self.generated_queries = llm_chain.run(question)
-                
-                return super()._get_relevant_documents(question, **kwargs)
-
-        multi_query_retriever = LoggingMultiQueryRetriever.from_llm(retriever=base_retriever, llm=self.llm_retriever)
-        retrieved_docs = multi_query_retriever.invoke(user_prompt)
-        
-        print(f"   -> Generated {len(multi_query_retriever.generated_queries)} sub-queries.")
-        return multi_query_retriever.generated_queries, retrieved_docs
+    def classify_intents(self, texts: List[str]) -> List[IntentPrediction]:
+        """STEP 1 (batched): Predicts the intent of several prompts, with probabilities, in one model call."""
+        return _predict_intents(self.classifier, texts)
+
+    async def aclassify_intents(self, texts: List[str]) -> List[IntentPrediction]:
+        """
+        STEP 1 (async): Classifies prompts through the intent cache. The
+        misses are deduplicated and classified off the event loop, merged
+        with concurrent requests when micro-batching is enabled.
+        """
+        if len(texts) == 1:
+            print(f"1. Classifying intent for: '{texts[0][:50]}...'")
+        else:
+            print(f"1. Classifying intent for {len(texts)} prompts...")
+        with metrics.stage_span(metrics.INTENT) as span:
+            predictions = [self.intent_cache.get(text) for text in texts]
+            misses = list(dict.fromkeys(text for text, prediction in zip(texts, predictions) if prediction is None))
+            span.cache = metrics.MISS if misses else metrics.HIT
+
+            if misses:
+                if self.intent_batcher is not None:
+                    new_predictions = await self.intent_batcher.submit_many(misses)
+                else:
+                    new_predictions = await self.executors.run(CPU, self.classify_intents, misses)
+                fresh = dict(zip(misses, new_predictions))
+                for text, prediction in fresh.items():
+                    self.intent_cache.put(text, prediction)
+                predictions = [prediction if prediction is not None else fresh[text] for text, prediction in zip(texts, predictions)]
+            return predictions
+
+    async def generate_captions_from_bytes(self, all_image_bytes: List[bytes]) -> List[str]:
+        """STEP 2: Generates text descriptions for already-read style images."""
+        print(f"2. Generating captions for {len(all_image_bytes)} style images...")
+        with metrics.stage_span(metrics.CAPTION) as span:
+            # A. Look each image up by content hash, so a repeated image never
+            #    goes through the captioner again.
+            image_keys = [hash_image_bytes(image_bytes) for image_bytes in all_image_bytes]
+            captions = [self.caption_cache.get(image_key) for image_key in image_keys]
+            misses = [i for i, caption in enumerate(captions) if caption is None]
+            span.cache = metrics.MISS if misses else metrics.HIT
+
+            if misses:
+                # B. Decode the cache misses concurrently, off the event loop.
+                decoded_images = await asyncio.gather(
+                    *(self.executors.run(CPU, _decode_image, all_image_bytes[i], settings.CAPTION_IMAGE_SIZE) for i in misses)
+                )
+
+                # C. Caption them in batched forward passes, either merged with other
+                #    requests (micro-batching) or as one call on the GPU pool.
+                if self.caption_batcher is not None:
+                    new_captions = await self.caption_batcher.submit_many(list(decoded_images))
+                else:
+                    new_captions = await self.executors.run(GPU, self._caption_batch, list(decoded_images))
+
+                for i, caption in zip(misses, new_captions):
+                    captions[i] = caption
+                    self.caption_cache.put(image_keys[i], caption)
+
+            print(f"   -> Caption cache: {self.caption_cache.stats()}")
+            return captions
+
+    def _caption_batch(self, images: List[Image.Image]) -> List[str]:
+        """Runs the captioner over a list of images in batches of CAPTION_BATCH_SIZE."""
+        results = self.image_captioner(images, batch_size=settings.CAPTION_BATCH_SIZE)
+        return [result[0]['generated_text'] for result in results]
+
+    async def agenerate_queries(self, user_prompt: str, bypass_cache: bool = False) -> List[str]:
+        """
+        STEP 3a (async): Generates the retrieval sub-queries. They depend on
+        the prompt alone (not on the brand or the intent), so this can run
+        while the brand is still being captioned and indexed.
+        """
+        print("3. Generating retrieval sub-queries...")
+        retriever = self._build_retriever()
+        return await self._acached_llm_call(
+            QUERIES_SCOPE, user_prompt,
+            lambda: retriever.agenerate_queries(user_prompt), bypass_cache, stage=metrics.QUERY_LLM
+        )
+
+    async def aretrieve(self, vectorstore: Any, user_prompt: str, generated_queries: List[str]) -> Tuple[List[str], List[Document]]:
+        """STEP 3b (async): Runs the MMR searches of every sub-query against the brand's vector store."""
+        with metrics.stage_span(metrics.RETRIEVE):
+            generated_queries, retrieved_docs = await self.executors.run(CPU, self._build_retriever().retrieve, vectorstore, user_prompt, generated_queries)
+
+        print(f"   -> Generated {len(generated_queries)} sub-queries, retrieved {len(retrieved_docs)} unique chunks.")
+        return generated_queries, retrieved_docs
+
+    def get_brand_vectorstore(self, brand_guide_text: str, image_captions: List[str]) -> Tuple[str, Any]:
+        """
+        STEP 3A: Gets (or builds) the brand's vector store, keyed by the content
+        hash of its assets so repeat requests skip chunking and embedding.
+        Returns `(cache_key, vectorstore)`.
+        """
+        def build_vectorstore(persist_dir: Path) -> Any:
+            built.append(persist_dir)
+            return self._build_vectorstore(self._split_brand_assets(brand_guide_text, image_captions), None, persist_dir)
+
+        cache_key = hash_brand_assets(brand_guide_text, image_captions)
+        built: List[Path] = []
+        with metrics.stage_span(metrics.BRAND_INDEX) as span:
+            # Indexes are backend-specific, so the backend is part of the index key.
+            vectorstore = self.brand_index_cache.get_or_build(
+                f"{settings.VECTOR_STORE_BACKEND}-{cache_key}", build_vectorstore, self._load_vectorstore
+            )
+            span.cache = metrics.MISS if built else metrics.HIT
+        print(f"   -> Brand index cache: {self.brand_index_cache.stats()}")
+        return cache_key, vectorstore
+
+    def get_registered_brand_vectorstore(self, brand_id: str) -> Tuple[str, Any]:
+        """
+        STEP 3A (registered brand): Returns `(content_hash, vectorstore)` of a
+        brand ingested through `ingest_brand`. Raises KeyError if it is unknown.
+        """
+        brand = self.brand_store.get(brand_id)
+        if brand is None:
+            raise KeyError(brand_id)
+        return brand.content_hash, self.brand_store.get_index(brand_id, self._build_vectorstore, self._load_vectorstore)
+
+    def _split_brand_assets(self, brand_guide_text: str, image_captions: List[str]) -> List[Document]:
+        """Splits a brand's assets into the documents to index (timed as the `split` stage)."""
+        with metrics.stage_span(metrics.SPLIT):
+            return _split_brand_documents(brand_guide_text, image_captions)
+
+    def _build_vectorstore(self, documents: List[Document], ids: Optional[List[str]], persist_dir: Path) -> Any:
+        """Embeds `documents` (stored under `ids`, if given) into a new VECTOR_STORE_BACKEND store persisted in `persist_dir`. Previously embedded chunks reuse their vectors."""
+        with metrics.stage_span(metrics.EMBED):
+            embeddings = CachedEmbeddings(self.embeddings, self.chunk_embedding_cache)
+            vectorstore = build_vector_store(settings.VECTOR_STORE_BACKEND, documents, embeddings, ids, persist_dir)
+        print(f"   -> Chunk embedding cache: {self.chunk_embedding_cache.stats()}")
+        return vectorstore
+
+    def _load_vectorstore(self, persist_dir: Path) -> Any:
+        """Re-opens a VECTOR_STORE_BACKEND store previously persisted in `persist_dir`."""
+        return load_vector_store(settings.VECTOR_STORE_BACKEND, self.embeddings, persist_dir)
+
+    def _build_retriever(self) -> ParallelMultiQueryRetriever:
+        """STEP 3B: Builds the multi-query retriever on top of the shared models."""
+        return ParallelMultiQueryRetriever(
+            llm=self.llm_retriever,
+            embeddings=self.embeddings,
+            executor=self.executors.executor(RETRIEVAL),
+            k=settings.RETRIEVAL_K,
+            fetch_k=settings.RETRIEVAL_FETCH_K
+        )
 
-    def generate_text_copy(self, intent: str, context_docs: List[Document], user_prompt: str) -> str:
-        """STEP 4: Generates the post copy using a LangChain Expression Language (LCEL) chain."""
+    async def _acached_llm_call(self, scope: Tuple, text: str, acompute_fn, bypass_cache: bool = False, stage: str = metrics.LLM_GENERATE) -> Any:
+        """Runs an LLM call through the semantic cache (if enabled), scoped by brand/intent/kind and timed as `stage`; cache lookups (which may embed) run on the CPU pool."""
+        with metrics.stage_span(stage) as span:
+            if self.semantic_cache is None:
+                return await acompute_fn()
+            if not bypass_cache:
+                value = await self.executors.run(CPU, self.semantic_cache.get, scope, text)
+                if value is not None:
+                    span.cache = metrics.HIT
+                    return value
+            span.cache = metrics.MISS
+            value = await acompute_fn()
+            await self.executors.run(CPU, self.semantic_cache.put, scope, text, value)
+            return value
+
+    async def astream_text_copy(self, intent: str, context_docs: List[Document], user_prompt: str) -> AsyncIterator[str]:
+        """STEP 4 (async streaming): Streams the post copy over the pooled async Ollama connection."""
+        print("4. Streaming text copy with main LLM...")
+        chain, inputs = self._build_text_copy_chain(intent, context_docs, user_prompt)
+        async for chunk in chain.astream(inputs):
+            yield chunk
+
+    async def agenerate_text_copy(self, intent: str, context_docs: List[Document], user_prompt: str) -> str:
+        """STEP 4 (async): Generates the whole post copy in one call, on the pooled async Ollama connection."""
         print("4. Generating text copy with main LLM...")
+        chain, inputs = self._build_text_copy_chain(intent, context_docs, user_prompt)
+        return await chain.ainvoke(inputs)
+
+    def _build_text_copy_chain(self, intent: str, context_docs: List[Document], user_prompt: str):
+        """Builds the LCEL chain and its inputs for the text copy step."""
         context_str = "\n- ".join([doc.page_content for doc in context_docs])
         
         prompt = _build_text_generation_prompt()
         chain = prompt | self.llm_generator | StrOutputParser()
         
-        return chain.invoke({
+        return chain, {
             "intent": intent,
             "context": context_str,
             "user_prompt": user_prompt
-        })
+        }
 
-    def generate_image(self, post_text: str) -> Image.Image:
-        """STEP 5: Generates an image using the diffusion model."""
+    async def agenerate_image_prompt(self, post_text: str) -> str:
+        """STEP 5A (async): Turns the post copy into a descriptive prompt for the diffusion model, on the pooled async Ollama connection."""
         print("5. Generating image with Diffusion Model...")
         
         prompt = _build_image_prompt_generation_prompt()
         chain = prompt | self.llm_retriever | StrOutputParser() # Use faster LLM for this task
-        image_prompt = chain.invoke({"post_text": post_text})
+        image_prompt = await chain.ainvoke({"post_text": post_text})
         
         print(f"   -> Generated Image Prompt: '{image_prompt}'")
-        return self.diffusion_pipeline(image_prompt).images[0]
+        return image_prompt
+
+    def render_image(self, image_prompt: str, performance_profile: Optional[str] = None) -> Image.Image:
+        """STEP 5B: Runs the diffusion model on an image prompt with a performance profile."""
+        return self._render_batch(performance_profile, [image_prompt])[0]
+
+    def _render_batch(self, performance_profile: Optional[str], image_prompts: List[str], num_images_per_prompt: int = 1) -> List[Image.Image]:
+        """Runs the diffusion model once over several prompts (`num_images_per_prompt` images each)."""
+        profile_name, profile = resolve_profile(performance_profile)
+        print(f"   -> Rendering a diffusion batch of {len(image_prompts)} prompt(s) x {num_images_per_prompt} image(s) with profile '{profile_name}'")
+        return self.diffusion_renderer.render(image_prompts, profile, num_images_per_prompt)
+
+    async def render_image_async(self, image_prompt: str, performance_profile: Optional[str] = None) -> Image.Image:
+        """STEP 5B (async): Renders through the batching scheduler when enabled, else on the GPU pool."""
+        if not settings.DIFFUSION_MICRO_BATCHING:
+            return await self.executors.run(GPU, self.render_image, image_prompt, performance_profile)
+
+        profile_name, _ = resolve_profile(performance_profile)
+        batcher = self._diffusion_batchers.get(profile_name)
+        if batcher is None:
+            batcher = self._diffusion_batchers[profile_name] = MicroBatcher(
+                batch_fn=functools.partial(self._render_batch, profile_name),
+                max_batch_size=settings.DIFFUSION_MAX_BATCH_SIZE,
+                max_wait_ms=settings.DIFFUSION_BATCH_WINDOW_MS,
+                executor=self.executors.executor(GPU),
+                max_in_flight=settings.GPU_EXECUTOR_WORKERS
+            )
+        return await batcher.submit(image_prompt)
+
+    async def deliver_image(self, image: Image.Image, image_delivery: str) -> List[Tuple[str, Any]]:
+        """
+        STEP 6: Encodes a generated image as IMAGE_FORMAT and returns the
+        `(event, data)` pairs that deliver it: the media type, then the
+        base64 string, the URL of the stored image, or the raw bytes.
+        """
+        image_data = await self.executors.run(CPU, encode_image, image, settings.IMAGE_FORMAT, settings.IMAGE_QUALITY)
+        if image_delivery == DELIVER_B64:
+            delivered = ("generated_image_b64", await self.executors.run(CPU, _to_base64, image_data))
+        elif image_delivery == DELIVER_URL:
+            image_id = await self.executors.run(CPU, self.image_store.put, image_data, settings.IMAGE_FORMAT)
+            delivered = ("generated_image_url", f"/api/v1/images/{image_id}")
+        else:
+            delivered = ("generated_image", image_data)
+        return [("generated_image_media_type", media_type(settings.IMAGE_FORMAT)), delivered]
+
+    # =======================================================================
+    #  BRAND INGESTION
+    # =======================================================================
+
+    async def ingest_brand(self, brand_guide_content: str, style_image_bytes: List[bytes], name: Optional[str] = None) -> Brand:
+        """
+        Captions, chunks and embeds a brand's assets once and registers them,
+        so later requests can reference the brand by id instead of re-uploading it.
+        """
+        print(f"--- Ingesting brand '{name or 'unnamed'}' ({len(style_image_bytes)} style images) ---")
+        image_captions = await self.generate_captions_from_bytes(style_image_bytes)
+        documents = await self.executors.run(CPU, self._split_brand_assets, brand_guide_content, image_captions)
+        brand = await self.executors.run(
+            CPU, self.brand_store.create,
+            name, hash_brand_assets(brand_guide_content, image_captions),
+            brand_guide_content, image_captions, documents, self._build_vectorstore
+        )
+        print(f"   -> Registered brand {brand.id} with {len(brand.chunks)} chunks.")
+        return brand
+
+    async def update_brand(self, brand_id: str, brand_guide_content: Optional[str] = None, style_image_bytes: Optional[List[bytes]] = None, name: Optional[str] = None) -> Tuple[Brand, Dict[str, int]]:
+        """
+        Replaces a registered brand's guide and/or style images and re-indexes
+        it incrementally: only new or edited chunks are embedded. Assets that
+        are not passed are kept. Returns `(brand, report)`; raises KeyError if
+        the brand is unknown.
+        """
+        brand = self.brand_store.get(brand_id)
+        if brand is None:
+            raise KeyError(brand_id)
+        print(f"--- Re-indexing brand {brand_id} ---")
+        if brand_guide_content is None:
+            brand_guide_content = brand.brand_guide_content
+        if style_image_bytes is None:
+            image_captions = brand.image_captions
+        else:
+            image_captions = await self.generate_captions_from_bytes(style_image_bytes)
+
+        documents = await self.executors.run(CPU, self._split_brand_assets, brand_guide_content, image_captions)
+        with metrics.stage_span(metrics.EMBED):
+            brand, report = await self.executors.run(
+                CPU, self.brand_store.update,
+                brand_id, hash_brand_assets(brand_guide_content, image_captions),
+                brand_guide_content, image_captions, documents, self._build_vectorstore, self._load_vectorstore, name
+            )
+        print(f"   -> Re-indexed brand {brand_id}: embedded {report['embedded']}, deleted {report['deleted']}, kept {report['unchanged']} chunks.")
+        return brand, report
 
     # =======================================================================
     #  MAIN ORCHESTRATOR
     # =======================================================================
 
-    async def create_post_pipeline(self, user_prompt: str, brand_guide_file: UploadFile, style_images: List[UploadFile]) -> ContentGenerationOutput:
-        """Orchestrates the full multimodal content generation pipeline."""
+    async def create_post_pipeline(self, user_prompt: str, brand_guide_file: Optional[UploadFile] = None, style_images: Optional[List[UploadFile]] = None, performance_profile: Optional[str] = None, bypass_cache: bool = False, brand_id: Optional[str] = None, image_delivery: str = DELIVER_B64) -> ContentGenerationOutput:
+        """Orchestrates the full multimodal content generation pipeline, for uploaded assets or a registered `brand_id`."""
+        brand_guide_content, style_image_bytes = "", []
+        if brand_id is None:
+            brand_guide_content = decode_text(await read_upload(brand_guide_file, settings.MAX_UPLOAD_FILE_BYTES), brand_guide_file.filename)
+            style_image_bytes = list(await asyncio.gather(*(read_upload(image_file, settings.MAX_UPLOAD_FILE_BYTES) for image_file in style_images)))
+
+        result = await self.collect_post_pipeline(user_prompt, brand_guide_content, style_image_bytes, performance_profile, bypass_cache, brand_id, image_delivery)
+        return ContentGenerationOutput(**{event: data for event, data in result.items() if event in ContentGenerationOutput.model_fields})
+
+    async def collect_post_pipeline(self, user_prompt: str, brand_guide_content: str, style_image_bytes: List[bytes], performance_profile: Optional[str] = None, bypass_cache: bool = False, brand_id: Optional[str] = None, image_delivery: str = DELIVER_B64) -> Dict[str, Any]:
+        """Runs the streaming pipeline to the end and returns the last value of every event (tokens excluded)."""
+        # The blocking pipeline is the streaming one, consumed to the end.
+        result = {}
+        async for event, data in self.stream_post_pipeline(user_prompt, brand_guide_content, style_image_bytes, performance_profile, bypass_cache, brand_id, image_delivery):
+            if event != "token":
+                result[event] = data
+        return result
+
+    async def stream_post_pipeline(self, user_prompt: str, brand_guide_content: str, style_image_bytes: List[bytes], performance_profile: Optional[str] = None, bypass_cache: bool = False, brand_id: Optional[str] = None, image_delivery: str = DELIVER_B64) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Runs the full multimodal pipeline, yielding `(event, data)` pairs as
+        each stage finishes. Events are named after the fields of
+        ContentGenerationOutput, plus `token` for each chunk of the post copy
+        streamed from the main LLM. `performance_profile` selects the
+        diffusion profile (DIFFUSION_PROFILE by default); `bypass_cache`
+        forces fresh LLM calls instead of semantic cache hits. With a
+        `brand_id`, the registered brand is used and the uploaded assets
+        are ignored (captioning and indexing are skipped entirely).
+
+        The image is encoded as IMAGE_FORMAT and, depending on
+        `image_delivery`, yielded as `generated_image_b64`, saved to the
+        image store and yielded as `generated_image_url`, or yielded as raw
+        bytes in a `generated_image` event. `generated_image_media_type`
+        always precedes it.
+        """
+        if image_delivery not in DELIVERY_MODES:
+            raise ValueError(f"Unknown image delivery '{image_delivery}'. Available: {list(DELIVERY_MODES)}.")
         print("\n--- Starting New MULTIMODAL Content Generation Pipeline ---")
-        
-        brand_guide_content = (await brand_guide_file.read()).decode("utf-8")
 
-        # Step 1: Classify intent
-        intent = self.classify_intent(user_prompt)
-
-        # Step 2: Generate captions from images
-        image_captions = await self.generate_captions_from_images(style_images)
-        
-        # Step 3: Setup RAG and retrieve context and queries
-        generated_queries, retrieved_docs = self.setup_and_retrieve_context(
-            brand_guide_text=brand_guide_content,
-            image_captions=image_captions,
-            query=user_prompt
+        # Every blocking stage is awaited through the execution layer and LLM
+        # calls use the pooled async Ollama client, so the event loop keeps
+        # serving other requests (and /health) meanwhile.
+
+        # Every stage is timed into the /metrics histograms (see metrics.py).
+
+        # The stages run as a dependency graph: intent, brand indexing and the
+        # retrieval sub-queries only need the request inputs, so they overlap;
+        # retrieval waits for the index and the sub-queries; the copy and the
+        # image follow in sequence. Events are still yielded in the same order.
+        graph = StageGraph(concurrent=settings.PIPELINE_CONCURRENT_STAGES)
+        graph.add(metrics.INTENT, lambda: self.aclassify_intents([user_prompt]))
+        if brand_id is not None:
+            # A registered brand is already indexed
+            graph.add(metrics.BRAND_INDEX, lambda: self.executors.run(CPU, self.get_registered_brand_vectorstore, brand_id))
+        else:
+            # Uploaded assets are captioned and indexed (both cached)
+            graph.add(metrics.CAPTION, lambda: self.generate_captions_from_bytes(style_image_bytes))
+            graph.add(
+                metrics.BRAND_INDEX,
+                lambda image_captions: self.executors.run(CPU, self.get_brand_vectorstore, brand_guide_content, image_captions),
+                metrics.CAPTION
+            )
+        graph.add(metrics.QUERY_LLM, lambda: self.agenerate_queries(user_prompt, bypass_cache))
+        graph.add(
+            metrics.RETRIEVE,
+            lambda brand_index, generated_queries: self.aretrieve(brand_index[1], user_prompt, generated_queries),
+            metrics.BRAND_INDEX, metrics.QUERY_LLM
         )
 
-        # Step 4: Generate post text copy
-        generated_text = self.generate_text_copy(intent, retrieved_docs, user_prompt)
-        
-        # Step 5: Generate image
-        generated_image_obj = self.generate_image(generated_text)
-        generated_image_b64 = _encode_image_to_base64(generated_image_obj)
+        try:
+            # Step 1: Classify intent
+            prediction = (await graph.result(metrics.INTENT))[0]
+            intent = prediction.intent
+            yield "classified_intent", intent
+            yield "intent_confidence", prediction.confidence
+
+            # Step 2-3: Resolve the brand's vector store and retrieve context
+            brand_key, _ = await graph.result(metrics.BRAND_INDEX)
+            generated_queries, retrieved_docs = await graph.result(metrics.RETRIEVE)
+            yield "generated_queries", generated_queries
+            yield "retrieved_context", [doc.page_content for doc in retrieved_docs]
+
+            # Step 4: Generate post text copy, token by token (or in one piece
+            # from the semantic cache, scoped by brand and intent)
+            copy_scope = (brand_key, intent, "copy")
+            generated_text = None
+            with graph.track(metrics.LLM_GENERATE, metrics.INTENT, metrics.RETRIEVE), metrics.stage_span(metrics.LLM_GENERATE) as span:
+                if self.semantic_cache is not None and not bypass_cache:
+                    generated_text = await self.executors.run(CPU, self.semantic_cache.get, copy_scope, user_prompt)
+                if generated_text is not None:
+                    span.cache = metrics.HIT
+                    yield "token", generated_text
+                else:
+                    span.cache = metrics.MISS if self.semantic_cache is not None else metrics.NONE
+                    text_chunks = []
+                    async for chunk in self.astream_text_copy(intent, retrieved_docs, user_prompt):
+                        text_chunks.append(chunk)
+                        yield "token", chunk
+                    generated_text = "".join(text_chunks)
+                    if self.semantic_cache is not None:
+                        await self.executors.run(CPU, self.semantic_cache.put, copy_scope, user_prompt, generated_text)
+            yield "generated_copy_text", generated_text
+
+            # Step 5: Generate image
+            with graph.track(metrics.IMAGE_PROMPT_LLM, metrics.LLM_GENERATE):
+                image_prompt = await self._acached_llm_call(
+                    (brand_key, intent, "image_prompt"), generated_text,
+                    lambda: self.agenerate_image_prompt(generated_text), bypass_cache, stage=metrics.IMAGE_PROMPT_LLM
+                )
+            with graph.track(metrics.DIFFUSION, metrics.IMAGE_PROMPT_LLM), metrics.stage_span(metrics.DIFFUSION):
+                generated_image_obj = await self.render_image_async(image_prompt, performance_profile)
+            with graph.track(metrics.ENCODE, metrics.DIFFUSION), metrics.stage_span(metrics.ENCODE):
+                image_events = await self.deliver_image(generated_image_obj, image_delivery)
+            for event, data in image_events:
+                yield event, data
+
+            # Report which chain of stages determined the latency of this request
+            critical_path = graph.critical_path()
+            metrics.record_critical_path([run.name for run in critical_path], critical_path[-1].finished)
+            print("   -> Critical path: " + " > ".join(f"{run.name} ({run.seconds * 1000:.0f} ms)" for run in critical_path))
+            yield "critical_path", graph.report()
+        finally:
+            await graph.aclose()
 
-        # Step 6: Assemble and return final output
         print("--- Pipeline Finished Successfully ---\n")
-        return ContentGenerationOutput(
-            generated_copy_text=generated_text,
-            generated_image_b64=generated_image_b64,
-            classified_intent=intent,
-            generated_queries=generated_queries,
-            retrieved_context=[doc.page_content for doc in retrieved_docs]
-        )
\ No newline at end of file
+
+    # =======================================================================
+    #  CAMPAIGNS
+    # =======================================================================
+
+    async def stream_campaign(self, user_prompts: List[str], brand_guide_content: str, style_image_bytes: List[bytes], variants: int = 1, performance_profile: Optional[str] = None, bypass_cache: bool = False, brand_id: Optional[str] = None, image_delivery: str = DELIVER_B64, ticket: Optional[AdmissionTicket] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Writes many posts for one brand, yielding a `post` event (a
+        CampaignPost) as each one completes, a `post_error` event for each
+        post that failed, and a final `summary` (a CampaignSummary).
+
+        `user_prompts` are distinct requests; with one prompt and `variants`
+        > 1, that many variants of it are written instead. Work shared by
+        the posts is done once: the brand context (captions and index, or
+        the registered brand), the intent of every prompt (one classifier
+        batch) and the sub-queries and retrieval of each distinct prompt.
+        The campaign runs at most CAMPAIGN_LLM_CONCURRENCY LLM calls and
+        CAMPAIGN_RETRIEVAL_CONCURRENCY retrievals at a time, so a large
+        campaign cannot take over the CPU pool. The copy of each variant is
+        always written fresh, never served by the semantic cache. Images of
+        distinct posts go through the diffusion batching scheduler; variants
+        share one image prompt and are rendered with `num_images_per_prompt`,
+        DIFFUSION_MAX_BATCH_SIZE images per call.
+
+        With an admission `ticket`, every post holds a text slot while its
+        copy is written and an image slot while its image is made, like a
+        single /generate request; a post whose image can no longer be ready
+        before the deadline is returned without it (`image_skipped`).
+        """
+        if image_delivery not in DELIVERY_MODES:
+            raise ValueError(f"Unknown image delivery '{image_delivery}'. Available: {list(DELIVERY_MODES)}.")
+        resolve_profile(performance_profile)
+        start = time.perf_counter()
+        posts = [(prompt, None) for prompt in user_prompts] if variants <= 1 else [(user_prompts[0], n) for n in range(1, variants + 1)]
+        distinct_prompts = list(dict.fromkeys(user_prompts))
+        print(f"\n--- Starting Campaign: {len(posts)} posts from {len(distinct_prompts)} prompt(s) ---")
+
+        # Step 1-2: Brand context and intents, once for the whole campaign
+        async def brand_context() -> Tuple[str, Any]:
+            if brand_id is not None:
+                return await self.executors.run(CPU, self.get_registered_brand_vectorstore, brand_id)
+            image_captions = await self.generate_captions_from_bytes(style_image_bytes)
+            return await self.executors.run(CPU, self.get_brand_vectorstore, brand_guide_content, image_captions)
+
+        # The shared setup is text-stage work, done under one slot.
+        async with ticket.text_slot() if ticket is not None else nullcontext():
+            (brand_key, vectorstore), predictions = await asyncio.gather(brand_context(), self.aclassify_intents(distinct_prompts))
+        intents = dict(zip(distinct_prompts, predictions))
+
+        llm_slots = asyncio.Semaphore(settings.CAMPAIGN_LLM_CONCURRENCY)
+        retrieval_slots = asyncio.Semaphore(settings.CAMPAIGN_RETRIEVAL_CONCURRENCY)
+        tasks: List[asyncio.Future] = []
+
+        # Step 3: Sub-queries and retrieval, once per distinct prompt
+        async def retrieve(prompt: str) -> Tuple[List[str], List[Document]]:
+            async with llm_slots:
+                generated_queries = await self.agenerate_queries(prompt, bypass_cache)
+            async with retrieval_slots:
+                return await self.aretrieve(vectorstore, prompt, generated_queries)
+
+        retrievals = {prompt: asyncio.ensure_future(retrieve(prompt)) for prompt in distinct_prompts}
+        tasks.extend(retrievals.values())
+
+        async def image_prompt_for(intent: str, copy_text: str) -> str:
+            async with llm_slots:
+                return await self._acached_llm_call(
+                    (brand_key, intent, "image_prompt"), copy_text,
+                    lambda: self.agenerate_image_prompt(copy_text), bypass_cache, stage=metrics.IMAGE_PROMPT_LLM
+                )
+
+        # Variants share one image prompt (written from the first copy to be
+        # ready) and are rendered together, several images per diffusion call.
+        batch_size = settings.DIFFUSION_MAX_BATCH_SIZE
+        variant_image_prompt: List[asyncio.Future] = []
+        variant_batches: Dict[int, asyncio.Future] = {}
+
+        async def render_variants(size: int) -> List[Image.Image]:
+            image_prompt = await variant_image_prompt[0]
+            with metrics.stage_span(metrics.DIFFUSION):
+                return await self.executors.run(GPU, self._render_batch, performance_profile, [image_prompt], size)
+
+        async def variant_image(variant: int, intent: str, copy_text: str) -> Image.Image:
+            if not variant_image_prompt:
+                variant_image_prompt.append(asyncio.ensure_future(image_prompt_for(intent, copy_text)))
+                tasks.append(variant_image_prompt[0])
+            batch = (variant - 1) // batch_size
+            if batch not in variant_batches:
+                variant_batches[batch] = asyncio.ensure_future(render_variants(min(batch_size, variants - batch * batch_size)))
+                tasks.append(variant_batches[batch])
+            return (await variant_batches[batch])[(variant - 1) % batch_size]
+
+        # Step 4-6: Copy, image and encoding of every post
+        async def write_post(index: int, prompt: str, variant: Optional[int]) -> Dict[str, Any]:
+            prediction = intents[prompt]
+            request = prompt if variant is None else f"{prompt}\n(Variant {variant} of {variants}: make it clearly different from the other variants.)"
+            async with ticket.text_slot() if ticket is not None else nullcontext():
+                generated_queries, retrieved_docs = await retrievals[prompt]
+                async with llm_slots:
+                    if variant is None:
+                        copy_text = await self._acached_llm_call(
+                            (brand_key, prediction.intent, "copy"), request,
+                            lambda: self.agenerate_text_copy(prediction.intent, retrieved_docs, request), bypass_cache, stage=metrics.LLM_GENERATE
+                        )
+                    else:
+                        # Variant requests differ only in their number, so the
+                        # semantic cache would hand one variant another's copy.
+                        with metrics.stage_span(metrics.LLM_GENERATE):
+                            copy_text = await self.agenerate_text_copy(prediction.intent, retrieved_docs, request)
+            async with ticket.image_slot() if ticket is not None else nullcontext(True) as granted:
+                if not granted:
+                    image_fields = {"image_skipped": True}
+                else:
+                    if variant is None:
+                        image_prompt = await image_prompt_for(prediction.intent, copy_text)
+                        with metrics.stage_span(metrics.DIFFUSION):
+                            image = await self.render_image_async(image_prompt, performance_profile)
+                    else:
+                        image = await variant_image(variant, prediction.intent, copy_text)
+                    with metrics.stage_span(metrics.ENCODE):
+                        image_fields = dict(await self.deliver_image(image, image_delivery))
+            output = ContentGenerationOutput(
+                generated_copy_text=copy_text,
+                classified_intent=prediction.intent,
+                intent_confidence=prediction.confidence,
+                generated_queries=generated_queries,
+                retrieved_context=[doc.page_content for doc in retrieved_docs],
+                **image_fields
+            )
+            return CampaignPost(index=index, user_prompt=prompt, variant=variant, post=output).model_dump(exclude_none=True)
+
+        async def run_post(index: int, prompt: str, variant: Optional[int]) -> Tuple[str, Any]:
+            try:
+                return "post", await write_post(index, prompt, variant)
+            except AdmissionRejected as e:
+                # Admitted with the campaign, but no slot freed up before the deadline.
+                return "post_error", {"index": index, "user_prompt": prompt, "variant": variant, "detail": e.detail}
+            except Exception as e:
+                # One failed post does not abort the rest of the campaign.
+                print(f"[ERROR] Campaign post {index} failed: {e}")
+                detail = "An internal error occurred while generating this post. Please check the server logs for more details."
+                return "post_error", {"index": index, "user_prompt": prompt, "variant": variant, "detail": detail}
+
+        post_tasks = [asyncio.ensure_future(run_post(index, prompt, variant)) for index, (prompt, variant) in enumerate(posts)]
+        tasks.extend(post_tasks)
+        completed = failed = 0
+        try:
+            for next_post in asyncio.as_completed(post_tasks):
+                event, data = await next_post
+                if event == "post":
+                    completed += 1
+                else:
+                    failed += 1
+                yield event, data
+        finally:
+            # Also reached when the client goes away: stop the remaining work.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        summary = CampaignSummary(posts=len(posts), completed=completed, failed=failed, seconds=round(time.perf_counter() - start, 3))
+        print(f"--- Campaign Finished: {completed} posts, {failed} failed, {summary.seconds:.1f}s ---\n")
+        yield "summary", summary.model_dump()
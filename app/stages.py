@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Stage graph executor for the Amplify AI project.
+
+Several pipeline stages do not depend on each other: classifying the intent,
+captioning and indexing the brand, and generating the retrieval sub-queries
+only need the request inputs. This module runs a pipeline as a small
+dependency graph instead of a fixed sequence: every stage starts as soon as
+the stages it takes inputs from have finished, and the graph reports the
+critical path (the chain of stages that determined the end-to-end latency).
+"""
+# =======================================================================
+#  19. STAGE GRAPH - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import asyncio
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+@dataclass
+class StageRun:
+    """Timing of one stage, in seconds since the graph was created."""
+    name: str
+    # Stages this one waited for (its inputs, plus its predecessor when sequential).
+    waits_for: Tuple[str, ...]
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.finished or 0.0) - (self.started or 0.0)
+
+
+# -----------------------------------------------------------------------
+#  STAGE GRAPH
+# -----------------------------------------------------------------------
+
+class StageGraph:
+    """
+    Runs the stages of one request as a dependency graph.
+
+    - `add(name, fn, *deps)` starts `fn(*results_of_deps)` as a task that
+      waits only for `deps`, so independent stages run concurrently.
+    - `track(name, *deps)` times a stage that runs inline in the caller
+      (e.g. one that streams its output), so it still counts for the
+      critical path.
+    - With `concurrent=False` every stage also waits for the one registered
+      before it, which reproduces the old strictly sequential pipeline.
+
+    Call `aclose()` when done: it cancels the stages nobody waited for.
+    """
+    def __init__(self, concurrent: bool = True):
+        self.concurrent = concurrent
+        self._origin = time.perf_counter()
+        self._runs: Dict[str, StageRun] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def add(self, name: str, fn: Callable[..., Awaitable[Any]], *deps: str) -> None:
+        """Starts stage `name`; `fn` receives the results of `deps` (stages started with `add`), in order."""
+        inline = [dep for dep in deps if dep in self._runs and dep not in self._tasks]
+        if inline:
+            raise ValueError(f"Stage '{name}' cannot take inputs from inline stages {inline}.")
+        run = self._register(name, deps)
+        self._tasks[name] = asyncio.create_task(self._run(run, fn, deps))
+
+    async def result(self, name: str) -> Any:
+        """Waits for a stage started with `add` and returns its result (or raises its error)."""
+        return await self._tasks[name]
+
+    @contextmanager
+    def track(self, name: str, *deps: str) -> Iterator[StageRun]:
+        """Times an inline stage that consumed the results of `deps`."""
+        run = self._register(name, deps)
+        run.started = self._now()
+        try:
+            yield run
+        finally:
+            run.finished = self._now()
+
+    def critical_path(self) -> List[StageRun]:
+        """
+        The chain of stages that ended last: starting from the last stage to
+        finish, repeatedly step to the dependency that finished last.
+        """
+        finished = [run for run in self._runs.values() if run.finished is not None]
+        if not finished:
+            return []
+        run = max(finished, key=lambda r: r.finished)
+        path = [run]
+        while True:
+            waited = [self._runs[dep] for dep in run.waits_for if self._runs[dep].finished is not None]
+            if not waited:
+                break
+            run = max(waited, key=lambda r: r.finished)
+            path.append(run)
+        return path[::-1]
+
+    def report(self) -> List[Dict[str, Any]]:
+        """The critical path as JSON-friendly dicts (times in ms since the request started)."""
+        return [
+            {"stage": run.name, "start_ms": round(run.started * 1000, 1), "duration_ms": round(run.seconds * 1000, 1)}
+            for run in self.critical_path()
+        ]
+
+    async def aclose(self) -> None:
+        """Cancels unfinished stages and collects their outcomes (so no error goes unretrieved)."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def _register(self, name: str, deps: Tuple[str, ...]) -> StageRun:
+        missing = [dep for dep in deps if dep not in self._runs]
+        if name in self._runs or missing:
+            raise ValueError(f"Cannot add stage '{name}': duplicate name or unknown dependencies {missing}.")
+        waits_for = tuple(deps)
+        if not self.concurrent and self._runs:
+            previous = next(reversed(self._runs))
+            if previous not in waits_for:
+                waits_for += (previous,)
+        run = StageRun(name=name, waits_for=waits_for)
+        self._runs[name] = run
+        return run
+
+    async def _run(self, run: StageRun, fn: Callable[..., Awaitable[Any]], deps: Tuple[str, ...]) -> Any:
+        # Only stages started with `add` have tasks; inline ones are always done by then.
+        for dep in run.waits_for:
+            if dep in self._tasks:
+                await self._tasks[dep]
+        args = [self._tasks[dep].result() for dep in deps]
+        run.started = self._now()
+        try:
+            return await fn(*args)
+        finally:
+            run.finished = self._now()
+
+    def _now(self) -> float:
+        return time.perf_counter() - self._origin
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Upload limits for the Amplify AI project.
+
+Brand guides and style images arrive as multipart uploads and used to be read
+whole, whatever their size, and then decoded at full resolution. This module
+bounds them: request bodies over MAX_REQUEST_BYTES are refused before they
+are parsed, each file is read in chunks up to MAX_UPLOAD_FILE_BYTES, and
+image headers are checked (format, pixel count) before anything is decoded.
+"""
+# =======================================================================
+#  18. UPLOAD LIMITS - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import io
+from typing import Any, Awaitable, Callable, Dict
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+from PIL import Image, UnidentifiedImageError
+
+
+# Size of the chunks uploads are read in.
+READ_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadRejected(ValueError):
+    """An upload that is too large (413) or not what it claims to be (422)."""
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+async def read_upload(upload: UploadFile, max_bytes: int) -> bytes:
+    """
+    Reads an uploaded file in chunks, refusing it as soon as it exceeds
+    `max_bytes` (or up front, when its size is already known).
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadRejected(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"File '{upload.filename}' exceeds the {max_bytes} byte limit.")
+    data = bytearray()
+    while chunk := await upload.read(READ_CHUNK_BYTES):
+        data += chunk
+        if len(data) > max_bytes:
+            raise UploadRejected(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"File '{upload.filename}' exceeds the {max_bytes} byte limit.")
+    return bytes(data)
+
+def decode_text(data: bytes, filename: str) -> str:
+    """Decodes an uploaded text file as UTF-8."""
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        raise UploadRejected(status.HTTP_422_UNPROCESSABLE_ENTITY, f"File '{filename}' is not valid UTF-8 text.")
+
+def check_image(data: bytes, filename: str, max_pixels: int) -> None:
+    """
+    Validates an uploaded image from its header alone (nothing is decoded):
+    it must be a format PIL can read, with at most `max_pixels` pixels.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+    except UnidentifiedImageError:
+        raise UploadRejected(status.HTTP_422_UNPROCESSABLE_ENTITY, f"File '{filename}' is not a supported image.")
+    except Image.DecompressionBombError:
+        raise UploadRejected(status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, f"Image '{filename}' has too many pixels.")
+    if width * height > max_pixels:
+        raise UploadRejected(
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"Image '{filename}' is {width}x{height}; at most {max_pixels} pixels are accepted."
+        )
+
+
+# -----------------------------------------------------------------------
+#  REQUEST SIZE MIDDLEWARE
+# -----------------------------------------------------------------------
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware that caps the size of every request body.
+
+    A declared Content-Length over the limit is answered with 413 before the
+    body is read at all. Bodies without one (chunked uploads) are counted as
+    they arrive and cut off with a 413 as soon as they cross the limit.
+    """
+    def __init__(self, app: Callable[..., Awaitable[None]], max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict[str, Any]]], send: Callable[[Dict[str, Any]], Awaitable[None]]) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds the {self.max_body_bytes} byte limit."
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Dict[str, Any]:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    # FastAPI lets HTTPExceptions raised while parsing the body through.
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
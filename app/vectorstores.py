@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Vector store backends for the Amplify AI project.
+
+A brand produces tens (at most a few hundred) chunks, so a full Chroma
+collection (with its SQLite storage and client) is mostly overhead for it.
+This module provides a compact in-process alternative, `NumpyVectorIndex`:
+one normalized float32 matrix, a vectorized cosine top-k and a vectorized MMR
+rerank. The backend is selected with `VECTOR_STORE_BACKEND`; Chroma remains
+available as an option.
+"""
+# =======================================================================
+#  15. VECTOR STORE BACKENDS - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+NUMPY = "numpy"
+CHROMA = "chroma"
+BACKENDS = (NUMPY, CHROMA)
+
+# File of a persisted NumpyVectorIndex: the matrix and the documents, saved together.
+INDEX_FILE = "index.npz"
+
+# Earlier layout (matrix and documents in separate files), still readable.
+LEGACY_VECTORS_FILE = "vectors.npy"
+LEGACY_DOCUMENTS_FILE = "documents.json"
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def _normalize(vectors: Any) -> np.ndarray:
+    """Returns `vectors` as a float32 matrix with unit-length rows (zero rows stay zero)."""
+    matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def mmr_select(query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """
+    Maximal marginal relevance over unit-length `candidates` for a unit-length `query`.
+
+    Each step scores all remaining candidates at once; the running maximum
+    similarity to the selected set is updated with a single matrix-vector
+    product per pick, so the cost is O(k * n) instead of O(k^2 * n).
+    """
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+    relevance = candidates @ query
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+    for _ in range(min(k, n)):
+        penalty = redundancy if selected else 0.0
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, candidates @ candidates[best])
+    return selected
+
+
+# -----------------------------------------------------------------------
+#  NUMPY VECTOR INDEX
+# -----------------------------------------------------------------------
+
+class NumpyVectorIndex(VectorStore):
+    """
+    In-process vector store backed by one normalized float32 matrix.
+
+    Searches read an immutable snapshot (ids, documents, matrix), so they
+    never lock; writes build a new snapshot under a lock and swap it in. When
+    `persist_directory` is set, every write is saved there as one `.npz` file
+    holding the matrix and a JSON list of documents.
+    """
+    def __init__(self, embedding: Embeddings, persist_directory: Optional[str] = None):
+        self.embedding = embedding
+        self.persist_directory = Path(persist_directory) if persist_directory else None
+        self._lock = threading.Lock()
+        self._snapshot: Tuple[List[str], List[Document], np.ndarray] = ([], [], np.zeros((0, 0), dtype=np.float32))
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self) -> int:
+        return len(self._snapshot[0])
+
+    # --- Writes ---
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embeds and adds `texts`; an existing id is replaced."""
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        vectors = _normalize(self.embedding.embed_documents(texts)) if texts else None
+
+        with self._lock:
+            old_ids, old_docs, old_matrix = self._snapshot
+            replaced = set(ids)
+            keep = [i for i, id_ in enumerate(old_ids) if id_ not in replaced]
+            new_docs = [Document(page_content=text, metadata=metadata, id=id_) for text, metadata, id_ in zip(texts, metadatas, ids)]
+            matrix = old_matrix[keep] if len(old_ids) else np.zeros((0, vectors.shape[1] if vectors is not None else 0), dtype=np.float32)
+            if vectors is not None:
+                matrix = np.vstack([matrix, vectors]) if len(matrix) else vectors
+            self._snapshot = ([old_ids[i] for i in keep] + ids, [old_docs[i] for i in keep] + new_docs, matrix)
+            self._persist()
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Removes the given ids (unknown ids are ignored)."""
+        if not ids:
+            return False
+        with self._lock:
+            old_ids, old_docs, old_matrix = self._snapshot
+            removed = set(ids)
+            keep = [i for i, id_ in enumerate(old_ids) if id_ not in removed]
+            self._snapshot = ([old_ids[i] for i in keep], [old_docs[i] for i in keep], old_matrix[keep])
+            self._persist()
+        return True
+
+    # --- Searches ---
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """Cosine top-k: one matrix-vector product plus a partial sort."""
+        _, docs, matrix = self._snapshot
+        if not docs:
+            return []
+        scores = matrix @ _normalize(embedding)[0]
+        top = self._top_k(scores, k)
+        return [(docs[i], float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        """Cosine top-`fetch_k` candidates, reranked with vectorized MMR down to `k`."""
+        _, docs, matrix = self._snapshot
+        if not docs:
+            return []
+        query = _normalize(embedding)[0]
+        candidates = self._top_k(matrix @ query, fetch_k)
+        picks = mmr_select(query, matrix[candidates], k, lambda_mult)
+        return [docs[candidates[i]] for i in picks]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(self.embedding.embed_query(query), k, fetch_k, lambda_mult)
+
+    # --- Construction & persistence ---
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, ids: Optional[List[str]] = None, persist_directory: Optional[str] = None, **kwargs: Any) -> "NumpyVectorIndex":
+        index = cls(embedding, persist_directory=persist_directory)
+        index.add_texts(texts, metadatas, ids)
+        return index
+
+    @classmethod
+    def load(cls, persist_directory: str, embedding: Embeddings) -> "NumpyVectorIndex":
+        """Re-opens an index previously persisted in `persist_directory`."""
+        index = cls(embedding, persist_directory=persist_directory)
+        if (index.persist_directory / INDEX_FILE).exists() or not (index.persist_directory / LEGACY_VECTORS_FILE).exists():
+            with np.load(index.persist_directory / INDEX_FILE) as saved:
+                matrix = saved["vectors"]
+                records = json.loads(saved["documents"].tobytes().decode("utf-8"))
+        else:
+            matrix = np.load(index.persist_directory / LEGACY_VECTORS_FILE)
+            records = json.loads((index.persist_directory / LEGACY_DOCUMENTS_FILE).read_text(encoding="utf-8"))
+        docs = [Document(page_content=r["page_content"], metadata=r["metadata"], id=r["id"]) for r in records]
+        index._snapshot = ([doc.id for doc in docs], docs, matrix)
+        return index
+
+    def _persist(self) -> None:
+        """
+        Saves the current snapshot. The matrix and the documents go into one
+        file, published with a single rename: a crash leaves either the old
+        snapshot or the new one, never rows and documents out of step.
+        """
+        if self.persist_directory is None:
+            return
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        ids, docs, matrix = self._snapshot
+        records = [{"id": id_, "page_content": doc.page_content, "metadata": doc.metadata} for id_, doc in zip(ids, docs)]
+        documents = np.frombuffer(json.dumps(records, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+        tmp_path = self.persist_directory / f"{INDEX_FILE}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=matrix, documents=documents)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.persist_directory / INDEX_FILE)
+        for legacy in (LEGACY_VECTORS_FILE, LEGACY_DOCUMENTS_FILE):
+            (self.persist_directory / legacy).unlink(missing_ok=True)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the `k` highest scores, best first."""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=int)
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+
+# =======================================================================
+#  BACKEND SELECTION
+# =======================================================================
+
+def build_vector_store(backend: str, documents: List[Document], embedding: Embeddings, ids: Optional[List[str]], persist_dir: Path) -> VectorStore:
+    """Embeds `documents` into a new `backend` store persisted in `persist_dir`."""
+    if backend == NUMPY:
+        return NumpyVectorIndex.from_documents(documents, embedding, ids=ids, persist_directory=str(persist_dir))
+    if backend == CHROMA:
+        from langchain_community.vectorstores import Chroma
+        return Chroma.from_documents(documents=documents, embedding=embedding, ids=ids, persist_directory=str(persist_dir))
+    raise ValueError(f"Unknown vector store backend '{backend}'. Available: {list(BACKENDS)}.")
+
+def load_vector_store(backend: str, embedding: Embeddings, persist_dir: Path) -> VectorStore:
+    """Re-opens a `backend` store previously persisted in `persist_dir`."""
+    if backend == NUMPY:
+        return NumpyVectorIndex.load(str(persist_dir), embedding)
+    if backend == CHROMA:
+        from langchain_community.vectorstores import Chroma
+        return Chroma(persist_directory=str(persist_dir), embedding_function=embedding)
+    raise ValueError(f"Unknown vector store backend '{backend}'. Available: {list(BACKENDS)}.")
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Load and performance benchmarks for the Amplify AI service."""
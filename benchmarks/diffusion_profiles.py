@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: seconds per image and peak memory for each diffusion profile.
+
+Every profile runs in a fresh child process (so peak RSS is not polluted by
+the previous profile), loads the configured Stable Diffusion model with the
+profile's load-time options, renders one warm-up image and then `--images`
+timed images on the local device (CPU unless CUDA is available).
+
+Usage:
+    python -m benchmarks.diffusion_profiles --images 3
+    python -m benchmarks.diffusion_profiles --profiles draft standard --json results/diffusion.json
+"""
+# =======================================================================
+#  BENCHMARK: DIFFUSION PROFILES - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+PROMPT = "a photorealistic pumpkin spice latte on a rustic wooden table, autumn leaves, warm morning light"
+
+
+# =======================================================================
+#  CHILD PROCESS: ONE PROFILE
+# =======================================================================
+
+def run_profile(profile_name: str, images: int) -> Dict[str, Any]:
+    """Loads the pipeline with `profile_name` and times `images` renders."""
+    from app.config import settings
+    from app.diffusion import DiffusionRenderer, resolve_profile
+    from app.registry import DIFFUSION, build_model_registry
+
+    # The load-time options come from the default profile, so point it at
+    # the profile under test before the model is loaded.
+    settings.DIFFUSION_PROFILE = profile_name
+    _, profile = resolve_profile(profile_name)
+
+    registry = build_model_registry()
+    load_start = time.perf_counter()
+    renderer = DiffusionRenderer(registry.get(DIFFUSION))
+    load_seconds = time.perf_counter() - load_start
+
+    renderer.render([PROMPT], profile)  # warm-up (allocations, kernel selection)
+    timings = []
+    for _ in range(images):
+        start = time.perf_counter()
+        renderer.render([PROMPT], profile)
+        timings.append(time.perf_counter() - start)
+
+    result = {
+        "profile": profile_name,
+        "settings": profile.model_dump(),
+        "load_seconds": round(load_seconds, 2),
+        "seconds_per_image": round(sum(timings) / len(timings), 3),
+        "min_seconds": round(min(timings), 3),
+        # ru_maxrss is reported in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    try:
+        import torch
+        if torch.cuda.is_available():
+            result["peak_cuda_mb"] = round(torch.cuda.max_memory_allocated() / 2**20, 1)
+    except ImportError:
+        pass
+    return result
+
+
+# =======================================================================
+#  PARENT PROCESS: ALL PROFILES
+# =======================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="*", help="Profiles to run (default: all configured profiles).")
+    parser.add_argument("--images", type=int, default=3, help="Timed images per profile.")
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.child, args.images)))
+        return
+
+    from app.config import settings
+    results = []
+    for name in args.profiles or list(settings.DIFFUSION_PROFILES):
+        print(f"-> Benchmarking profile '{name}'...", file=sys.stderr)
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.diffusion_profiles", "--child", name, "--images", str(args.images)],
+            capture_output=True, text=True, check=True,
+        )
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"{'profile':<10} {'steps':>5} {'size':>9} {'scheduler':<11} {'s/image':>8} {'peak RSS MB':>12}")
+    for r in results:
+        s = r["settings"]
+        print(f"{r['profile']:<10} {s['num_inference_steps']:>5} {s['width']:>4}x{s['height']:<4} {s['scheduler']:<11} "
+              f"{r['seconds_per_image']:>8} {r['peak_rss_mb']:>12}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: /health latency while /generate is saturated.
+
+Fires `--clients` concurrent, back-to-back `/api/v1/generate` calls against a
+running server (using one of the bundled example brands) and, at the same
+time, probes `/api/v1/health` at a fixed interval. It reports /health latency
+percentiles for an idle baseline and under load. With the execution layer in
+place, the loaded p99 should stay close to the idle one.
+
+Usage:
+    uvicorn app.main:app --port 8000
+    python -m benchmarks.health_under_load --url http://localhost:8000 --clients 4 --duration 60
+"""
+# =======================================================================
+#  BENCHMARK: HEALTH LATENCY UNDER LOAD - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+
+
+# =======================================================================
+#  HELPERS
+# =======================================================================
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    """Returns p50/p95/p99/max (in milliseconds) of latency samples in seconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered) * 1000, 2),
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+def _load_brand_files(brand: str):
+    """Reads the brand guide and style images of an example brand into memory."""
+    brand_dir = EXAMPLES_DIR / brand
+    guide = (brand_dir / "brand_guide.md").read_bytes()
+    images = [(path.name, path.read_bytes()) for path in sorted(brand_dir.glob("image_style_*"))]
+    return guide, images
+
+
+# =======================================================================
+#  LOAD GENERATORS
+# =======================================================================
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, interval: float) -> List[float]:
+    """Calls /health every `interval` seconds until `stop` is set."""
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/v1/health")
+        response.raise_for_status()
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    return samples
+
+async def saturate_generate(client: httpx.AsyncClient, stop: asyncio.Event, brand: str, prompt: str) -> List[float]:
+    """Sends back-to-back /generate calls until `stop` is set."""
+    guide, images = _load_brand_files(brand)
+    samples = []
+    while not stop.is_set():
+        files = [("brand_guide_file", ("brand_guide.md", guide, "text/markdown"))]
+        files += [("style_images", (name, data, "application/octet-stream")) for name, data in images]
+        start = time.perf_counter()
+        response = await client.post("/api/v1/generate", data={"user_prompt": prompt}, files=files)
+        samples.append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            print(f"[WARN] /generate returned {response.status_code}")
+    return samples
+
+async def run(url: str, clients: int, duration: float, interval: float, brand: str, prompt: str) -> None:
+    """Runs the idle baseline, then the loaded phase, and prints a report."""
+    headers = {"X-API-KEY": os.environ.get("API_SECRET_KEY", "")}
+    timeout = httpx.Timeout(None)
+    async with httpx.AsyncClient(base_url=url, headers=headers, timeout=timeout) as client:
+        # Phase 1: idle baseline
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop, interval))
+        await asyncio.sleep(min(10.0, duration))
+        stop.set()
+        idle = await probe
+
+        # Phase 2: /generate saturated by `clients` concurrent callers
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop, interval))
+        load = [asyncio.create_task(saturate_generate(client, stop, brand, prompt)) for _ in range(clients)]
+        await asyncio.sleep(duration)
+        stop.set()
+        loaded = await probe
+        generate_samples = [sample for samples in await asyncio.gather(*load) for sample in samples]
+
+    print("/health idle:     ", _percentiles(idle))
+    print("/health loaded:   ", _percentiles(loaded))
+    print("/generate loaded: ", _percentiles(generate_samples))
+
+
+# =======================================================================
+#  ENTRY POINT
+# =======================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=4, help="Concurrent /generate callers.")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of loaded measurement.")
+    parser.add_argument("--interval", type=float, default=0.05, help="Seconds between /health probes.")
+    parser.add_argument("--brand", default="cafe_brand", help="Example brand folder under examples/.")
+    parser.add_argument("--prompt", default="Anuncia nuestro nuevo latte de calabaza para el otoño.")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.clients, args.duration, args.interval, args.brand, args.prompt))
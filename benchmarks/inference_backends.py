@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: latency, memory and accuracy of the CPU inference backends.
+
+Runs every backend of the embeddings, the captioner and the intent
+classifier (see app/inference.py), optionally with several thread counts, on
+the same inputs: the paragraphs of the example brand guides plus the
+benchmark prompts (texts) and the example style images. Every run happens in
+a fresh child process, so load time and peak RSS belong to that backend alone.
+
+The first backend of each model (fp32 / scikit-learn) is the reference, and
+every other run is checked against its outputs:
+
+- embeddings: cosine similarity to the fp32 vector of the same text (minimum
+  over all texts);
+- captioner: word-level similarity (difflib) to the fp32 caption (mean);
+- classifier: agreement of the predicted labels with scikit-learn.
+
+The process exits with status 1 if any backend is outside its tolerance (or
+fails to load), so it can run as a check before switching a deployment to a
+cheaper backend.
+
+Usage:
+    python -m benchmarks.inference_backends
+    python -m benchmarks.inference_backends --models embeddings --threads 0 1 4 --json results/inference.json
+"""
+# =======================================================================
+#  BENCHMARK: INFERENCE BACKENDS - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import difflib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.pipeline import EXAMPLES_DIR, PROMPTS, load_brand
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+# Model -> (setting that selects its backend, backends; the first is the reference).
+MODELS = {
+    "embeddings": ("EMBEDDINGS_BACKEND", ["huggingface", "huggingface-int8", "onnx"]),
+    "captioner": ("CAPTIONER_BACKEND", ["blip", "blip-int8"]),
+    "classifier": ("CLASSIFIER_BACKEND", ["sklearn", "onnx"]),
+}
+
+# Default minimum accuracy (see `compare`) of every non-reference backend.
+TOLERANCES = {"embeddings": 0.98, "captioner": 0.7, "classifier": 0.99}
+
+
+# =======================================================================
+#  INPUTS
+# =======================================================================
+
+def load_texts() -> List[str]:
+    """Paragraphs of the example brand guides plus the benchmark prompts."""
+    texts = []
+    for brand_dir in sorted(path for path in EXAMPLES_DIR.iterdir() if path.is_dir()):
+        guide = load_brand(brand_dir.name)["guide"]
+        texts += [paragraph.strip() for paragraph in guide.split("\n\n") if paragraph.strip()]
+    return texts + PROMPTS
+
+def load_images() -> List[Any]:
+    """The example style images, decoded at the size the service captions them at."""
+    from app.config import settings
+    from app.services import _decode_image
+    images = []
+    for brand_dir in sorted(path for path in EXAMPLES_DIR.iterdir() if path.is_dir()):
+        images += [_decode_image(data, settings.CAPTION_IMAGE_SIZE) for _, data in load_brand(brand_dir.name)["images"]]
+    return images
+
+
+# =======================================================================
+#  CHILD PROCESS: ONE BACKEND
+# =======================================================================
+
+def run_backend(model_name: str, repeats: int, work_dir: str) -> Dict[str, Any]:
+    """Loads the backend selected in the environment and times `repeats` passes over the inputs."""
+    from app.config import settings
+    from app.registry import CAPTIONER, CLASSIFIER, EMBEDDINGS, build_model_registry
+
+    if model_name == "classifier" and settings.CLASSIFIER_BACKEND == "onnx" and not os.path.exists(settings.CLASSIFIER_ONNX_PATH):
+        from app.inference import export_classifier_onnx
+        settings.CLASSIFIER_ONNX_PATH = os.path.join(work_dir, "intent_classifier.onnx")
+        export_classifier_onnx(settings.CLASSIFIER_MODEL_PATH, settings.CLASSIFIER_ONNX_PATH)
+
+    registry = build_model_registry()
+    load_start = time.perf_counter()
+    model = registry.get({"embeddings": EMBEDDINGS, "captioner": CAPTIONER, "classifier": CLASSIFIER}[model_name])
+    load_seconds = time.perf_counter() - load_start
+
+    if model_name == "embeddings":
+        inputs = load_texts()
+        run = lambda: model.embed_documents(inputs)
+    elif model_name == "captioner":
+        inputs = load_images()
+        run = lambda: [result[0]["generated_text"] for result in model(inputs, batch_size=settings.CAPTION_BATCH_SIZE)]
+    else:
+        inputs = load_texts()
+        run = lambda: list(model.predict(inputs))
+
+    outputs = run()  # warm-up (allocations, kernel selection, lazy exports)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = run()
+        timings.append(time.perf_counter() - start)
+
+    return {
+        "load_seconds": round(load_seconds, 2),
+        "ms_per_item": round(min(timings) / len(inputs) * 1000, 2),
+        "items": len(inputs),
+        # ru_maxrss is reported in KiB on Linux.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "outputs": [list(map(float, output)) for output in outputs] if model_name == "embeddings" else [str(output) for output in outputs],
+    }
+
+
+# =======================================================================
+#  PARENT PROCESS: ALL BACKENDS
+# =======================================================================
+
+def run_child(model_name: str, backend: str, repeats: int, work_dir: str, threads: Optional[int] = None) -> Dict[str, Any]:
+    """Runs `run_backend` for one backend in a fresh process. Raises RuntimeError (with its last error line) if it fails."""
+    setting, _ = MODELS[model_name]
+    env = {**os.environ, setting: backend, "TOKENIZERS_PARALLELISM": "false"}
+    env.pop("INFERENCE_THREADS", None)
+    if threads:
+        env["INFERENCE_THREADS"] = str(threads)
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.inference_backends", "--child", model_name,
+         "--repeats", str(repeats), "--work-dir", work_dir],
+        capture_output=True, text=True, env=env, cwd=REPO_DIR,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare(model_name: str, reference: List[Any], outputs: List[Any]) -> float:
+    """The accuracy metric of a run against the reference outputs (1.0 = identical)."""
+    if model_name == "embeddings":
+        ref, out = np.array(reference, dtype=float), np.array(outputs, dtype=float)
+        ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+        out /= np.linalg.norm(out, axis=1, keepdims=True)
+        return float((ref * out).sum(axis=1).min())
+    if model_name == "captioner":
+        ratios = [difflib.SequenceMatcher(None, a.split(), b.split()).ratio() for a, b in zip(reference, outputs)]
+        return float(sum(ratios) / len(ratios))
+    return float(sum(a == b for a, b in zip(reference, outputs)) / len(reference))
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="*", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--threads", type=int, nargs="*", default=[0], help="INFERENCE_THREADS values to run (0: library default).")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed passes over the inputs (the fastest is reported).")
+    parser.add_argument("--embedding-tolerance", type=float, default=TOLERANCES["embeddings"], help="Minimum cosine similarity to fp32.")
+    parser.add_argument("--caption-tolerance", type=float, default=TOLERANCES["captioner"], help="Minimum mean word similarity to fp32 captions.")
+    parser.add_argument("--classifier-tolerance", type=float, default=TOLERANCES["classifier"], help="Minimum label agreement with scikit-learn.")
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.repeats, args.work_dir)))
+        return
+
+    tolerances = {"embeddings": args.embedding_tolerance, "captioner": args.caption_tolerance, "classifier": args.classifier_tolerance}
+    results, failed = [], False
+    with tempfile.TemporaryDirectory() as work_dir:
+        for model_name in args.models:
+            _, backends = MODELS[model_name]
+            reference = None
+            for backend in backends:
+                for threads in args.threads:
+                    print(f"-> {model_name:<10} {backend:<17} threads={threads or 'default'}", file=sys.stderr)
+                    row = {"model": model_name, "backend": backend, "threads": threads or None}
+                    try:
+                        run = run_child(model_name, backend, args.repeats, work_dir, threads)
+                    except RuntimeError as e:
+                        row["error"] = str(e)
+                        failed = True
+                        results.append(row)
+                        continue
+                    outputs = run.pop("outputs")
+                    if reference is None:
+                        reference = outputs
+                    row.update(run)
+                    row["accuracy"] = round(compare(model_name, reference, outputs), 4)
+                    row["within_tolerance"] = row["accuracy"] >= tolerances[model_name]
+                    failed = failed or not row["within_tolerance"]
+                    results.append(row)
+
+    print(f"\n{'model':<11} {'backend':<17} {'threads':>7} {'load s':>7} {'ms/item':>8} {'peak RSS MB':>12} {'accuracy':>9}  ok")
+    for row in results:
+        if "error" in row:
+            print(f"{row['model']:<11} {row['backend']:<17} {row['threads'] or 'default':>7}  ERROR: {row['error']}")
+            continue
+        print(f"{row['model']:<11} {row['backend']:<17} {row['threads'] or 'default':>7} {row['load_seconds']:>7} "
+              f"{row['ms_per_item']:>8} {row['peak_rss_mb']:>12} {row['accuracy']:>9}  {'yes' if row['within_tolerance'] else 'NO'}")
+    print("\naccuracy: min cosine to fp32 (embeddings), mean word similarity to fp32 (captioner), label agreement (classifier)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"tolerances": tolerances, "results": results}, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
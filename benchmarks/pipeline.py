@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: offline, reproducible latency of the full generation pipeline.
+
+Runs `create_post_pipeline` (in-process) and the `/api/v1/generate` endpoint
+(through the ASGI app, with its middleware) against the bundled example
+brands, at several levels of concurrency. Every heavy backend is swapped for
+an offline stand-in so the run needs no GPU, no weights and no network:
+
+- classifier, captioner, embeddings and diffusion use the fake backends of
+  `app/fakes.py` (with configurable artificial delays);
+- Ollama is the local stub server of `benchmarks/stub_ollama.py`, so the
+  real pooled client is exercised over HTTP.
+
+Reports end-to-end latency percentiles, throughput, per-stage percentiles
+(from the pipeline's timing spans, labelled by cache outcome) and peak RSS,
+and can save everything as JSON to compare across commits. Example assets
+that are empty or cannot be decoded are replaced by deterministic synthetic
+ones; the results say which.
+
+Usage:
+    python -m benchmarks.pipeline
+    python -m benchmarks.pipeline --concurrency 1 4 8 --requests 32 --json results/pipeline.json
+"""
+# =======================================================================
+#  BENCHMARK: GENERATION PIPELINE - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import re
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from PIL import Image
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+PROMPTS = [
+    "Anuncia nuestro nuevo producto de temporada",
+    "Invita a la comunidad a nuestro evento del sábado",
+    "Comparte un consejo útil para nuestros clientes",
+    "Lanza una promoción de 2x1 solo por esta semana",
+]
+# Sent by the HTTP clients and mapped to the "high" priority class, so
+# admission control queues the benchmark's requests instead of refusing them
+# as anonymous (low priority) traffic.
+BENCHMARK_API_KEY = "amplify-benchmark"
+SYNTHETIC_GUIDE = """# Identidad de Marca
+Marca cercana, cálida y optimista.
+## Tono de Voz
+Frases cortas, tuteo y emojis moderados.
+## Colores
+Naranja calabaza, crema y marrón café.
+## Público
+Jóvenes profesionales que valoran los pequeños placeres.
+"""
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in [0, 100]) of an unsorted list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean of a list of durations in seconds, reported in ms."""
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "mean_ms": round(sum(values) / len(values) * 1000, 2) if values else 0.0,
+    }
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_server_timing(header: str) -> List[Tuple[str, str, float]]:
+    """Parses a Server-Timing header into `(stage, cache, seconds)` triples."""
+    spans = []
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, *params = entry.split(";")
+        fields = dict(param.split("=", 1) for param in params)
+        if name == "critical-path":
+            continue
+        stage = re.sub(r"-\d+$", "", name)  # repeated stages are suffixed with their index
+        spans.append((stage, fields.get("desc", '"none"').strip('"'), float(fields["dur"]) / 1000))
+    return spans
+
+
+# =======================================================================
+#  BRAND ASSETS
+# =======================================================================
+
+def _synthetic_image(seed: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 480), ((seed * 70) % 256, (seed * 40 + 90) % 256, (seed * 25 + 30) % 256)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def load_brand(name: str) -> Dict[str, Any]:
+    """Loads an example brand, replacing empty or undecodable assets with synthetic ones."""
+    brand_dir = EXAMPLES_DIR / name
+    guide = (brand_dir / "brand_guide.md").read_text(encoding="utf-8") if (brand_dir / "brand_guide.md").exists() else ""
+    synthetic = []
+    if not guide.strip():
+        guide, synthetic = SYNTHETIC_GUIDE, ["brand_guide.md"]
+
+    images = []
+    for i, path in enumerate(sorted(brand_dir.glob("image_style_*"))):
+        data = path.read_bytes()
+        try:
+            Image.open(io.BytesIO(data)).verify()
+        except Exception:
+            data = _synthetic_image(i + len(name))
+            synthetic.append(path.name)
+        images.append((path.name, data))
+    if not images:
+        images, synthetic = [(f"synthetic_{i}.jpg", _synthetic_image(i)) for i in range(3)], synthetic + ["style images"]
+    return {"name": name, "guide": guide, "images": images, "synthetic_assets": synthetic}
+
+
+# =======================================================================
+#  RUNNERS
+# =======================================================================
+
+# Global request sequence, so prompts never repeat across phases.
+_request_ids = itertools.count()
+
+class Recorder:
+    """Accumulates end-to-end and per-stage durations of one benchmark phase."""
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = defaultdict(list)
+        self.errors = 0
+
+    def add(self, seconds: float, spans: List[Tuple[str, str, float]]) -> None:
+        self.latencies.append(seconds)
+        for stage, cache, stage_seconds in spans:
+            key = stage if cache == "none" else f"{stage}[{cache}]"
+            self.stages[key].append(stage_seconds)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "requests": len(self.latencies),
+            "errors": self.errors,
+            "throughput_rps": round(len(self.latencies) / elapsed, 3) if elapsed else 0.0,
+            "end_to_end": summarize(self.latencies),
+            "stages": {stage: summarize(values) for stage, values in sorted(self.stages.items())},
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+async def run_service_request(service: Any, brand: Dict[str, Any], prompt: str) -> Tuple[float, List[Tuple[str, str, float]]]:
+    """One in-process `create_post_pipeline` call, with its spans."""
+    from starlette.datastructures import UploadFile
+    from app.metrics import track_request
+
+    guide_file = UploadFile(file=io.BytesIO(brand["guide"].encode("utf-8")), filename="brand_guide.md")
+    image_files = [UploadFile(file=io.BytesIO(data), filename=filename) for filename, data in brand["images"]]
+    start = time.perf_counter()
+    with track_request() as timings:
+        await service.create_post_pipeline(prompt, guide_file, image_files)
+    return time.perf_counter() - start, [(span.stage, span.cache, span.seconds) for span in timings.spans]
+
+
+async def run_http_request(client: httpx.AsyncClient, brand: Dict[str, Any], prompt: str) -> Tuple[float, List[Tuple[str, str, float]]]:
+    """One POST /api/v1/generate, with the spans from its Server-Timing header."""
+    files = [("brand_guide_file", ("brand_guide.md", brand["guide"].encode("utf-8"), "text/markdown"))]
+    files += [("style_images", (filename, data, "image/jpeg")) for filename, data in brand["images"]]
+    start = time.perf_counter()
+    response = await client.post("/api/v1/generate", data={"user_prompt": prompt}, files=files)
+    seconds = time.perf_counter() - start
+    response.raise_for_status()
+    return seconds, parse_server_timing(response.headers.get("server-timing", ""))
+
+
+async def run_phase(request_fn, brands: List[Dict[str, Any]], concurrency: int, total_requests: int) -> Dict[str, Any]:
+    """Runs `total_requests` requests from `concurrency` clients, round-robin over brands and prompts."""
+    recorder = Recorder()
+    counter = iter(range(total_requests))
+
+    async def client() -> None:
+        for i in counter:
+            # Unique prompts: LLM stages miss the semantic cache, while captions
+            # and brand indexes (same assets every time) are served from cache.
+            prompt = f"{PROMPTS[i % len(PROMPTS)]} (#{next(_request_ids)})"
+            try:
+                recorder.add(*await request_fn(brands[i % len(brands)], prompt))
+            except Exception as e:
+                recorder.errors += 1
+                print(f"[WARN] Request {i} failed: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return {"concurrency": concurrency, **recorder.report(time.perf_counter() - start)}
+
+
+async def run_benchmark(args: argparse.Namespace, brands: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Starts the app (lifespan included) and runs every mode and concurrency level."""
+    from app.config import settings
+    from app.main import app
+
+    results: Dict[str, Any] = {"cold": {}, "service": [], "http": []}
+    async with app.router.lifespan_context(app):
+        service = app.state.content_generation_service
+
+        # First request per brand: captions and the brand index are built here.
+        for brand in brands:
+            seconds, _ = await run_service_request(service, brand, PROMPTS[0])
+            results["cold"][brand["name"]] = round(seconds * 1000, 2)
+
+        # The longest deadline admission allows, so requests wait for their
+        # turn (and keep their image) rather than being degraded.
+        headers = {"X-API-KEY": BENCHMARK_API_KEY, "X-Request-Timeout": str(settings.ADMISSION_MAX_DEADLINE_S)}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", headers=headers, timeout=None) as client:
+            for concurrency in args.concurrency:
+                if args.mode in ("service", "both"):
+                    print(f"-> service  concurrency={concurrency}", file=sys.stderr)
+                    results["service"].append(await run_phase(
+                        lambda brand, prompt: run_service_request(service, brand, prompt), brands, concurrency, args.requests
+                    ))
+                if args.mode in ("http", "both"):
+                    print(f"-> http     concurrency={concurrency}", file=sys.stderr)
+                    results["http"].append(await run_phase(
+                        lambda brand, prompt: run_http_request(client, brand, prompt), brands, concurrency, args.requests
+                    ))
+    return results
+
+
+# =======================================================================
+#  ENTRY POINT
+# =======================================================================
+
+def configure_environment(args: argparse.Namespace, work_dir: str, ollama_url: str) -> None:
+    """Points every backend at its offline stand-in. Must run before `app` is imported."""
+    os.environ.update({
+        "CLASSIFIER_BACKEND": "fake",
+        "CAPTIONER_BACKEND": "fake",
+        "EMBEDDINGS_BACKEND": "fake",
+        "DIFFUSION_BACKEND": "fake",
+        "FAKE_CAPTION_DELAY_S": str(args.caption_delay_ms / 1000),
+        "FAKE_DIFFUSION_DELAY_S": str(args.diffusion_delay_ms / 1000),
+        "OLLAMA_BASE_URL": ollama_url,
+        "WARM_UP_MODELS": "true",
+        "SERVER_TIMING_HEADER": "true",
+        "API_KEY_PRIORITIES": json.dumps({BENCHMARK_API_KEY: "high"}),
+        "BRAND_INDEX_CACHE_DIR": os.path.join(work_dir, "brand_indexes"),
+        "CAPTION_CACHE_DIR": os.path.join(work_dir, "captions"),
+        "BRAND_STORE_DIR": os.path.join(work_dir, "brands"),
+        "IMAGE_STORE_DIR": os.path.join(work_dir, "images"),
+    })
+
+def start_stub_ollama(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    """Starts the stub Ollama server and waits until it answers."""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_ollama", "--port", str(port),
+         "--first-token-ms", str(args.first_token_ms), "--token-ms", str(args.token_ms)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{url}/api/tags", timeout=1).raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("The stub Ollama server did not start within 30s.")
+
+def print_table(title: str, phases: List[Dict[str, Any]]) -> None:
+    if not phases:
+        return
+    print(f"\n{title}")
+    print(f"{'clients':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6} {'peak RSS MB':>12}")
+    for phase in phases:
+        e2e = phase["end_to_end"]
+        print(f"{phase['concurrency']:>7} {phase['throughput_rps']:>8} {e2e['p50_ms']:>9} {e2e['p95_ms']:>9} "
+              f"{e2e['p99_ms']:>9} {phase['errors']:>6} {phase['peak_rss_mb']:>12}")
+    print(f"  stages at {phases[-1]['concurrency']} clients (p50 / p95 ms):")
+    for stage, stats in phases[-1]["stages"].items():
+        print(f"    {stage:<26} {stats['p50_ms']:>9} {stats['p95_ms']:>9}")
+
+def main() -> None:
+    default_brands = sorted(path.name for path in EXAMPLES_DIR.iterdir() if path.is_dir()) if EXAMPLES_DIR.exists() else []
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--brands", nargs="*", default=default_brands, help="Example brands (directories under examples/).")
+    parser.add_argument("--mode", choices=["service", "http", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[1, 4, 8], help="Concurrent clients per phase.")
+    parser.add_argument("--requests", type=int, default=24, help="Requests per phase.")
+    parser.add_argument("--first-token-ms", type=float, default=100.0, help="Stub Ollama time to first token.")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="Stub Ollama delay per streamed token.")
+    parser.add_argument("--caption-delay-ms", type=float, default=50.0, help="Fake captioner delay per batch.")
+    parser.add_argument("--diffusion-delay-ms", type=float, default=300.0, help="Fake diffusion delay per call.")
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    brands = [load_brand(name) for name in args.brands]
+    for brand in brands:
+        if brand["synthetic_assets"]:
+            print(f"-> {brand['name']}: using synthetic {', '.join(brand['synthetic_assets'])} (empty or undecodable)", file=sys.stderr)
+
+    stub, ollama_url = start_stub_ollama(args)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure_environment(args, work_dir, ollama_url)
+            results = asyncio.run(run_benchmark(args, brands))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "parameters": {key: value for key, value in vars(args).items() if key != "json"},
+        "brands": {brand["name"]: {"synthetic_assets": brand["synthetic_assets"]} for brand in brands},
+        "cold_first_request_ms": results["cold"],
+        "service": results["service"],
+        "http": results["http"],
+    }
+
+    print(f"\nCold first request per brand (ms): {report['cold_first_request_ms']}")
+    print_table("create_post_pipeline (in-process)", report["service"])
+    print_table("POST /api/v1/generate (ASGI)", report["http"])
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: end-to-end latency of the pipeline with sequential vs. concurrent stages.
+
+Runs the same requests against the example brands twice: once with every
+stage in sequence (PIPELINE_CONCURRENT_STAGES off, the old orchestrator)
+and once as a dependency graph (on). Three scenarios are measured:
+
+- cold: every request brings new assets, so captioning and indexing run and
+  can overlap with the intent and the retrieval sub-queries;
+- warm: the same assets every time (captions and index served from cache),
+  so only the intent and the sub-query LLM call overlap;
+- registered: the brand is passed as a `brand_id`.
+
+Backends are the offline stand-ins of `benchmarks.pipeline` (fake models and
+the stub Ollama server). Also reports the most frequent critical path.
+
+Usage:
+    python -m benchmarks.stage_graph
+    python -m benchmarks.stage_graph --requests 20 --caption-delay-ms 150 --json results/stage_graph.json
+"""
+# =======================================================================
+#  BENCHMARK: STAGE GRAPH - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.pipeline import (EXAMPLES_DIR, PROMPTS, configure_environment,
+                                 git_commit, load_brand, start_stub_ollama,
+                                 summarize)
+
+SCENARIOS = ("cold", "warm", "registered")
+
+
+# =======================================================================
+#  RUNNERS
+# =======================================================================
+
+async def run_request(service: Any, brand: Dict[str, Any], prompt: str, scenario: str, salt: int) -> Dict[str, Any]:
+    """One in-process pipeline run; returns its latency and critical path."""
+    if scenario == "registered":
+        guide, images = "", []
+    else:
+        guide, images = brand["guide"], [data for _, data in brand["images"]]
+        if scenario == "cold":
+            # Bytes after the end of an image are ignored by decoders but change
+            # its content hash, so captions and the brand index are recomputed.
+            guide = f"{guide}\n<!-- request {salt} -->\n"
+            images = [data + f"request {salt}".encode("utf-8") for data in images]
+
+    start = time.perf_counter()
+    result = await service.collect_post_pipeline(
+        prompt, guide, images, brand_id=brand["brand_id"] if scenario == "registered" else None
+    )
+    return {"seconds": time.perf_counter() - start, "critical_path": " > ".join(stage["stage"] for stage in result["critical_path"])}
+
+
+async def run_benchmark(args: argparse.Namespace, brands: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Runs every scenario with sequential and with concurrent stages."""
+    from app.config import settings
+    from app.main import app
+
+    results: Dict[str, Any] = {}
+    salt = 0
+    async with app.router.lifespan_context(app):
+        service = app.state.content_generation_service
+        for brand in brands:
+            registered = await service.ingest_brand(brand["guide"], [data for _, data in brand["images"]], name=brand["name"])
+            brand["brand_id"] = registered.id
+            # Warm the caches (and the models) for the "warm" scenario.
+            await run_request(service, brand, PROMPTS[0], "warm", salt)
+
+        for scenario in args.scenarios:
+            results[scenario] = {}
+            for concurrent in (False, True):
+                settings.PIPELINE_CONCURRENT_STAGES = concurrent
+                mode = "concurrent" if concurrent else "sequential"
+                print(f"-> {scenario:<10} {mode}", file=sys.stderr)
+                runs = []
+                for i in range(args.requests):
+                    salt += 1
+                    prompt = f"{PROMPTS[i % len(PROMPTS)]} (#{salt})"
+                    runs.append(await run_request(service, brands[i % len(brands)], prompt, scenario, salt))
+                paths = Counter(run["critical_path"] for run in runs)
+                results[scenario][mode] = {
+                    "end_to_end": summarize([run["seconds"] for run in runs]),
+                    "critical_path": paths.most_common(1)[0][0],
+                    "critical_path_share": round(paths.most_common(1)[0][1] / len(runs), 2),
+                }
+    return results
+
+
+# =======================================================================
+#  ENTRY POINT
+# =======================================================================
+
+def main() -> None:
+    default_brands = sorted(path.name for path in EXAMPLES_DIR.iterdir() if path.is_dir()) if EXAMPLES_DIR.exists() else []
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--brands", nargs="*", default=default_brands, help="Example brands (directories under examples/).")
+    parser.add_argument("--scenarios", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=12, help="Sequential requests per scenario and mode.")
+    parser.add_argument("--first-token-ms", type=float, default=100.0, help="Stub Ollama time to first token.")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="Stub Ollama delay per streamed token.")
+    parser.add_argument("--caption-delay-ms", type=float, default=100.0, help="Fake captioner delay per batch.")
+    parser.add_argument("--diffusion-delay-ms", type=float, default=300.0, help="Fake diffusion delay per call.")
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    brands = [load_brand(name) for name in args.brands]
+    stub, ollama_url = start_stub_ollama(args)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure_environment(args, work_dir, ollama_url)
+            results = asyncio.run(run_benchmark(args, brands))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(f"\n{'scenario':<11} {'seq p50 ms':>11} {'conc p50 ms':>12} {'seq p95 ms':>11} {'conc p95 ms':>12} {'speedup':>8}")
+    for scenario, modes in results.items():
+        seq, conc = modes["sequential"]["end_to_end"], modes["concurrent"]["end_to_end"]
+        speedup = seq["p50_ms"] / conc["p50_ms"] if conc["p50_ms"] else 0.0
+        print(f"{scenario:<11} {seq['p50_ms']:>11} {conc['p50_ms']:>12} {seq['p95_ms']:>11} {conc['p95_ms']:>12} {speedup:>7.2f}x")
+    print("\nMost frequent critical path (concurrent):")
+    for scenario, modes in results.items():
+        print(f"  {scenario:<11} {modes['concurrent']['critical_path']} ({modes['concurrent']['critical_path_share']:.0%})")
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "parameters": {key: value for key, value in vars(args).items() if key != "json"},
+            "results": results,
+        }
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Local stub of the Ollama HTTP API, for tests and benchmarks.
+
+Implements the endpoints the service uses (`/api/chat`, streamed or not,
+`/api/generate` for prewarming and `/api/tags`) with canned but
+prompt-aware answers and a configurable, deterministic latency model:
+a fixed time-to-first-token plus a fixed delay per streamed token.
+
+Usage:
+    python -m benchmarks.stub_ollama --port 11434 --first-token-ms 200 --token-ms 20
+    OLLAMA_BASE_URL=http://localhost:11434 uvicorn app.main:app
+"""
+# =======================================================================
+#  STUB OLLAMA SERVER - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Stub Ollama")
+
+# Latency model and counters (overridable from the command line).
+app.state.first_token_s = 0.2
+app.state.token_s = 0.02
+app.state.stats = {"chat_requests": 0, "prewarm_requests": 0, "active": 0, "max_active": 0}
+
+
+# =======================================================================
+#  CANNED ANSWERS
+# =======================================================================
+
+def _answer(messages: List[Dict[str, str]]) -> str:
+    """Picks an answer shaped like what the real prompt asks for."""
+    prompt = messages[-1]["content"] if messages else ""
+    if "Original question:" in prompt:
+        question = prompt.rsplit("Original question:", 1)[-1].strip()
+        return "\n".join(f"{prefix} {question}" for prefix in ("¿Cómo", "¿Qué ideas hay para", "Ejemplos de post para"))
+    if "IMAGE PROMPT" in prompt:
+        return "a photorealistic latte on a rustic wooden table, warm autumn light, cozy mood"
+    # Post copy: echo the user's request, so different requests get different copy.
+    request = prompt.split("### USER'S REQUEST ###")[-1].split("### YOUR TASK ###")[0].strip().strip('"')
+    return (f"¡{request}! 🍂🎃 Ven a probar el sabor de la temporada, hecho con especias naturales "
+            "y mucho amor. #LatteDeCalabaza #Otoño")
+
+def _tokens(text: str) -> List[str]:
+    """Splits an answer into word-sized chunks, like a streaming LLM."""
+    words = text.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+# =======================================================================
+#  ENDPOINTS
+# =======================================================================
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body: Dict[str, Any] = await request.json()
+    model = body.get("model", "")
+    answer = _answer(body.get("messages", []))
+    stats = app.state.stats
+    stats["chat_requests"] += 1
+
+    async def stream() -> AsyncIterator[str]:
+        stats["active"] += 1
+        stats["max_active"] = max(stats["max_active"], stats["active"])
+        try:
+            await asyncio.sleep(app.state.first_token_s)
+            for token in _tokens(answer):
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+                await asyncio.sleep(app.state.token_s)
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+        finally:
+            stats["active"] -= 1
+
+    if body.get("stream", True):
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    chunks = [json.loads(line) async for line in stream()]
+    return {
+        "model": model,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "message": {"role": "assistant", "content": "".join(chunk["message"]["content"] for chunk in chunks)},
+        "done": True,
+    }
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body: Dict[str, Any] = await request.json()
+    app.state.stats["prewarm_requests"] += 1
+    return {"model": body.get("model", ""), "response": "", "done": True}
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": "qwen3:8b"}, {"name": "qwen3:4b"}]}
+
+@app.get("/stats")
+async def stats():
+    """Not part of Ollama: request counters and peak concurrency, for benchmarks."""
+    return app.state.stats
+
+
+# =======================================================================
+#  ENTRY POINT
+# =======================================================================
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    app.state.first_token_s = args.first_token_ms / 1000
+    app.state.token_s = args.token_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: build and query latency of the vector store backends.
+
+For each corpus size, builds a persisted index with every backend and then
+times MMR queries on it (the search the retriever runs per sub-query).
+Embeddings are precomputed random unit vectors, so only the index itself is
+measured, not the embedding model. Backends whose package is not installed
+(e.g. chromadb) are skipped.
+
+Usage:
+    python -m benchmarks.vector_index
+    python -m benchmarks.vector_index --sizes 10 100 1000 --dim 768 --json results/vector_index.json
+"""
+# =======================================================================
+#  BENCHMARK: VECTOR STORE BACKENDS - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+from app.vectorstores import BACKENDS, build_vector_store
+
+
+class PrecomputedEmbeddings(Embeddings):
+    """Returns a fixed random unit vector per text, so embedding costs ~nothing."""
+    def __init__(self, dim: int, seed: int = 0):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+        self.vectors: Dict[str, List[float]] = {}
+
+    def _vector(self, text: str) -> List[float]:
+        if text not in self.vectors:
+            vector = self.rng.normal(size=self.dim)
+            self.vectors[text] = (vector / np.linalg.norm(vector)).tolist()
+        return self.vectors[text]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+# =======================================================================
+#  MEASUREMENTS
+# =======================================================================
+
+def bench_backend(backend: str, size: int, dim: int, queries: int) -> Dict[str, Any]:
+    """Builds one `size`-chunk index with `backend` and times `queries` MMR searches."""
+    embeddings = PrecomputedEmbeddings(dim)
+    documents = [Document(page_content=f"chunk {i}", metadata={"Header 2": f"Section {i}"}) for i in range(size)]
+    ids = [f"id-{i}" for i in range(size)]
+    embeddings.embed_documents([doc.page_content for doc in documents])  # precompute outside the timers
+    query_vectors = [embeddings.embed_query(f"query {i}") for i in range(queries)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        start = time.perf_counter()
+        index = build_vector_store(backend, documents, embeddings, ids, Path(tmp_dir) / "index")
+        build_ms = (time.perf_counter() - start) * 1000
+
+        timings = []
+        for vector in query_vectors:
+            start = time.perf_counter()
+            index.max_marginal_relevance_search_by_vector(
+                vector, k=settings.RETRIEVAL_K, fetch_k=settings.RETRIEVAL_FETCH_K, lambda_mult=0.5
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        "backend": backend,
+        "chunks": size,
+        "build_ms": round(build_ms, 2),
+        "query_p50_ms": round(statistics.median(timings), 3),
+        "query_p95_ms": round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 50, 100, 500, 1000], help="Corpus sizes (chunks).")
+    parser.add_argument("--dim", type=int, default=768, help="Embedding dimension (768 for the default mpnet model).")
+    parser.add_argument("--queries", type=int, default=200, help="Timed MMR queries per index.")
+    parser.add_argument("--backends", nargs="*", default=list(BACKENDS), help="Backends to compare.")
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    results = []
+    for backend in args.backends:
+        for size in args.sizes:
+            try:
+                results.append(bench_backend(backend, size, args.dim, args.queries))
+            except ImportError as e:
+                print(f"-> Skipping backend '{backend}': {e}", file=sys.stderr)
+                break
+
+    print(f"{'backend':<8} {'chunks':>6} {'build ms':>10} {'query p50 ms':>13} {'query p95 ms':>13}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['chunks']:>6} {r['build_ms']:>10} {r['query_p50_ms']:>13} {r['query_p95_ms']:>13}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: memory per worker and throughput as the number of workers grows.
+
+Starts the pre-fork server (`python -m app.server`) with 1, 2, 4... workers,
+once with the models preloaded in the master (shared copy-on-write) and once
+with `--no-preload` (every worker loads its own copy, as with
+`uvicorn --workers`). For each configuration it reports:
+
+- memory of the master and of every worker, from /proc/<pid>/smaps_rollup:
+  RSS (counts shared pages in full), PSS (shared pages split between the
+  processes sharing them) and USS (pages private to the process);
+- the total PSS of the server, i.e. what it really costs the host;
+- requests/s and latency of POST /api/v1/generate against a registered brand.
+
+Backends are the offline stand-ins of `benchmarks.pipeline`; the fake
+captioner and diffusion backends each hold FAKE_MODEL_WEIGHTS_MB of dummy
+weights so the memory figures have a realistic shape. Linux only.
+
+Usage:
+    python -m benchmarks.workers
+    python -m benchmarks.workers --workers 1 2 4 8 --weights-mb 512 --json results/workers.json
+"""
+# =======================================================================
+#  BENCHMARK: WORKER SCALING - Amplify AI
+# =======================================================================
+
+# -----------------------------------------------------------------------
+#  IMPORTS
+# -----------------------------------------------------------------------
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+import httpx
+
+from benchmarks.pipeline import (EXAMPLES_DIR, PROMPTS, configure_environment,
+                                 free_port, git_commit, load_brand,
+                                 start_stub_ollama, summarize)
+
+
+# =======================================================================
+#  STATELESS UTILITY FUNCTIONS
+# =======================================================================
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """RSS, PSS and USS of a process, in MB, from /proc/<pid>/smaps_rollup."""
+    fields: Dict[str, int] = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[key] = int(value.split()[0])
+    uss = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_mb": round(fields["Rss"] / 1024, 1), "pss_mb": round(fields["Pss"] / 1024, 1), "uss_mb": round(uss / 1024, 1)}
+
+def child_pids(pid: int) -> List[int]:
+    """Pids of the direct children of `pid`."""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                # The command name (field 2) may contain spaces; the ppid follows it.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+# =======================================================================
+#  RUNNERS
+# =======================================================================
+
+async def wait_until_ready(client: httpx.AsyncClient, workers: int, timeout_s: float = 120.0) -> None:
+    """Polls the readiness endpoint until every worker has answered 'ready'."""
+    seen: Set[int] = set()
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        responses = await asyncio.gather(
+            # A new connection per probe: the kernel hands it to whichever worker accepts first.
+            *(client.get("/api/v1/health/ready", headers={"Connection": "close"}) for _ in range(4 * workers)),
+            return_exceptions=True
+        )
+        for response in responses:
+            if isinstance(response, httpx.Response) and response.status_code == 200:
+                seen.add(response.json()["worker_pid"])
+        if len(seen) >= workers:
+            return
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Only {len(seen)} of {workers} workers became ready within {timeout_s:.0f}s.")
+
+async def register_brand(client: httpx.AsyncClient, brand: Dict[str, Any]) -> str:
+    files = [("brand_guide_file", ("brand_guide.md", brand["guide"].encode("utf-8"), "text/markdown"))]
+    files += [("style_images", (filename, data, "image/jpeg")) for filename, data in brand["images"]]
+    response = await client.post("/api/v1/brands", data={"name": brand["name"]}, files=files)
+    response.raise_for_status()
+    return response.json()["brand_id"]
+
+async def run_load(client: httpx.AsyncClient, brand_ids: List[str], clients: int, total_requests: int) -> Dict[str, Any]:
+    """Sends `total_requests` generations from `clients` concurrent clients; returns req/s and latencies."""
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(total_requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            data = {"user_prompt": f"{PROMPTS[i % len(PROMPTS)]} (#{i}-{time.time_ns()})", "brand_id": brand_ids[i % len(brand_ids)]}
+            start = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/generate", data=data)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError as e:
+                errors += 1
+                print(f"[WARN] Request {i} failed: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "requests": total_requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "end_to_end": summarize(latencies),
+    }
+
+async def measure(args: argparse.Namespace, url: str, server: subprocess.Popen, workers: int, brands: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=url, timeout=None, limits=httpx.Limits(max_connections=None)) as client:
+        await wait_until_ready(client, workers)
+        brand_ids = [await register_brand(client, brand) for brand in brands]
+        # Warm every worker's caches (and lazily created objects) before measuring.
+        await run_load(client, brand_ids, 2 * workers, 4 * workers)
+        load = await run_load(client, brand_ids, args.clients_per_worker * workers, args.requests_per_worker * workers)
+
+    pids = child_pids(server.pid)
+    per_worker = [memory_mb(pid) for pid in pids]
+    master = memory_mb(server.pid)
+    return {
+        "workers": workers,
+        "master": master,
+        "per_worker": per_worker,
+        "avg_worker": {key: round(sum(m[key] for m in per_worker) / len(per_worker), 1) for key in master},
+        "total_pss_mb": round(master["pss_mb"] + sum(m["pss_mb"] for m in per_worker), 1),
+        **load,
+    }
+
+def run_configuration(args: argparse.Namespace, workers: int, preload: bool, brands: List[Dict[str, Any]], work_dir: str) -> Dict[str, Any]:
+    """Starts one server, measures it and stops it."""
+    port = free_port()
+    command = [sys.executable, "-m", "app.server", "--workers", str(workers), "--port", str(port), "--log-level", "warning"]
+    if not preload:
+        command.append("--no-preload")
+    log_path = Path(work_dir) / f"server-{workers}-{'preload' if preload else 'no-preload'}.log"
+    with open(log_path, "w", encoding="utf-8") as log:
+        server = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            return asyncio.run(measure(args, f"http://127.0.0.1:{port}", server, workers, brands))
+        except Exception:
+            print(log_path.read_text(encoding="utf-8")[-4000:], file=sys.stderr)
+            raise
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+
+# =======================================================================
+#  ENTRY POINT
+# =======================================================================
+
+def main() -> None:
+    default_brands = sorted(path.name for path in EXAMPLES_DIR.iterdir() if path.is_dir()) if EXAMPLES_DIR.exists() else []
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--brands", nargs="*", default=default_brands, help="Example brands (directories under examples/).")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4], help="Worker counts to measure.")
+    parser.add_argument("--weights-mb", type=int, default=256, help="Dummy weights held by each fake model (captioner, diffusion).")
+    parser.add_argument("--clients-per-worker", type=int, default=4, help="Concurrent clients per worker.")
+    parser.add_argument("--requests-per-worker", type=int, default=12, help="Measured requests per worker.")
+    parser.add_argument("--first-token-ms", type=float, default=100.0, help="Stub Ollama time to first token.")
+    parser.add_argument("--token-ms", type=float, default=10.0, help="Stub Ollama delay per streamed token.")
+    parser.add_argument("--caption-delay-ms", type=float, default=50.0, help="Fake captioner delay per batch.")
+    parser.add_argument("--diffusion-delay-ms", type=float, default=300.0, help="Fake diffusion delay per call.")
+    parser.add_argument("--json", help="Optional path to write the results as JSON.")
+    args = parser.parse_args()
+
+    brands = [load_brand(name) for name in args.brands]
+    results: Dict[str, List[Dict[str, Any]]] = {"preload": [], "no_preload": []}
+    stub, ollama_url = start_stub_ollama(args)
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            # Inherited by the server processes.
+            configure_environment(args, work_dir, ollama_url)
+            os.environ["FAKE_MODEL_WEIGHTS_MB"] = str(args.weights_mb)
+            for preload in (True, False):
+                for workers in args.workers:
+                    print(f"-> workers={workers} preload={preload}", file=sys.stderr)
+                    results["preload" if preload else "no_preload"].append(run_configuration(args, workers, preload, brands, work_dir))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    for mode, runs in results.items():
+        print(f"\n{mode} (fake weights: 2 x {args.weights_mb} MB)")
+        print(f"{'workers':>7} {'RSS/worker':>11} {'PSS/worker':>11} {'USS/worker':>11} {'master PSS':>11} {'total PSS':>10} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+        for run in runs:
+            avg = run["avg_worker"]
+            print(f"{run['workers']:>7} {avg['rss_mb']:>11} {avg['pss_mb']:>11} {avg['uss_mb']:>11} {run['master']['pss_mb']:>11} "
+                  f"{run['total_pss_mb']:>10} {run['throughput_rps']:>7} {run['end_to_end']['p50_ms']:>8} {run['end_to_end']['p95_ms']:>8} {run['errors']:>6}")
+
+    if args.json:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "parameters": {key: value for key, value in vars(args).items() if key != "json"},
+            "results": results,
+        }
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures for the Amplify AI test suite.
+
+Every heavy backend is swapped for its offline stand-in: the fake classifier,
+captioner, embeddings and diffusion of `app/fakes.py`, and the stub Ollama
+server of `benchmarks/stub_ollama.py` (served in-process on a free port). All
+caches and stores live in a temporary directory. The environment is set here,
+before anything imports `app.config`.
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import Iterator, List, Tuple
+
+import pytest
+from PIL import Image
+
+from benchmarks.pipeline import free_port
+
+_WORK_DIR = tempfile.mkdtemp(prefix="amplify-tests-")
+_OLLAMA_PORT = free_port()
+
+os.environ.update({
+    "CLASSIFIER_BACKEND": "fake",
+    "CAPTIONER_BACKEND": "fake",
+    "EMBEDDINGS_BACKEND": "fake",
+    "DIFFUSION_BACKEND": "fake",
+    "OLLAMA_BASE_URL": f"http://127.0.0.1:{_OLLAMA_PORT}",
+    "WARM_UP_MODELS": "false",
+    "BRAND_INDEX_CACHE_DIR": os.path.join(_WORK_DIR, "brand_indexes"),
+    "CAPTION_CACHE_DIR": os.path.join(_WORK_DIR, "captions"),
+    "BRAND_STORE_DIR": os.path.join(_WORK_DIR, "brands"),
+    "IMAGE_STORE_DIR": os.path.join(_WORK_DIR, "images"),
+})
+
+BRAND_GUIDE = """# Identidad de Marca
+Marca cercana, cálida y optimista.
+## Tono de Voz
+Frases cortas, tuteo y emojis moderados.
+## Colores
+Naranja calabaza, crema y marrón café.
+"""
+
+
+# =======================================================================
+#  HELPERS
+# =======================================================================
+
+def make_image(color: Tuple[int, int, int], size: Tuple[int, int] = (64, 48), fmt: str = "JPEG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+def brand_files(images: int = 2, guide: str = BRAND_GUIDE) -> List[Tuple[str, Tuple[str, bytes, str]]]:
+    """Multipart `files` for a brand guide plus `images` style images."""
+    files = [("brand_guide_file", ("brand_guide.md", guide.encode("utf-8"), "text/markdown"))]
+    files += [("style_images", (f"style_{i}.jpg", make_image((40 * i, 90, 30)), "image/jpeg")) for i in range(images)]
+    return files
+
+
+# =======================================================================
+#  FIXTURES
+# =======================================================================
+
+@pytest.fixture
+def anyio_backend() -> str:
+    """Async tests (marked `anyio`) run on asyncio, like the service."""
+    return "asyncio"
+
+@pytest.fixture(scope="session")
+def stub_ollama() -> Iterator[str]:
+    """The stub Ollama server, answering without artificial latency."""
+    import uvicorn
+    from benchmarks.stub_ollama import app as stub_app
+
+    stub_app.state.first_token_s = 0.0
+    stub_app.state.token_s = 0.0
+    server = uvicorn.Server(uvicorn.Config(stub_app, host="127.0.0.1", port=_OLLAMA_PORT, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("The stub Ollama server did not start.")
+        time.sleep(0.05)
+    yield f"http://127.0.0.1:{_OLLAMA_PORT}"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+@pytest.fixture
+def client(stub_ollama):
+    """A TestClient of the application, lifespan included."""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""Tests of the HTTP API, run against the offline backends (see conftest.py)."""
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, List
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.admission import IMAGE_STAGE, TEXT_STAGE, AdmissionController
+from app.config import settings
+from app.jobs import WebhookRejected, check_webhook_url
+from app.uploads import RequestSizeLimitMiddleware
+from tests.conftest import BRAND_GUIDE, brand_files
+
+
+# =======================================================================
+#  HELPERS
+# =======================================================================
+
+def wait_for_job(client: TestClient, job_id: str, timeout_s: float = 20.0) -> Dict[str, Any]:
+    """Polls a job until it has finished."""
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        job = client.get(f"/api/v1/jobs/{job_id}").json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish within {timeout_s}s.")
+
+
+class WebhookReceiver:
+    """A local HTTP server recording the JSON bodies POSTed to it."""
+    def __init__(self):
+        received: List[Dict[str, Any]] = []
+        self.received = received
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+
+
+def read_sse(body: str) -> List[tuple]:
+    """Parses a Server-Sent Events body into `(event, data)` pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        events.append((fields.get("event"), json.loads(fields.get("data", "null"))))
+    return events
+
+
+def read_multipart(response) -> List[tuple]:
+    """Splits a multipart/mixed response into `(headers, body)` pairs."""
+    boundary = response.headers["content-type"].split("boundary=")[1].encode("ascii")
+    parts = []
+    for part in response.content.split(b"--" + boundary)[1:-1]:
+        head, body = part.strip(b"\r\n").split(b"\r\n\r\n", 1)
+        headers = dict(line.decode("utf-8").split(": ", 1) for line in head.split(b"\r\n"))
+        parts.append((headers, body))
+    return parts
+
+
+def use_admission(client: TestClient, **overrides: Any) -> AdmissionController:
+    """Replaces the app's admission controller with one built from the settings plus `overrides`."""
+    options = dict(
+        text_slots=settings.ADMISSION_TEXT_SLOTS,
+        image_slots=settings.ADMISSION_IMAGE_SLOTS,
+        text_service_time_s=settings.ADMISSION_TEXT_SECONDS,
+        image_service_time_s=settings.ADMISSION_IMAGE_SECONDS,
+        queue_limits=settings.ADMISSION_QUEUE_LIMITS,
+        degraded_mode=settings.ADMISSION_DEGRADED_MODE,
+    )
+    options.update(overrides)
+    client.app.state.admission_controller = AdmissionController(**options)
+    return client.app.state.admission_controller
+
+
+# =======================================================================
+#  JOBS
+# =======================================================================
+
+def test_job_runs_with_fake_diffusion(client):
+    response = client.post("/api/v1/jobs", data={"user_prompt": "Anuncia el latte de otoño"}, files=brand_files())
+    assert response.status_code == 202
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "succeeded"
+    assert job["result"]["generated_copy_text"]
+    assert job["result"]["generated_image_b64"]
+
+def test_job_webhook_is_delivered_to_allowed_host(stub_ollama, monkeypatch):
+    from app.main import app
+    receiver = WebhookReceiver()
+    monkeypatch.setattr(settings, "JOB_WEBHOOK_ALLOWED_HOSTS", ["127.0.0.1"])
+    try:
+        with TestClient(app) as client:
+            response = client.post(
+                "/api/v1/jobs", data={"user_prompt": "Invita al evento", "webhook_url": receiver.url}, files=brand_files()
+            )
+            assert response.status_code == 202
+            job_id = response.json()["job_id"]
+            assert wait_for_job(client, job_id)["status"] == "succeeded"
+            deadline = time.time() + 5
+            while not receiver.received and time.time() < deadline:
+                time.sleep(0.05)
+    finally:
+        receiver.close()
+    assert [body["job_id"] for body in receiver.received] == [job_id]
+    assert receiver.received[0]["result"]["generated_copy_text"]
+
+@pytest.mark.parametrize("webhook_url", [
+    "http://127.0.0.1:8000/hook",
+    "http://localhost/hook",
+    "http://10.0.0.5/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/hook",
+    "file:///etc/passwd",
+    "ftp://example.com/hook",
+    "/relative/hook",
+])
+def test_job_rejects_internal_or_non_http_webhooks(client, webhook_url):
+    response = client.post("/api/v1/jobs", data={"user_prompt": "x", "webhook_url": webhook_url}, files=brand_files())
+    assert response.status_code == 422
+    assert client.get("/api/v1/jobs/stats").json()["depth"] == 0
+
+@pytest.mark.anyio
+async def test_webhook_check_accepts_public_addresses_and_allowlist():
+    await check_webhook_url("https://93.184.216.34/hook")
+    await check_webhook_url("http://127.0.0.1:9000/hook", allowed_hosts=["127.0.0.1"])
+    with pytest.raises(WebhookRejected):
+        await check_webhook_url("https://93.184.216.34/hook", allowed_hosts=["hooks.example.com"])
+
+
+# =======================================================================
+#  ADMISSION OF CAMPAIGNS AND JOBS
+# =======================================================================
+
+def test_campaign_is_admitted_by_its_number_of_posts(client):
+    # One text slot: an anonymous ("low") campaign of 5 posts would queue 4 of them.
+    use_admission(client, text_slots=1, queue_limits={"high": 8, "standard": 8, "low": 2})
+    data = {"user_prompt": "Anuncia el latte de otoño", "variants": "5"}
+    response = client.post("/api/v1/campaigns", data=data, files=brand_files())
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    data["variants"] = "3"
+    response = client.post("/api/v1/campaigns", data=data, files=brand_files())
+    assert response.status_code == 200
+    assert [event for event, _ in read_sse(response.text)][-2:] == ["summary", "done"]
+
+def test_campaign_posts_take_the_stage_slots(client):
+    admission = use_admission(client, text_service_time_s=100.0, image_service_time_s=100.0)
+    response = client.post("/api/v1/campaigns", data={"prompts": ["Post uno", "Post dos"]}, files=brand_files())
+    posts = [data for event, data in read_sse(response.text) if event == "post"]
+    assert len(posts) == 2 and all(post["post"]["generated_image_b64"] for post in posts)
+    # Every post (and the shared setup) fed its duration into the estimates.
+    stats = admission.stats()
+    assert stats[TEXT_STAGE]["service_time_s"] < 100.0 and stats[IMAGE_STAGE]["service_time_s"] < 100.0
+    assert stats[TEXT_STAGE]["running"] == stats[IMAGE_STAGE]["running"] == 0
+
+def test_job_is_refused_when_it_cannot_meet_its_deadline(client):
+    use_admission(client, text_service_time_s=10.0)
+    response = client.post(
+        "/api/v1/jobs", data={"user_prompt": "Invita al evento"}, files=brand_files(), headers={"X-Request-Timeout": "1"}
+    )
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+    assert client.get("/api/v1/jobs/stats").json()["depth"] == 0
+
+def test_admitted_job_takes_the_stage_slots(client):
+    admission = use_admission(client, text_service_time_s=100.0, image_service_time_s=100.0)
+    response = client.post("/api/v1/jobs", data={"user_prompt": "Invita al evento"}, files=brand_files())
+    assert response.status_code == 202
+    assert wait_for_job(client, response.json()["job_id"])["status"] == "succeeded"
+    stats = admission.stats()
+    assert stats[TEXT_STAGE]["service_time_s"] < 100.0 and stats[IMAGE_STAGE]["service_time_s"] < 100.0
+
+
+# =======================================================================
+#  STREAMING AND MULTIPART RESPONSES
+# =======================================================================
+
+def test_generate_stream_sends_tokens_then_the_image(client):
+    response = client.post("/api/v1/generate/stream", data={"user_prompt": "Anuncia el latte de otoño"}, files=brand_files())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_sse(response.text)
+    names = [event for event, _ in events]
+    assert names[0] == "classified_intent" and names[-1] == "done"
+    # The copy is streamed token by token before the image is made.
+    copy = dict(events)["generated_copy_text"]
+    assert names.count("token") > 1
+    assert "".join(data for event, data in events if event == "token") == copy
+    assert names.index("generated_copy_text") < names.index("generated_image_b64")
+
+def test_generate_stream_refuses_multipart_mode(client):
+    data = {"user_prompt": "Anuncia el latte de otoño", "response_mode": "multipart"}
+    assert client.post("/api/v1/generate/stream", data=data, files=brand_files()).status_code == 422
+
+def test_generate_multipart_returns_json_and_raw_image(client):
+    data = {"user_prompt": "Anuncia el latte de otoño", "response_mode": "multipart"}
+    response = client.post("/api/v1/generate", data=data, files=brand_files())
+    assert response.status_code == 201
+    assert response.headers["content-type"].startswith("multipart/mixed")
+    (json_headers, metadata), (image_headers, image) = read_multipart(response)
+    assert json_headers["Content-Type"].startswith("application/json")
+    metadata = json.loads(metadata)
+    assert metadata["generated_copy_text"] and "generated_image_b64" not in metadata
+    assert int(image_headers["Content-Length"]) == len(image)
+    with Image.open(io.BytesIO(image)) as decoded:
+        assert f"image/{decoded.format.lower()}" == image_headers["Content-Type"]
+
+
+# =======================================================================
+#  UPLOAD AND REQUEST SIZE LIMITS
+# =======================================================================
+
+def test_oversized_upload_is_refused(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_FILE_BYTES", 200)
+    response = client.post("/api/v1/generate", data={"user_prompt": "x"}, files=brand_files(guide=BRAND_GUIDE * 10))
+    assert response.status_code == 413
+
+def test_too_many_style_images_are_refused(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_STYLE_IMAGES", 2)
+    assert client.post("/api/v1/generate", data={"user_prompt": "x"}, files=brand_files(images=3)).status_code == 422
+
+def test_oversized_image_is_refused_from_its_header(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_IMAGE_PIXELS", 64 * 48 - 1)
+    assert client.post("/api/v1/generate", data={"user_prompt": "x"}, files=brand_files()).status_code == 413
+
+@pytest.mark.parametrize("field, upload", [
+    ("style_images", ("style.jpg", b"not an image", "image/jpeg")),
+    ("brand_guide_file", ("brand_guide.md", "Guía de marca".encode("latin-1"), "text/markdown")),
+])
+def test_unreadable_uploads_are_refused(client, field, upload):
+    files = [item for item in brand_files() if item[0] != field] + [(field, upload)]
+    assert client.post("/api/v1/generate", data={"user_prompt": "x"}, files=files).status_code == 422
+
+@pytest.fixture
+def echo_client() -> TestClient:
+    """A bare app behind RequestSizeLimitMiddleware, echoing the body size."""
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimitMiddleware, max_body_bytes=1000)
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    return TestClient(app)
+
+def test_request_size_limit_checks_declared_and_streamed_bodies(echo_client):
+    assert echo_client.post("/echo", content=b"x" * 1000).json() == {"size": 1000}
+    assert echo_client.post("/echo", content=b"x" * 1001).status_code == 413
+    # Chunked bodies declare no Content-Length and are cut off as they arrive.
+    chunks = (b"x" * 400 for _ in range(3))
+    assert echo_client.post("/echo", content=chunks).status_code == 413
+
+
+# =======================================================================
+#  BRANDS
+# =======================================================================
+
+def test_brand_update_reports_incremental_reindexing(client):
+    brand = client.post("/api/v1/brands", data={"name": "Café Otoño"}, files=brand_files()).json()
+    assert brand["num_chunks"] == 5 and brand["last_indexing"] == {"embedded": 5, "deleted": 0, "unchanged": 0}
+
+    guide = BRAND_GUIDE.replace("Naranja calabaza", "Verde oliva")
+    files = [("brand_guide_file", ("brand_guide.md", guide.encode("utf-8"), "text/markdown"))]
+    updated = client.put(f"/api/v1/brands/{brand['brand_id']}", files=files)
+    assert updated.status_code == 200
+    assert updated.json()["last_indexing"] == {"embedded": 1, "deleted": 1, "unchanged": 4}
+
+    # Re-uploading the same assets embeds nothing.
+    again = client.put(f"/api/v1/brands/{brand['brand_id']}", files=files).json()
+    assert again["last_indexing"] == {"embedded": 0, "deleted": 0, "unchanged": 5}
+    assert client.delete(f"/api/v1/brands/{brand['brand_id']}").status_code == 204
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Accuracy of the cheaper CPU inference backends against their fp32 reference,
+with the checks and tolerances of `benchmarks/inference_backends.py`. Every
+backend runs in its own process, as in the benchmark. A test is skipped
+where the libraries of its backends (or the trained classifier) are missing.
+"""
+import os
+from typing import Any, Dict, List
+
+import pytest
+
+from app.config import settings
+from benchmarks.inference_backends import MODELS, REPO_DIR, TOLERANCES, compare, run_child
+
+
+# =======================================================================
+#  FIXTURES
+# =======================================================================
+
+@pytest.fixture(scope="session")
+def reference_outputs(tmp_path_factory) -> Dict[str, List[Any]]:
+    """Outputs of the reference backend of each model, computed on first use."""
+    class References(dict):
+        def __missing__(self, model_name: str) -> List[Any]:
+            _, backends = MODELS[model_name]
+            self[model_name] = run_child(model_name, backends[0], 1, str(tmp_path_factory.mktemp(model_name)))["outputs"]
+            return self[model_name]
+
+    return References()
+
+
+# =======================================================================
+#  TOLERANCE
+# =======================================================================
+
+@pytest.mark.parametrize("model_name, backend, modules", [
+    ("embeddings", "huggingface-int8", ["torch", "sentence_transformers", "langchain_huggingface"]),
+    ("embeddings", "onnx", ["torch", "onnxruntime", "optimum.onnxruntime", "sentence_transformers", "langchain_huggingface"]),
+    ("captioner", "blip-int8", ["torch", "transformers"]),
+    ("classifier", "onnx", ["sklearn", "joblib", "onnxruntime", "skl2onnx"]),
+])
+def test_backend_is_within_tolerance_of_fp32(model_name, backend, modules, reference_outputs, tmp_path):
+    for module in modules:
+        pytest.importorskip(module)
+    if model_name == "classifier" and not os.path.exists(REPO_DIR / settings.CLASSIFIER_MODEL_PATH):
+        pytest.skip(f"The trained intent classifier ({settings.CLASSIFIER_MODEL_PATH}) is not available.")
+
+    outputs = run_child(model_name, backend, 1, str(tmp_path))["outputs"]
+    accuracy = compare(model_name, reference_outputs[model_name], outputs)
+    assert accuracy >= TOLERANCES[model_name], f"{model_name}/{backend}: accuracy {accuracy:.4f} < {TOLERANCES[model_name]}"
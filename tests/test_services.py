@@ -0,0 +1,762 @@
+# -*- coding: utf-8 -*-
+"""Tests of the service layer and its building blocks, run against the offline backends (see conftest.py)."""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import httpx
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
+
+from app import cache as cache_module
+from app.admission import IMAGE_STAGE, TEXT_STAGE, AdmissionController, AdmissionRejected
+from app.batching import MicroBatcher
+from app.brands import BrandStore
+from app.cache import BrandIndexCache, CaptionCache, IntentCache, SemanticCache
+from app.config import settings
+from app.executors import CPU
+from app.llm import OllamaClient, PooledChatOllama
+from app.registry import EMBEDDINGS, build_model_registry
+from app.services import ContentGenerationService
+from app.stages import StageGraph
+from app.vectorstores import NumpyVectorIndex, mmr_select
+from tests.conftest import BRAND_GUIDE, make_image
+
+
+# =======================================================================
+#  HELPERS & FIXTURES
+# =======================================================================
+
+class SlowEmbeddings:
+    """Wraps an embeddings model, adding a fixed delay to every batch."""
+    def __init__(self, embeddings: Any, delay_s: float):
+        self.embeddings = embeddings
+        self.delay_s = delay_s
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.delay_s)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.delay_s)
+        return self.embeddings.embed_query(text)
+
+
+class FirstLineEmbeddings(SlowEmbeddings):
+    """Embeds only the first line of each text: requests differing below it look identical to the semantic cache."""
+    def __init__(self, embeddings: Any):
+        super().__init__(embeddings, delay_s=0.0)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return super().embed_documents([text.split("\n")[0] for text in texts])
+
+    def embed_query(self, text: str) -> List[float]:
+        return super().embed_query(text.split("\n")[0])
+
+
+class CountingEmbeddings(SlowEmbeddings):
+    """Wraps an embeddings model, recording every text it embeds as a document."""
+    def __init__(self, embeddings: Any):
+        super().__init__(embeddings, delay_s=0.0)
+        self.embedded: List[str] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += texts
+        return super().embed_documents(texts)
+
+
+class TableEmbeddings:
+    """Embeddings looked up in a fixed table of vectors."""
+    def __init__(self, vectors: Dict[str, List[float]]):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+class SlowIndex:
+    """A vector store whose MMR searches each take `delay_s`, recording how many run at once."""
+    def __init__(self, delay_s: float):
+        self.delay_s = delay_s
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], **kwargs: Any) -> List[Document]:
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay_s)
+        with self._lock:
+            self.running -= 1
+        return [Document(page_content=f"chunk {embedding[0]:.6f}")]
+
+
+async def collect(events) -> Dict[str, List[Any]]:
+    """Groups the `(event, data)` pairs of a pipeline by event name."""
+    grouped: Dict[str, List[Any]] = {}
+    async for event, data in events:
+        grouped.setdefault(event, []).append(data)
+    return grouped
+
+
+@pytest.fixture
+def make_service() -> Callable[..., ContentGenerationService]:
+    """Builds services on the fake backends; `models` replaces some of them."""
+    services = []
+
+    def make(models: Dict[str, Any] = None) -> ContentGenerationService:
+        registry = build_model_registry()
+        for name, model in (models or {}).items():
+            registry.register(name, lambda model=model: model)
+        service = ContentGenerationService(registry)
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.shutdown()
+
+
+# =======================================================================
+#  CACHES
+# =======================================================================
+
+def test_brand_index_cache_builds_once_reloads_and_evicts(tmp_path):
+    builds, loads = [], []
+
+    def build(path):
+        path.mkdir()
+        (path / "index").write_text(path.name)
+        builds.append(path.name)
+        return f"index-{path.name}"
+
+    def load(path):
+        loads.append(path.name)
+        return f"index-{(path / 'index').read_text()}"
+
+    cache = BrandIndexCache(str(tmp_path), max_entries=2)
+    assert cache.get_or_build("a", build, load) == "index-a"
+    assert cache.get_or_build("a", build, load) == "index-a"
+    assert builds == ["a"] and cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    # A new process re-opens the persisted index instead of rebuilding it.
+    cache = BrandIndexCache(str(tmp_path), max_entries=2)
+    assert cache.get_or_build("a", build, load) == "index-a"
+    assert builds == ["a"] and loads == ["a"]
+
+    # The least recently used entry is evicted, from memory and from disk.
+    cache.get_or_build("b", build, load)
+    cache.get_or_build("a", build, load)
+    cache.get_or_build("c", build, load)
+    assert not (tmp_path / "b").exists() and (tmp_path / "a").exists()
+    cache.get_or_build("b", build, load)
+    assert builds == ["a", "b", "c", "b"]
+
+def test_brand_index_cache_discards_failed_builds(tmp_path):
+    def failing_build(path):
+        path.mkdir()
+        raise RuntimeError("embedding failed")
+
+    cache = BrandIndexCache(str(tmp_path), max_entries=2)
+    with pytest.raises(RuntimeError):
+        cache.get_or_build("a", failing_build, lambda path: None)
+    assert not (tmp_path / "a").exists()
+    assert cache.get_or_build("a", lambda path: "rebuilt", lambda path: None) == "rebuilt"
+
+def test_brand_index_cache_never_evicts_an_index_being_loaded(tmp_path):
+    def build(path):
+        path.mkdir()
+        (path / "index").write_text(path.name)
+        return f"index-{path.name}"
+
+    loading, release = threading.Event(), threading.Event()
+
+    def slow_load(path):
+        loading.set()
+        release.wait(timeout=5)
+        return f"index-{(path / 'index').read_text()}"
+
+    cache = BrandIndexCache(str(tmp_path), max_entries=2)
+    cache.get_or_build("a", build, slow_load)
+    cache.get_or_build("b", build, slow_load)
+    os.utime(tmp_path / "a", (1, 1))
+
+    # A new process re-opens "a" from disk while other brands push it out.
+    cache = BrandIndexCache(str(tmp_path), max_entries=2)
+    loaded = []
+    loader = threading.Thread(target=lambda: loaded.append(cache.get_or_build("a", build, slow_load)))
+    loader.start()
+    assert loading.wait(timeout=5)
+    cache.get_or_build("c", build, slow_load)
+    cache.get_or_build("d", build, slow_load)
+    assert (tmp_path / "a").exists() and not (tmp_path / "c").exists()
+    release.set()
+    loader.join(timeout=5)
+    assert loaded == ["index-a"]
+
+    # The bound is restored by the next eviction; "a" was just used, so it stays.
+    cache.get_or_build("e", build, slow_load)
+    assert not (tmp_path / "d").exists() and (tmp_path / "a").exists()
+    assert cache.stats()["entries"] == 2
+
+def test_caption_cache_falls_back_to_disk(tmp_path):
+    cache = CaptionCache(max_entries=1, cache_dir=str(tmp_path))
+    cache.put("a", "una taza de café")
+    cache.put("b", "una hoja de otoño")
+    # "a" left the in-memory LRU but is still on disk.
+    assert cache.get("a") == "una taza de café"
+    assert cache.get("missing") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+    assert CaptionCache(max_entries=1, cache_dir=str(tmp_path)).get("b") == "una hoja de otoño"
+
+    memory_only = CaptionCache(max_entries=1)
+    memory_only.put("a", "x")
+    memory_only.put("b", "y")
+    assert memory_only.get("a") is None and memory_only.get("b") == "y"
+
+def test_intent_cache_keeps_the_most_recent_prompts():
+    cache = IntentCache(max_entries=2)
+    cache.put("a", "Evento")
+    cache.put("b", "Promoción")
+    assert cache.get("a") == "Evento"
+    cache.put("c", "Consejo")
+    # "b" was the least recently used.
+    assert cache.get("b") is None
+    assert cache.get("a") == "Evento" and cache.get("c") == "Consejo"
+    assert cache.stats() == {"hits": 3, "misses": 1, "entries": 2}
+
+def test_semantic_cache_matches_by_meaning_within_a_scope(monkeypatch):
+    vectors = {
+        "anuncia el latte": [1.0, 0.0, 0.0],
+        "anuncia nuestro latte": [0.99, 0.1, 0.0],
+        "invita al evento": [0.0, 1.0, 0.0],
+    }
+    cache = SemanticCache(lambda text: vectors[text], threshold=0.95, ttl_s=60, max_entries=10)
+    cache.put(("marca", "Promoción"), "anuncia el latte", "copy 1")
+
+    assert cache.get(("marca", "Promoción"), "anuncia el latte") == "copy 1"
+    assert cache.get(("marca", "Promoción"), "anuncia nuestro latte") == "copy 1"
+    assert cache.get(("marca", "Promoción"), "invita al evento") is None
+    # Another brand (scope) never sees the entry.
+    assert cache.get(("otra", "Promoción"), "anuncia el latte") is None
+    assert cache.stats() == {"exact_hits": 1, "semantic_hits": 1, "misses": 2, "entries": 1}
+
+    # Entries expire after the TTL.
+    now = time.time()
+    monkeypatch.setattr(cache_module.time, "time", lambda: now + 61)
+    assert cache.get(("marca", "Promoción"), "anuncia el latte") is None
+    assert cache.stats()["entries"] == 0
+
+
+# =======================================================================
+#  MICRO-BATCHING
+# =======================================================================
+
+@pytest.mark.anyio
+async def test_micro_batcher_merges_concurrent_items_in_order():
+    batches = []
+
+    def batch_fn(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=20)
+    results = await asyncio.gather(*(batcher.submit(i) for i in range(6)))
+    assert results == [i * 10 for i in range(6)]
+    # A full batch goes out right away; the remainder after the time window.
+    assert batches == [[0, 1, 2, 3], [4, 5]]
+
+@pytest.mark.anyio
+async def test_micro_batcher_accumulates_items_while_busy():
+    batches = []
+
+    def batch_fn(items):
+        batches.append(list(items))
+        time.sleep(0.1)
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=5, max_in_flight=1)
+    first = asyncio.ensure_future(batcher.submit("a"))
+    await asyncio.sleep(0.05)
+    # These arrive while the first batch runs, and go out together right after it.
+    rest = await asyncio.gather(*(batcher.submit(item) for item in "bcde"))
+    assert await first == "a" and rest == list("bcde")
+    assert batches == [["a"], ["b", "c", "d", "e"]]
+
+@pytest.mark.anyio
+async def test_micro_batcher_fails_every_item_of_a_failed_batch():
+    def batch_fn(items):
+        raise ValueError("backend down")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=5)
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+# =======================================================================
+#  STAGE GRAPH
+# =======================================================================
+
+async def _stage(value: Any, delay_s: float = 0.1) -> Any:
+    await asyncio.sleep(delay_s)
+    return value
+
+@pytest.mark.anyio
+async def test_stage_graph_overlaps_independent_stages():
+    graph = StageGraph(concurrent=True)
+    start = time.perf_counter()
+    graph.add("intent", lambda: _stage("Evento"))
+    graph.add("captions", lambda: _stage(["una taza"]))
+    graph.add("copy", lambda intent, captions: _stage(f"{intent}: {captions[0]}", 0.0), "intent", "captions")
+    assert await graph.result("copy") == "Evento: una taza"
+    assert time.perf_counter() - start < 0.18
+    assert [run.name for run in graph.critical_path()][-1] == "copy"
+    await graph.aclose()
+
+@pytest.mark.anyio
+async def test_stage_graph_sequential_mode_chains_every_stage():
+    graph = StageGraph(concurrent=False)
+    start = time.perf_counter()
+    graph.add("intent", lambda: _stage("Evento"))
+    graph.add("captions", lambda: _stage(["una taza"]))
+    with graph.track("copy", "intent", "captions"):
+        await graph.result("intent")
+        await graph.result("captions")
+    assert time.perf_counter() - start >= 0.2
+    assert [run.name for run in graph.critical_path()] == ["intent", "captions", "copy"]
+    await graph.aclose()
+
+@pytest.mark.anyio
+async def test_stage_graph_rejects_bad_dependencies_and_cancels_leftovers():
+    graph = StageGraph()
+    with graph.track("inline"):
+        pass
+    with pytest.raises(ValueError):
+        graph.add("uses_inline", lambda value: _stage(value), "inline")
+    with pytest.raises(ValueError):
+        graph.add("orphan", lambda value: _stage(value), "unknown")
+    graph.add("slow", lambda: _stage("never", 10))
+    await asyncio.wait_for(graph.aclose(), timeout=1)
+
+
+# =======================================================================
+#  VECTOR INDEX
+# =======================================================================
+
+def _reference_mmr(query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float) -> List[int]:
+    """Textbook MMR, one candidate at a time."""
+    selected: List[int] = []
+    while len(selected) < min(k, len(candidates)):
+        best, best_score = None, -np.inf
+        for i in range(len(candidates)):
+            if i in selected:
+                continue
+            redundancy = max((float(candidates[i] @ candidates[j]) for j in selected), default=0.0)
+            score = lambda_mult * float(candidates[i] @ query) - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return selected
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.5, 1.0])
+def test_vectorized_mmr_matches_the_reference(lambda_mult):
+    rng = np.random.default_rng(7)
+    candidates = rng.normal(size=(40, 16)).astype(np.float32)
+    candidates /= np.linalg.norm(candidates, axis=1, keepdims=True)
+    query = candidates[0] + 0.1 * rng.normal(size=16).astype(np.float32)
+    query /= np.linalg.norm(query)
+    assert mmr_select(query, candidates, 8, lambda_mult) == _reference_mmr(query, candidates, 8, lambda_mult)
+    assert mmr_select(query, candidates[:0], 8, lambda_mult) == []
+
+def test_numpy_index_mmr_skips_near_duplicates(tmp_path):
+    embeddings = TableEmbeddings({
+        "latte": [1.0, 0.0, 0.0],
+        "latte de calabaza": [0.99, 0.14, 0.0],
+        "tarta de manzana": [0.6, 0.0, 0.8],
+        "gimnasio": [0.0, 1.0, 0.0],
+        "pregunta": [0.95, 0.0, 0.31],
+    })
+    texts = ["latte", "latte de calabaza", "tarta de manzana", "gimnasio"]
+    index = NumpyVectorIndex.from_texts(texts, embeddings, ids=texts, persist_directory=str(tmp_path))
+
+    assert [doc.page_content for doc in index.similarity_search("pregunta", k=2)] == ["latte", "latte de calabaza"]
+    assert [doc.page_content for doc in index.max_marginal_relevance_search("pregunta", k=2, fetch_k=4, lambda_mult=0.5)] == ["latte", "tarta de manzana"]
+
+    # Writes are persisted: deleted ids are gone after a reload, replaced ids are not duplicated.
+    index.delete(ids=["latte"])
+    index.add_texts(["gimnasio"], ids=["gimnasio"])
+    reloaded = NumpyVectorIndex.load(str(tmp_path), embeddings)
+    assert len(reloaded) == 3
+    assert [doc.page_content for doc in reloaded.max_marginal_relevance_search("pregunta", k=1)] == ["latte de calabaza"]
+
+def test_numpy_index_never_persists_rows_and_documents_out_of_step(tmp_path, monkeypatch):
+    embeddings = TableEmbeddings({"latte": [1.0, 0.0, 0.0], "gimnasio": [0.0, 1.0, 0.0]})
+    index = NumpyVectorIndex.from_texts(["latte", "gimnasio"], embeddings, ids=["latte", "gimnasio"], persist_directory=str(tmp_path))
+
+    # A crash while saving a write leaves the previous snapshot whole.
+    def crash(*args: Any) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr("app.vectorstores.os.replace", crash)
+    with pytest.raises(OSError):
+        index.delete(ids=["latte"])
+    monkeypatch.undo()
+    reloaded = NumpyVectorIndex.load(str(tmp_path), embeddings)
+    assert len(reloaded) == 2
+    for text, vector in embeddings.vectors.items():
+        assert [doc.page_content for doc in reloaded.similarity_search_by_vector(vector, k=1)] == [text]
+
+def test_numpy_index_reads_the_two_file_layout(tmp_path):
+    embeddings = TableEmbeddings({"latte": [1.0, 0.0, 0.0], "gimnasio": [0.0, 1.0, 0.0]})
+    np.save(tmp_path / "vectors.npy", np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]], dtype=np.float32))
+    records = [{"id": text, "page_content": text, "metadata": {}} for text in ("latte", "gimnasio")]
+    (tmp_path / "documents.json").write_text(json.dumps(records), encoding="utf-8")
+
+    index = NumpyVectorIndex.load(str(tmp_path), embeddings)
+    assert [doc.page_content for doc in index.similarity_search("gimnasio", k=1)] == ["gimnasio"]
+    # The next write moves it to the single-file layout.
+    index.delete(ids=["latte"])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index.npz"]
+    assert len(NumpyVectorIndex.load(str(tmp_path), embeddings)) == 1
+
+
+# =======================================================================
+#  RETRIEVAL
+# =======================================================================
+
+@pytest.mark.anyio
+async def test_concurrent_retrievals_do_not_starve_the_cpu_pool(make_service):
+    slow = SlowEmbeddings(build_model_registry().get(EMBEDDINGS), delay_s=0.05)
+    service = make_service({EMBEDDINGS: slow})
+    _, vectorstore = await service.executors.run(CPU, service.get_brand_vectorstore, BRAND_GUIDE, ["una taza de café"])
+
+    # More retrievals than CPU workers, each with several sub-queries.
+    retrievals = [service.aretrieve(vectorstore, f"pregunta {i}", [f"a {i}", f"b {i}", f"c {i}"]) for i in range(2 * settings.CPU_EXECUTOR_WORKERS)]
+    results = await asyncio.wait_for(asyncio.gather(*retrievals), timeout=20)
+    assert all(docs for _, docs in results)
+
+@pytest.mark.anyio
+async def test_sub_query_searches_overlap(make_service):
+    service = make_service()
+    index = SlowIndex(delay_s=0.2)
+    queries = [f"consulta {i}" for i in range(settings.RETRIEVAL_EXECUTOR_WORKERS)]
+    start = time.perf_counter()
+    _, docs = await service.aretrieve(index, "pregunta", queries)
+    assert len(docs) == len(queries)
+    assert index.peak == len(queries)
+    assert time.perf_counter() - start < 0.2 * len(queries) / 2
+
+
+# =======================================================================
+#  CAMPAIGNS
+# =======================================================================
+
+@pytest.mark.anyio
+async def test_campaign_variants_never_share_cached_copy(stub_ollama, make_service, monkeypatch):
+    # One LLM call at a time, so later variants look up the cache after earlier ones are stored.
+    monkeypatch.setattr(settings, "CAMPAIGN_LLM_CONCURRENCY", 1)
+    service = make_service({EMBEDDINGS: FirstLineEmbeddings(build_model_registry().get(EMBEDDINGS))})
+    assert service.semantic_cache is not None
+    events = await collect(service.stream_campaign(["Anuncia el menú de otoño"], BRAND_GUIDE, [], variants=3))
+    copies = [post["post"]["generated_copy_text"] for post in events["post"]]
+    assert len(copies) == 3 and len(set(copies)) == 3
+    assert events["summary"][0]["completed"] == 3
+
+@pytest.mark.anyio
+async def test_campaign_bounds_concurrent_retrievals(stub_ollama, make_service, monkeypatch):
+    monkeypatch.setattr(settings, "CAMPAIGN_RETRIEVAL_CONCURRENCY", 2)
+    service = make_service()
+    retrieve, running, peak = service.aretrieve, [0], [0]
+
+    async def counting_retrieve(*args, **kwargs):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        try:
+            await asyncio.sleep(0.05)
+            return await retrieve(*args, **kwargs)
+        finally:
+            running[0] -= 1
+
+    monkeypatch.setattr(service, "aretrieve", counting_retrieve)
+    prompts = [f"Post número {i} de la campaña" for i in range(6)]
+    events = await collect(service.stream_campaign(prompts, BRAND_GUIDE, [], bypass_cache=True))
+    assert len(events["post"]) == 6
+    assert peak[0] == 2
+
+
+# =======================================================================
+#  BRAND STORE
+# =======================================================================
+
+def test_slow_index_load_only_blocks_its_own_brand(tmp_path):
+    store = BrandStore(str(tmp_path), "index")
+    brands = [
+        store.create(f"marca {i}", f"hash-{i}", BRAND_GUIDE, [], [Document(page_content=f"chunk {i}")], lambda docs, ids, path: ids)
+        for i in range(2)
+    ]
+    # A fresh store (e.g. after a restart) has no index open yet.
+    store = BrandStore(str(tmp_path), "index")
+    release, builds = threading.Event(), []
+
+    def slow_build(docs, ids, path):
+        builds.append(ids)
+        release.wait(10)
+        return ids
+
+    loads = [threading.Thread(target=store.get_index, args=(brands[0].id, slow_build, None)) for _ in range(2)]
+    for thread in loads:
+        thread.start()
+    other = threading.Thread(target=store.get_index, args=(brands[1].id, lambda docs, ids, path: ids, None))
+    try:
+        # The other brand is served while the first one is still being rebuilt.
+        other.start()
+        other.join(2)
+        assert not other.is_alive()
+    finally:
+        release.set()
+        for thread in loads + [other]:
+            thread.join()
+    # Concurrent requests for the same brand rebuild its index once.
+    assert len(builds) == 1
+    assert store.stats() == {"brands": 2, "open_indexes": 2}
+
+@pytest.mark.anyio
+async def test_brand_update_only_embeds_changed_chunks(make_service):
+    counting = CountingEmbeddings(build_model_registry().get(EMBEDDINGS))
+    service = make_service({EMBEDDINGS: counting})
+    brand = await service.ingest_brand(BRAND_GUIDE, [make_image((200, 120, 40))], name="Café Otoño")
+    assert len(counting.embedded) == len(brand.chunks) == 4
+
+    # One section edited, one added, one removed; the caption is unchanged.
+    guide = BRAND_GUIDE.replace("Frases cortas, tuteo y emojis moderados.", "Frases cortas y sin emojis.")
+    guide = guide.replace("## Colores\nNaranja calabaza, crema y marrón café.\n", "## Público\nJóvenes profesionales.\n")
+    counting.embedded.clear()
+    updated, report = await service.update_brand(brand.id, guide)
+    assert report == {"embedded": 2, "deleted": 2, "unchanged": 2}
+    assert sorted(counting.embedded) == ["Frases cortas y sin emojis.", "Jóvenes profesionales."]
+
+    # The index holds exactly the new chunks, also after a restart.
+    _, index = service.get_registered_brand_vectorstore(brand.id)
+    contents = sorted(doc.page_content for doc in index.similarity_search("marca", k=10))
+    assert contents == sorted(chunk["page_content"] for chunk in updated.chunks)
+    reopened = BrandStore(settings.BRAND_STORE_DIR, service.brand_store.index_name)
+    assert len(reopened.get_index(brand.id, service._build_vectorstore, service._load_vectorstore)) == 4
+
+def test_edited_uploaded_guide_only_embeds_changed_sections(make_service):
+    counting = CountingEmbeddings(build_model_registry().get(EMBEDDINGS))
+    service = make_service({EMBEDDINGS: counting})
+    guide = BRAND_GUIDE + "## Temporada\nColección de otoño, edición sin registrar.\n"
+    first_key, _ = service.get_brand_vectorstore(guide, ["una taza de café"])
+    assert len(counting.embedded) == 5
+
+    # Not a registered brand: the edited guide gets a new index, built from the cached vectors.
+    counting.embedded.clear()
+    key, index = service.get_brand_vectorstore(guide.replace("sin registrar", "limitada"), ["una taza de café"])
+    assert key != first_key
+    assert counting.embedded == ["Colección de otoño, edición limitada."]
+    assert len(index) == 5
+
+
+# =======================================================================
+#  LLM CLIENT
+# =======================================================================
+
+@pytest.mark.anyio
+async def test_stop_sequences_are_forwarded_to_ollama():
+    payloads = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        payloads.append(json.loads(request.content))
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": "hola"}})
+
+    client = OllamaClient("http://ollama.test", keep_alive="5m", max_connections=2, max_concurrency_per_model=2, timeout_s=5)
+    client._client = httpx.Client(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    client._aclient = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    llm = PooledChatOllama(client=client, model="qwen3:4b", temperature=0.2)
+    try:
+        llm.invoke([HumanMessage(content="hola")], stop=["\n\n"])
+        await llm.ainvoke([HumanMessage(content="hola")], stop=["FIN"])
+        await llm.ainvoke([HumanMessage(content="hola")])
+    finally:
+        await client.aclose()
+    assert [p.get("options") for p in payloads] == [
+        {"temperature": 0.2, "stop": ["\n\n"]},
+        {"temperature": 0.2, "stop": ["FIN"]},
+        {"temperature": 0.2},
+    ]
+
+@pytest.mark.anyio
+async def test_sync_and_async_calls_share_the_per_model_limit():
+    in_flight = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def enter() -> None:
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+
+    def leave() -> httpx.Response:
+        with lock:
+            in_flight["now"] -= 1
+        return httpx.Response(200, json={"message": {"role": "assistant", "content": "hola"}})
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        enter()
+        time.sleep(0.1)
+        return leave()
+
+    async def ahandler(request: httpx.Request) -> httpx.Response:
+        enter()
+        await asyncio.sleep(0.1)
+        return leave()
+
+    client = OllamaClient("http://ollama.test", keep_alive="5m", max_connections=8, max_concurrency_per_model=2, timeout_s=5)
+    client._client = httpx.Client(base_url=client.base_url, transport=httpx.MockTransport(handler))
+    client._aclient = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(ahandler))
+    messages = [{"role": "user", "content": "hola"}]
+    try:
+        threads = [threading.Thread(target=client.chat, args=("qwen3:4b", messages)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        replies = await asyncio.gather(*(client.achat("qwen3:4b", messages) for _ in range(3)))
+        # Cancelled waiters give their turn to the next caller.
+        waiting = asyncio.ensure_future(client.achat("qwen3:4b", messages))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        replies.append(await client.achat("qwen3:4b", messages))
+        for thread in threads:
+            await asyncio.to_thread(thread.join)
+    finally:
+        await client.aclose()
+    assert replies == ["hola"] * 4
+    assert in_flight["peak"] == 2
+
+
+# =======================================================================
+#  ADMISSION CONTROL
+# =======================================================================
+
+def make_controller(**overrides: Any) -> AdmissionController:
+    options = dict(
+        text_slots=1, image_slots=1, text_service_time_s=10.0, image_service_time_s=30.0,
+        queue_limits={"high": 4, "standard": 2, "low": 1}, degraded_mode=True,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+async def pipeline_events(log: List[str]):
+    """A stand-in for the post pipeline, recording how far it was consumed."""
+    try:
+        for event in ("classified_intent", "generated_copy_text", "generated_image_b64"):
+            log.append(event)
+            yield event, "..."
+    finally:
+        log.append("closed")
+
+@pytest.mark.anyio
+async def test_admission_queues_by_priority_and_refuses_full_queues():
+    controller = make_controller()
+    text = controller.stages[TEXT_STAGE]
+    assert await text.acquire("standard")
+
+    # A "low" request waits for the busy slot; the next one overflows the "low" queue.
+    low_waiter = asyncio.ensure_future(text.acquire("low"))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("low", deadline_s=600)
+    assert rejected.value.status_code == 429 and rejected.value.retry_after_s >= 1
+
+    # Higher classes have their own queue and are served first.
+    controller.admit("high", deadline_s=600)
+    high_waiter = asyncio.ensure_future(text.acquire("high"))
+    await asyncio.sleep(0)
+    text.release()
+    await asyncio.sleep(0.01)
+    assert high_waiter.done() and not low_waiter.done()
+    text.release()
+    assert await low_waiter
+    text.release()
+    assert text.running == 0
+
+@pytest.mark.anyio
+async def test_admission_refuses_or_degrades_requests_that_would_miss_their_deadline():
+    # Idle: the copy takes ~10s and the image ~30s more.
+    controller = make_controller()
+    for deadline_s, skip_image in ((60, False), (20, True)):
+        ticket = controller.admit("standard", deadline_s)
+        assert ticket.skip_image is skip_image
+        ticket.close()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("standard", deadline_s=5)
+    assert rejected.value.status_code == 503
+
+    strict = make_controller(degraded_mode=False)
+    with pytest.raises(AdmissionRejected):
+        strict.admit("standard", deadline_s=20)
+
+    # A campaign is estimated by its last post.
+    assert controller.estimate("standard", posts=4)[0] > controller.estimate("standard")[0]
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.admit("low", deadline_s=600, posts=3)
+    assert rejected.value.status_code == 429
+
+@pytest.mark.anyio
+async def test_burst_of_admissions_counts_tickets_not_at_a_stage_yet():
+    # One text slot and room for one waiting "low" request. None of the
+    # burst has reached the stage (each is still reading its uploads).
+    controller = make_controller()
+
+    async def request() -> Any:
+        try:
+            ticket = controller.admit("low", deadline_s=600)
+        except AdmissionRejected as e:
+            return e.status_code
+        await asyncio.sleep(0.01)
+        return ticket
+
+    outcomes = await asyncio.gather(*(request() for _ in range(6)))
+    tickets = [outcome for outcome in outcomes if not isinstance(outcome, int)]
+    assert len(tickets) == 2 and outcomes.count(429) == 4
+    assert controller.stats()[TEXT_STAGE]["reserved"]["low"] == 2
+
+    # A closed ticket gives its place back; so does one that reached the stage.
+    tickets[0].close()
+    async with tickets[1].text_slot():
+        assert controller.stats()[TEXT_STAGE]["reserved"]["low"] == 0
+        controller.admit("low", deadline_s=600)
+        with pytest.raises(AdmissionRejected):
+            controller.admit("low", deadline_s=600)
+
+@pytest.mark.anyio
+async def test_reservations_end_at_the_ticket_deadline():
+    controller = make_controller(text_service_time_s=0.01, image_service_time_s=0.01)
+    controller.admit("low", deadline_s=0.05)
+    controller.admit("low", deadline_s=0.05)
+    with pytest.raises(AdmissionRejected):
+        controller.admit("low", deadline_s=0.05)
+    await asyncio.sleep(0.1)
+    controller.admit("low", deadline_s=0.05)
+
+@pytest.mark.anyio
+async def test_ticket_relays_the_pipeline_through_both_stages():
+    controller = make_controller()
+    log: List[str] = []
+    events = [event async for event, _ in controller.admit("standard", deadline_s=600).relay(pipeline_events(log))]
+    assert events == ["classified_intent", "generated_copy_text", "generated_image_b64"]
+    assert all(stage["running"] == 0 for stage in controller.stats().values())
+
+    # Admitted without the image: the pipeline stops right after the copy.
+    log.clear()
+    events = [event async for event, _ in controller.admit("standard", deadline_s=20).relay(pipeline_events(log))]
+    assert events == ["classified_intent", "generated_copy_text", "image_skipped"]
+    assert log == ["classified_intent", "generated_copy_text", "closed"]
+    assert controller.stats()[IMAGE_STAGE]["running"] == 0